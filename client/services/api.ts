@@ -2,26 +2,127 @@ import { PortfolioItem } from '../types';
 
 const API_Base_URL = ''; // Use relative path to leverage Vite proxy
 
-export const analyzePortfolio = async (weightsFile: File, navFile?: File): Promise<PortfolioItem[]> => {
+// Last response of each upload endpoint, revalidated with If-None-Match on re-upload
+const lastResults: Record<string, { etag: string, body: Blob }> = {};
+
+const postWithRevalidation = async (endpoint: string, formData: FormData): Promise<Response> => {
+    const previous = lastResults[endpoint];
+    const response = await fetch(`${API_Base_URL}${endpoint}`, {
+        method: 'POST',
+        body: formData,
+        headers: previous ? { 'If-None-Match': previous.etag } : undefined,
+    });
+
+    if (response.status === 304 && previous) {
+        return new Response(previous.body, { status: 200, headers: { 'ETag': previous.etag } });
+    }
+
+    const etag = response.headers.get('ETag');
+    if (response.ok && etag) {
+        const body = await response.blob();
+        lastResults[endpoint] = { etag, body };
+        return new Response(body, { status: response.status, headers: response.headers });
+    }
+    return response;
+};
+
+export type JobKind = 'analyze' | 'pdf' | 'excel';
+export type JobStage = 'parse' | 'fetch' | 'compute' | 'render';
+
+export interface JobStatus {
+    id: string;
+    kind: JobKind;
+    state: 'queued' | 'running' | 'done' | 'failed' | 'cancelled';
+    stage: JobStage | null;
+    stage_progress: number;
+    progress: number; // 0..1 across all stages
+    error: string | null;
+}
+
+// Runs an analysis/report as a server-side job, reporting real per-stage progress over SSE
+export const runJob = async (
+    kind: JobKind,
+    weightsFile: File,
+    navFile?: File,
+    onProgress?: (status: JobStatus) => void,
+    format?: string,
+): Promise<Response> => {
     const formData = new FormData();
+    formData.append('kind', kind);
+    if (format) {
+        formData.append('format', format);
+    }
     formData.append('weights_file', weightsFile);
     if (navFile) {
         formData.append('nav_file', navFile);
     }
 
-    try {
-        const response = await fetch(`${API_Base_URL}/analyze`, {
-            method: 'POST',
-            body: formData,
+    const submitted = await fetch(`${API_Base_URL}/jobs`, { method: 'POST', body: formData });
+    if (!submitted.ok) {
+        const errorText = await submitted.text();
+        throw new Error(`Server Error: ${submitted.status} ${submitted.statusText} - ${errorText}`);
+    }
+    const job: JobStatus = await submitted.json();
+
+    await new Promise<void>((resolve, reject) => {
+        const events = new EventSource(`${API_Base_URL}/jobs/${job.id}/events`);
+        events.addEventListener('progress', (e) => onProgress?.(JSON.parse((e as MessageEvent).data)));
+        events.addEventListener('done', (e) => {
+            onProgress?.(JSON.parse((e as MessageEvent).data));
+            events.close();
+            resolve();
         });
+        const fail = (e: Event) => {
+            events.close();
+            const data = (e as MessageEvent).data;
+            reject(new Error(data ? JSON.parse(data).error : 'Lost connection to the job progress stream'));
+        };
+        events.addEventListener('failed', fail);
+        events.addEventListener('cancelled', fail);
+        events.onerror = fail;
+    });
 
-        if (!response.ok) {
-            const errorText = await response.text();
-            throw new Error(`Server Error: ${response.status} ${response.statusText} - ${errorText}`);
-        }
+    const response = await fetch(`${API_Base_URL}/jobs/${job.id}/result`);
+    if (!response.ok) {
+        const errorText = await response.text();
+        throw new Error(`Server Error: ${response.status} ${response.statusText} - ${errorText}`);
+    }
+    return response;
+};
+
+// Columnar analysis: flat arrays, value for dates[d] and tickers[t] at d * tickers.length + t
+interface ColumnarAnalysis {
+    tickers: string[];
+    dates: string[];
+    weight: number[];
+    returnPct: number[];
+    contribution: number[];
+}
 
-        const data: PortfolioItem[] = await response.json();
-        return data;
+const COLUMNAR_JSON = 'application/vnd.portfolio.columnar+json';
+
+const expandColumnar = (columns: ColumnarAnalysis): PortfolioItem[] =>
+    columns.dates.flatMap((date, d) => columns.tickers.map((ticker, t): PortfolioItem => {
+        const i = d * columns.tickers.length + t;
+        return {
+            ticker,
+            weight: columns.weight[i],
+            date,
+            returnPct: columns.returnPct[i],
+            contribution: columns.contribution[i],
+        };
+    }));
+
+export const analyzePortfolio = async (
+    weightsFile: File,
+    navFile?: File,
+    onProgress?: (status: JobStatus) => void,
+): Promise<PortfolioItem[]> => {
+    try {
+        // The columnar encoding is a fraction of the size of one object per ticker and date
+        const response = await runJob('analyze', weightsFile, navFile, onProgress, COLUMNAR_JSON);
+        const columns: ColumnarAnalysis = await response.json();
+        return expandColumnar(columns);
     } catch (error) {
         console.error("API Error details:", error);
         throw error;
@@ -246,10 +347,7 @@ export const generatePDF = async (weightsFile: File, navFile?: File): Promise<vo
     }
 
     try {
-        const response = await fetch(`${API_Base_URL}/generate-pdf`, {
-            method: 'POST',
-            body: formData,
-        });
+        const response = await postWithRevalidation('/generate-pdf', formData);
 
         if (!response.ok) {
             const errorText = await response.text();
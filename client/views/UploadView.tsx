@@ -1,7 +1,7 @@
 import React, { useState, useRef } from 'react';
 import { AlertCircle, ArrowRight, Trash2, Database, Server, Play, Edit, FileSpreadsheet } from 'lucide-react';
 import { PortfolioItem } from '../types';
-import { analyzePortfolio, analyzeManualPortfolio } from '../services/api';
+import { analyzePortfolio, analyzeManualPortfolio, JobStatus } from '../services/api';
 import { ManualEntryModal } from '../components/ManualEntryModal';
 
 interface UploadViewProps {
@@ -11,6 +11,13 @@ interface UploadViewProps {
   fileHistory?: { name: string, count: number }[];
 }
 
+const STAGE_LABELS: Record<string, string> = {
+  parse: 'Reading files...',
+  fetch: 'Fetching market data...',
+  compute: 'Computing returns...',
+  render: 'Building results...',
+};
+
 export const UploadView: React.FC<UploadViewProps> = ({ onDataLoaded, onProceed, currentData, fileHistory = [] }) => {
   const [isDragging, setIsDragging] = useState(false);
   const [error, setError] = useState<string | null>(null);
@@ -19,6 +26,7 @@ export const UploadView: React.FC<UploadViewProps> = ({ onDataLoaded, onProceed,
   const [weightsFile, setWeightsFile] = useState<File | null>(null);
   const [navFile, setNavFile] = useState<File | null>(null);
   const [isAnalyzing, setIsAnalyzing] = useState(false);
+  const [jobStatus, setJobStatus] = useState<JobStatus | null>(null);
 
   // Manual Entry State
   const [isManualModalOpen, setIsManualModalOpen] = useState(false);
@@ -58,9 +66,10 @@ export const UploadView: React.FC<UploadViewProps> = ({ onDataLoaded, onProceed,
     }
 
     setIsAnalyzing(true);
+    setJobStatus(null);
     setError(null);
     try {
-      const results = await analyzePortfolio(weightsFile, navFile || undefined);
+      const results = await analyzePortfolio(weightsFile, navFile || undefined, setJobStatus);
 
       // Normalize data from API (backend returns decimals, frontend expects whole numbers for %)
       const maxWeight = Math.max(...results.map(p => p.weight));
@@ -153,7 +162,7 @@ export const UploadView: React.FC<UploadViewProps> = ({ onDataLoaded, onProceed,
               <label className="block text-sm font-semibold text-wallstreet-accent mb-1">1. Weights (Required)</label>
               <input
                 type="file"
-                accept=".xlsx,.xls"
+                accept=".xlsx,.xls,.csv,.parquet"
                 className="block w-full text-sm text-slate-500 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-slate-100 file:text-wallstreet-text hover:file:bg-slate-200"
                 onChange={(e) => setWeightsFile(e.target.files ? e.target.files[0] : null)}
               />
@@ -162,7 +171,7 @@ export const UploadView: React.FC<UploadViewProps> = ({ onDataLoaded, onProceed,
               <label className="block text-sm font-semibold text-wallstreet-accent mb-1">2. NAV (Optional)</label>
               <input
                 type="file"
-                accept=".xlsx,.xls"
+                accept=".xlsx,.xls,.csv,.parquet"
                 className="block w-full text-sm text-slate-500 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-slate-100 file:text-wallstreet-text hover:file:bg-slate-200"
                 onChange={(e) => setNavFile(e.target.files ? e.target.files[0] : null)}
               />
@@ -176,7 +185,7 @@ export const UploadView: React.FC<UploadViewProps> = ({ onDataLoaded, onProceed,
                         `}
             >
               {isAnalyzing ? (
-                <span className="flex items-center gap-2">Processing... <div className="w-4 h-4 border-2 border-white border-t-transparent rounded-full animate-spin"></div></span>
+                <span className="flex items-center gap-2">{jobStatus?.stage ? `${STAGE_LABELS[jobStatus.stage]} ${Math.round(jobStatus.progress * 100)}%` : 'Processing...'} <div className="w-4 h-4 border-2 border-white border-t-transparent rounded-full animate-spin"></div></span>
               ) : (
                 <> <Play size={18} /> Run Analysis </>
               )}
@@ -0,0 +1,191 @@
+"""Encodings of the /analyze result, negotiated through the Accept header.
+
+The default JSON body is one object per period and ticker (the client's
+PortfolioItem). The columnar formats carry the same values as a ticker list, a
+date list and flat weight, return and contribution arrays in the same order,
+date-major: the value for dates[d] and tickers[t] is at d * len(tickers) + t.
+
+    application/json                          list of PortfolioItem objects
+    application/vnd.portfolio.columnar+json   columnar object
+    application/msgpack                       columnar object (needs msgpack)
+    application/vnd.apache.arrow.stream       one row per date and ticker (needs pyarrow)
+"""
+
+import json
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+JSON = "application/json"
+COLUMNAR_JSON = "application/vnd.portfolio.columnar+json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+# Preference order when the client accepts several equally
+FORMATS = (JSON, COLUMNAR_JSON, MSGPACK, ARROW)
+OPTIONAL_DEPENDENCIES = {MSGPACK: "msgpack", ARROW: "pyarrow"}
+MEDIA_TYPE_ALIASES = {"application/x-msgpack": MSGPACK, "application/vnd.msgpack": MSGPACK}
+
+
+class NotAcceptable(Exception):
+    """No format the client accepts can be produced by this server."""
+
+
+def is_available(media_type):
+    if media_type == MSGPACK:
+        return msgpack is not None
+    if media_type == ARROW:
+        return pa is not None
+    return True
+
+
+def _parse_accept(accept):
+    """[(media range, q)] of an Accept header, with known aliases normalized."""
+    ranges = []
+    for part in accept.split(","):
+        media_range, *params = [piece.strip() for piece in part.split(";")]
+        if not media_range:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        media_range = media_range.lower()
+        ranges.append((MEDIA_TYPE_ALIASES.get(media_range, media_range), q))
+    return ranges
+
+
+def _quality(media_type, ranges):
+    """q of the most specific range matching `media_type` (0 if none does)."""
+    main_type = media_type.split("/")[0]
+    best_specificity, quality = -1, 0.0
+    for media_range, q in ranges:
+        if media_range == media_type:
+            specificity = 2
+        elif media_range == f"{main_type}/*":
+            specificity = 1
+        elif media_range == "*/*":
+            specificity = 0
+        else:
+            continue
+        if specificity > best_specificity:
+            best_specificity, quality = specificity, q
+    return quality
+
+
+def negotiate(accept):
+    """Media type to encode an analysis with for this Accept header.
+
+    Raises NotAcceptable if every format the client accepts is unavailable.
+    """
+    if not accept:
+        return JSON
+    ranges = _parse_accept(accept)
+    scored = [(_quality(media_type, ranges), -rank, media_type) for rank, media_type in enumerate(FORMATS)]
+    quality, _, media_type = max(
+        (score for score in scored if is_available(score[2])), default=(0.0, 0, None)
+    )
+    if quality > 0:
+        return media_type
+
+    wanted = [media_type for q, _, media_type in scored if q > 0]
+    if wanted:
+        missing = ", ".join(f"{t} (requires {OPTIONAL_DEPENDENCIES[t]})" for t in wanted)
+        raise NotAcceptable(f"Unavailable on this server: {missing}")
+    raise NotAcceptable(f"Supported formats: {', '.join(t for t in FORMATS if is_available(t))}")
+
+
+def analysis_columns(df, periods):
+    """Tickers, period end dates and date x ticker weight/return/contribution matrices."""
+    n_periods = len(periods)
+    return {
+        "tickers": df["Ticker"].tolist(),
+        "dates": [end.strftime("%Y-%m-%d") for _, end in periods],
+        "weight": df[[f"Weight_{i}" for i in range(n_periods)]].to_numpy(dtype=float).T,
+        "returnPct": df[[f"Return_{i}" for i in range(n_periods)]].to_numpy(dtype=float).T,
+        "contribution": df[[f"Contrib_{i}" for i in range(n_periods)]].to_numpy(dtype=float).T,
+    }
+
+
+def _dumps(content):
+    # Same settings as FastAPI's JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def _items(columns):
+    tickers = columns["tickers"]
+    weights = columns["weight"].tolist()
+    returns = columns["returnPct"].tolist()
+    contribs = columns["contribution"].tolist()
+    return [
+        {
+            "ticker": ticker,
+            "weight": weight,
+            "date": date,
+            "companyName": None,
+            "sector": None,
+            "notes": None,
+            "returnPct": ret,
+            "contribution": contrib,
+        }
+        for date, date_weights, date_returns, date_contribs in zip(columns["dates"], weights, returns, contribs)
+        for ticker, weight, ret, contrib in zip(tickers, date_weights, date_returns, date_contribs)
+    ]
+
+
+def _columnar(columns):
+    return {
+        "tickers": columns["tickers"],
+        "dates": columns["dates"],
+        "weight": columns["weight"].ravel().tolist(),
+        "returnPct": columns["returnPct"].ravel().tolist(),
+        "contribution": columns["contribution"].ravel().tolist(),
+    }
+
+
+def _arrow(columns):
+    n_tickers, n_dates = len(columns["tickers"]), len(columns["dates"])
+    table = pa.table({
+        "ticker": pa.DictionaryArray.from_arrays(
+            pa.array(np.tile(np.arange(n_tickers, dtype=np.int32), n_dates)), pa.array(columns["tickers"])
+        ),
+        "date": pa.array(np.repeat(np.array(columns["dates"], dtype="datetime64[D]"), n_tickers)),
+        "weight": columns["weight"].ravel(),
+        "returnPct": columns["returnPct"].ravel(),
+        "contribution": columns["contribution"].ravel(),
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_analysis(df, periods, media_type=JSON):
+    """The analysis results frame encoded as `media_type` (see negotiate)."""
+    if df.empty:
+        columns = {"tickers": [], "dates": [], **{k: np.empty((0, 0)) for k in ("weight", "returnPct", "contribution")}}
+    else:
+        columns = analysis_columns(df, periods)
+
+    if media_type == JSON:
+        return _dumps(_items(columns))
+    if media_type == COLUMNAR_JSON:
+        return _dumps(_columnar(columns))
+    if media_type == MSGPACK:
+        return msgpack.packb(_columnar(columns))
+    if media_type == ARROW:
+        return _arrow(columns)
+    raise ValueError(f"Unknown analysis format: {media_type}")
@@ -1,27 +1,146 @@
 """Cache management for market data."""
 
-import pickle
+import logging
+import os
+import shutil
+import threading
 from pathlib import Path
-from constants import CACHE_DIR, CACHE_FILE
+from constants import (
+    CACHE_FILE, PRICE_STORE_DIR, CACHE_FLUSH_INTERVAL_SECONDS,
+    PRICE_CACHE_MAX_MEMORY_MB, PRICE_CACHE_MAX_DISK_MB
+)
+from price_store import PriceStore
+from metrics import CACHE_ENTRIES, CACHE_DISK_BYTES, CACHE_MEMORY_BYTES, add_scrape_hook
 
+logger = logging.getLogger(__name__)
 
-def load_cache():
-    """Load cached market data if it exists."""
-    cache_path = Path(CACHE_FILE)
-    if cache_path.exists():
+# Process-wide price store shared by every request (see get_cache)
+_cache = None
+_cache_lock = threading.Lock()
+_flush_thread = None
+_stop_flushing = threading.Event()
+
+
+def _migrate_legacy_pickle(store_path, legacy_path):
+    """Import the legacy pickle into a staging store and rename it into place once complete.
+
+    A failed migration leaves no store behind, so it is retried on the next load.
+    """
+    staging_path = store_path.with_name(f"{store_path.name}.migrating-{os.getpid()}")
+    shutil.rmtree(staging_path, ignore_errors=True)
+    try:
+        imported = PriceStore(staging_path).import_legacy_pickle(legacy_path)
         try:
-            with open(cache_path, 'rb') as f:
-                return pickle.load(f)
-        except Exception:
-            return {}
-    return {}
+            staging_path.rename(store_path)
+        except OSError:
+            if not store_path.exists():
+                raise
+            # Another worker process finished the migration first
+            return
+        logger.info(f"Migrated {imported} prices from {legacy_path} into {store_path}")
+    except Exception:
+        logger.exception(f"Failed to migrate {legacy_path} into {store_path}; retrying on next load")
+    finally:
+        shutil.rmtree(staging_path, ignore_errors=True)
+
+
+def load_cache():
+    """Open the on-disk price store; tickers are read lazily on first lookup."""
+    store_path = Path(PRICE_STORE_DIR)
+    legacy_path = Path(CACHE_FILE)
+    
+    # One-time migration of the old pickled "TICKER_YYYY-MM-DD" dict
+    if not store_path.exists() and legacy_path.exists():
+        _migrate_legacy_pickle(store_path, legacy_path)
+    
+    return PriceStore(store_path, max_memory_bytes=int(PRICE_CACHE_MAX_MEMORY_MB * 1024 * 1024))
 
 
 def save_cache(cache):
-    """Save market data cache."""
-    cache_dir = Path(CACHE_DIR)
-    cache_dir.mkdir(exist_ok=True)
-    cache_path = Path(CACHE_FILE)
-    with open(cache_path, 'wb') as f:
-        pickle.dump(cache, f)
+    """Persist new market data entries to disk."""
+    cache.flush()
+
+
+def get_cache():
+    """Return the process-wide price store, opening it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = load_cache()
+    return _cache
+
+
+def _report_store_metrics():
+    """Scrape hook: size of the price store, if this process opened it."""
+    if _cache is None:
+        return
+    stats = _cache.stats()
+    CACHE_ENTRIES.set(stats["records"], cache="prices")
+    CACHE_ENTRIES.set(stats["provisional"], cache="prices_provisional")
+    CACHE_DISK_BYTES.set(stats["disk_bytes"], cache="prices")
+    CACHE_MEMORY_BYTES.set(stats["memory_bytes"], cache="prices")
+
+
+add_scrape_hook(_report_store_metrics)
+
+
+def _flush_loop(interval):
+    """Write dirty entries every `interval` seconds until the service stops."""
+    while not _stop_flushing.wait(interval):
+        try:
+            cache = get_cache()
+            if cache.is_dirty():
+                cache.flush()
+        except Exception as e:
+            logger.error(f"Background cache flush failed: {e}")
+
+
+def start_cache_service(flush_interval=CACHE_FLUSH_INTERVAL_SECONDS):
+    """Load the price store and start flushing new entries in the background."""
+    global _flush_thread
+    get_cache()
+    if _flush_thread is None or not _flush_thread.is_alive():
+        _stop_flushing.clear()
+        _flush_thread = threading.Thread(
+            target=_flush_loop, args=(flush_interval,), name="cache-flush", daemon=True
+        )
+        _flush_thread.start()
+
+
+def stop_cache_service():
+    """Stop the background flusher and write any remaining dirty entries."""
+    global _flush_thread
+    _stop_flushing.set()
+    if _flush_thread is not None:
+        _flush_thread.join()
+        _flush_thread = None
+    if _cache is not None:
+        _cache.flush()
+
+
+def compact_cache(max_disk_mb=PRICE_CACHE_MAX_DISK_MB):
+    """Compact the price store into dense per-ticker series within the disk budget."""
+    from trading_calendar import last_sessions
+
+    store = load_cache()
+    return store.compact(session_days=last_sessions, max_disk_bytes=int(max_disk_mb * 1024 * 1024))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Maintain the market data cache")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="rewrite the price store as dense series")
+    compact_parser.add_argument("--max-disk-mb", type=float, default=PRICE_CACHE_MAX_DISK_MB)
+    args = parser.parse_args()
 
+    if args.command == "compact":
+        summary = compact_cache(args.max_disk_mb)
+        logger.info(
+            f"Compacted {summary['tickers']} tickers: dropped {summary['records_dropped']} records, "
+            f"removed {summary['tickers_removed']} tickers, "
+            f"{summary['bytes_before'] / 1024:.1f} KiB -> {summary['bytes_after'] / 1024:.1f} KiB"
+        )
@@ -0,0 +1,251 @@
+"""Background warming of the market data caches.
+
+Tickers from recent uploads are remembered in RECENT_TICKERS_FILE. At startup
+and then once a day at CACHE_WARMER_RUN_AT (MARKET_TIMEZONE) the warmer
+downloads the trailing CACHE_WARMER_HISTORY_DAYS of closes for those tickers,
+the benchmarks and CAD=X, and refreshes their sectors, betas and the index
+history, so the first request of the day is served from warm caches. The
+default run time is after midnight so the previous session is settled and
+persisted (see price_store.current_day). With several server processes, the
+one holding the warmer lock warms and the others skip the pass.
+"""
+
+import datetime
+import logging
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from constants import (
+    CASH_TICKER, FX_TICKER, BENCHMARK_TICKERS, MARKET_TIMEZONE,
+    RECENT_TICKERS_DAYS, CACHE_WARMER_RUN_AT, CACHE_WARMER_HISTORY_DAYS,
+    CACHE_WARMER_STOP_TIMEOUT_SECONDS, BULK_DOWNLOAD_BATCH_SIZE
+)
+from file_lock import file_lock, read_json, update_json_cache
+from trading_calendar import last_session_days
+
+logger = logging.getLogger(__name__)
+
+RECENT_TICKERS_FILE = Path("data/recent_tickers.json")
+WARMER_LOCK_FILE = Path("data/cache_warmer")
+
+_seen_today = {}  # ticker -> ISO date already written to RECENT_TICKERS_FILE
+_seen_lock = threading.Lock()
+
+_warmer_thread = None
+_stop_warming = threading.Event()
+_run_requested = threading.Event()
+
+_status_lock = threading.Lock()
+_status = {
+    "state": "stopped",
+    "last_started": None,
+    "last_finished": None,
+    "last_duration_seconds": None,
+    "last_error": None,
+    "next_run": None,
+    "coverage": None,
+}
+
+
+def record_tickers(tickers):
+    """Remember tickers from an upload so the next warm-up includes them."""
+    today = datetime.date.today().isoformat()
+    with _seen_lock:
+        updates = {
+            t: today for t in tickers
+            if t and t != CASH_TICKER and _seen_today.get(t) != today
+        }
+        if not updates:
+            return
+        _seen_today.update(updates)
+    try:
+        update_json_cache(RECENT_TICKERS_FILE, updates)
+    except Exception as e:
+        logger.warning(f"Failed to record recent tickers: {e}")
+
+
+def recent_tickers(days=RECENT_TICKERS_DAYS):
+    """Tickers seen in uploads during the last `days` days."""
+    try:
+        seen = read_json(RECENT_TICKERS_FILE)
+    except (ValueError, OSError) as e:
+        logger.warning(f"Failed to read recent tickers: {e}")
+        return []
+    cutoff = (datetime.date.today() - datetime.timedelta(days=days)).isoformat()
+    return sorted(t for t, last_seen in seen.items() if last_seen >= cutoff)
+
+
+def warm_universe():
+    """Recent holdings plus the benchmarks and the FX rate."""
+    return sorted(set(recent_tickers()) | set(BENCHMARK_TICKERS.values()) | {FX_TICKER})
+
+
+def _history_dates(days=CACHE_WARMER_HISTORY_DAYS):
+    today = pd.Timestamp.now(tz=MARKET_TIMEZONE).tz_localize(None).normalize()
+    return list(pd.bdate_range(today - pd.Timedelta(days=days), today))
+
+
+def measure_coverage(holdings, universe, cache):
+    """Share of the warm set each cache can currently answer without a download."""
+    from reference_data import SECTORS_CACHE_FILE, BETAS_CACHE_FILE, INDEX_HISTORY_CACHE_FILE
+
+    dates = _history_dates()
+    missing_prices = []
+    for ticker in universe:
+        prices = cache.get_prices(ticker, dates, last_session_days(ticker, dates), record=False)
+        if np.isnan(prices).any():
+            missing_prices.append(ticker)
+
+    try:
+        sectors = read_json(SECTORS_CACHE_FILE)
+        betas = read_json(BETAS_CACHE_FILE)
+    except (ValueError, OSError):
+        sectors, betas = {}, {}
+    missing_sectors = [t for t in holdings if t not in sectors]
+    missing_betas = [t for t in holdings if t not in betas]
+
+    def share(missing, total):
+        return 1.0 if not total else round(1 - len(missing) / len(total), 4)
+
+    return {
+        "tickers": len(universe),
+        "prices": share(missing_prices, universe),
+        "sectors": share(missing_sectors, holdings),
+        "betas": share(missing_betas, holdings),
+        "index_history": INDEX_HISTORY_CACHE_FILE.exists(),
+        "missing": {
+            "prices": missing_prices,
+            "sectors": missing_sectors,
+            "betas": missing_betas,
+        },
+    }
+
+
+def warm_caches():
+    """Run one warm-up pass and return its coverage report.
+
+    Several server processes share the caches, so only the one holding the
+    warmer lock warms; the others skip the pass and return None. A stop request
+    ends the pass at the next batch of tickers.
+    """
+    from cache_manager import get_cache
+    from market_data import preload_prices
+    from reference_data import get_sectors, get_betas, get_index_history
+
+    cache = get_cache()
+    holdings = recent_tickers()
+    universe = warm_universe()
+
+    with file_lock(WARMER_LOCK_FILE, blocking=False) as locked:
+        if not locked:
+            logger.info("Another process is warming the caches; skipping this pass")
+            return None
+
+        logger.info(f"Warming caches for {len(universe)} tickers")
+        dates = _history_dates()
+        for i in range(0, len(universe), BULK_DOWNLOAD_BATCH_SIZE):
+            if _stop_warming.is_set():
+                break
+            preload_prices(universe[i:i + BULK_DOWNLOAD_BATCH_SIZE], dates, cache)
+        cache.flush()
+        if _stop_warming.is_set():
+            logger.info("Cache warm-up stopped before it finished")
+            return None
+
+        if holdings:
+            get_sectors(holdings)
+            get_betas(holdings)
+        get_index_history()
+
+    return measure_coverage(holdings, universe, cache)
+
+
+def _next_run(now):
+    """Next CACHE_WARMER_RUN_AT after `now` (both in MARKET_TIMEZONE)."""
+    hour, minute = (int(part) for part in CACHE_WARMER_RUN_AT.split(":"))
+    run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if run <= now:
+        run += pd.Timedelta(days=1)
+    return run
+
+
+def _update_status(**changes):
+    with _status_lock:
+        _status.update(changes)
+
+
+def get_status():
+    """Snapshot of the warmer's state and last coverage report."""
+    with _status_lock:
+        return dict(_status)
+
+
+def _run_once():
+    started = datetime.datetime.now()
+    _update_status(state="running", last_started=started.isoformat(timespec="seconds"))
+    try:
+        coverage = warm_caches()
+        if coverage is not None:
+            _update_status(coverage=coverage, last_error=None)
+            logger.info(
+                f"Cache warm-up done: prices {coverage['prices']:.0%}, sectors {coverage['sectors']:.0%}, "
+                f"betas {coverage['betas']:.0%} of {coverage['tickers']} tickers"
+            )
+    except Exception as e:
+        logger.error(f"Cache warm-up failed: {e}", exc_info=True)
+        _update_status(last_error=str(e))
+    finished = datetime.datetime.now()
+    _update_status(
+        state="stopped" if _stop_warming.is_set() else "idle",
+        last_finished=finished.isoformat(timespec="seconds"),
+        last_duration_seconds=round((finished - started).total_seconds(), 2),
+    )
+
+
+def _warm_loop():
+    """Warm at startup, then at every scheduled time or on request until stopped."""
+    _run_once()
+    while not _stop_warming.is_set():
+        now = pd.Timestamp.now(tz=MARKET_TIMEZONE)
+        next_run = _next_run(now)
+        _update_status(next_run=next_run.isoformat())
+        _run_requested.wait((next_run - now).total_seconds())
+        if _stop_warming.is_set():
+            break
+        _run_requested.clear()
+        _run_once()
+
+
+def start_cache_warmer():
+    """Start the background warmer thread (no-op if already running)."""
+    global _warmer_thread
+    if _warmer_thread is None or not _warmer_thread.is_alive():
+        _stop_warming.clear()
+        _run_requested.clear()
+        _warmer_thread = threading.Thread(target=_warm_loop, name="cache-warmer", daemon=True)
+        _warmer_thread.start()
+
+
+def request_warm_up():
+    """Ask the running warmer to start a pass now."""
+    _run_requested.set()
+
+
+def stop_cache_warmer(timeout=CACHE_WARMER_STOP_TIMEOUT_SECONDS):
+    """Stop the warmer, waiting up to `timeout` seconds for a pass in progress to end.
+
+    Call it before the executors and the cache service stop, so the pass does
+    not write to them after they have shut down.
+    """
+    global _warmer_thread
+    _stop_warming.set()
+    _run_requested.set()
+    if _warmer_thread is not None:
+        _warmer_thread.join(timeout)
+        if _warmer_thread.is_alive():
+            logger.warning(f"Cache warmer did not stop within {timeout}s")
+        _warmer_thread = None
+    _update_status(state="stopped", next_run=None)
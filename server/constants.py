@@ -1,8 +1,62 @@
 """Constants for portfolio returns analysis."""
 
+import os
+
 # Cache settings
 CACHE_DIR = ".cache"
-CACHE_FILE = ".cache/market_data_cache.pkl"
+CACHE_FILE = ".cache/market_data_cache.pkl"  # Legacy pickle, migrated into PRICE_STORE_DIR
+PRICE_STORE_DIR = ".cache/prices"
+CACHE_FLUSH_INTERVAL_SECONDS = 30  # How often the server writes new prices to disk
+MARKET_TIMEZONE = "America/Toronto"  # Closes for today in this timezone are provisional
+PROVISIONAL_PRICE_TTL_SECONDS = float(os.environ.get("PROVISIONAL_PRICE_TTL_SECONDS", "300"))  # Refetch today's quotes after this
+PRICE_CACHE_MAX_MEMORY_MB = float(os.environ.get("PRICE_CACHE_MAX_MEMORY_MB", "256"))  # Loaded price arrays per process
+PRICE_CACHE_MAX_DISK_MB = float(os.environ.get("PRICE_CACHE_MAX_DISK_MB", "2048"))  # Enforced by `python cache_manager.py compact`
+RESULT_CACHE_DIR = ".cache/results"  # Finished /analyze and /generate-pdf responses (see result_cache.py)
+RESULT_CACHE_MAX_MB = float(os.environ.get("RESULT_CACHE_MAX_MB", "256"))  # Least recently used results are dropped past this
+RESULT_CACHE_SWEEP_SECONDS = 300  # Longest time between scans of RESULT_CACHE_DIR for stale and excess results
+
+# Price fetching
+PRICE_LOOKBACK_DAYS = 10  # Window searched backwards for the last close on or before a date
+BULK_DOWNLOAD_BATCH_SIZE = 50  # Tickers per bulk download call when preloading prices
+
+# Upstream fetch limits (overridable through environment variables)
+FETCH_MAX_CONCURRENCY = int(os.environ.get("FETCH_MAX_CONCURRENCY", "8"))  # Simultaneous upstream calls
+FETCH_TIMEOUT_SECONDS = float(os.environ.get("FETCH_TIMEOUT_SECONDS", "30"))  # Per attempt
+FETCH_RETRIES = int(os.environ.get("FETCH_RETRIES", "3"))  # Extra attempts after the first failure
+FETCH_BACKOFF_BASE_SECONDS = float(os.environ.get("FETCH_BACKOFF_BASE_SECONDS", "0.5"))
+FETCH_BACKOFF_MAX_SECONDS = float(os.environ.get("FETCH_BACKOFF_MAX_SECONDS", "8"))
+
+# Executors for blocking request work (see executors.py)
+IO_WORKERS = int(os.environ.get("IO_WORKERS", "16"))  # Threads for market data fetches and cache I/O
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", str(min(4, os.cpu_count() or 1))))  # Processes parsing uploads and rendering PDFs; 0 runs them on IO threads
+
+# Uploads are parsed from memory; larger ones reach the parser processes through a per-request temp file
+UPLOAD_SPILL_MB = float(os.environ.get("UPLOAD_SPILL_MB", "16"))
+
+# Report jobs (see jobs.py)
+JOBS_DIR = ".cache/jobs"  # Job progress and results, readable by every worker process
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", "3600"))  # Finished jobs and their results are kept this long
+JOBS_MAX_RETAINED = 200  # Oldest finished jobs are dropped past this
+SSE_KEEPALIVE_SECONDS = 15  # Comment line sent on idle progress streams so proxies keep them open
+JOB_POLL_SECONDS = 0.5  # How often a worker re-reads the files of a job another worker runs
+
+# Background cache warmer (see cache_warmer.py)
+CACHE_WARMER_ENABLED = os.environ.get("CACHE_WARMER_ENABLED", "1") == "1"
+CACHE_WARMER_RUN_AT = os.environ.get("CACHE_WARMER_RUN_AT", "01:00")  # Daily, HH:MM in MARKET_TIMEZONE
+CACHE_WARMER_HISTORY_DAYS = 400  # Trailing closes kept warm (covers YTD and 1Y performance)
+RECENT_TICKERS_DAYS = 30  # Uploaded tickers stay in the warm set this long
+CACHE_WARMER_STOP_TIMEOUT_SECONDS = 60  # Longest shutdown wait for a pass in progress to reach a batch boundary
+
+# Negative cache for data the provider cannot serve (see negative_cache.py)
+NEGATIVE_CACHE_TTL_SECONDS = float(os.environ.get("NEGATIVE_CACHE_TTL_SECONDS", "3600"))  # Delisted tickers, missing data
+NEGATIVE_CACHE_ERROR_TTL_SECONDS = float(os.environ.get("NEGATIVE_CACHE_ERROR_TTL_SECONDS", "60"))  # Upstream failures
+NEGATIVE_CACHE_MAX_ENTRIES = 100_000
+
+# Market data provider: "yfinance" (live) or "file" (replays MARKET_DATA_DIR)
+MARKET_DATA_PROVIDER = os.environ.get("MARKET_DATA_PROVIDER", "yfinance")
+MARKET_DATA_FALLBACK = os.environ.get("MARKET_DATA_FALLBACK", "")  # e.g. "file" to serve recorded data during outages
+MARKET_DATA_DIR = os.environ.get("MARKET_DATA_DIR", "data/market_data")
+MARKET_DATA_LATENCY_SECONDS = float(os.environ.get("MARKET_DATA_LATENCY_SECONDS", "0"))  # Simulated per-call latency of the file provider
 
 # Benchmark tickers
 BENCHMARK_TICKERS = {
@@ -1,73 +1,301 @@
-"""Data loading functions for portfolio weights and NAV files."""
+"""Data loading functions for portfolio weights and NAV files.
 
+Files come in two layouts, detected from their columns:
+
+    wide    a "Ticker" column followed by one column per "dd/mm/YYYY" date
+    long    "Ticker", "Date" and "Weight" (or "NAV") columns, one row per
+            holding and date; dates are "dd/mm/YYYY" or ISO
+
+and as Excel, CSV or Parquet, detected from the file's content. Excel sheets
+are streamed row by row and Parquet files are memory-mapped, reading only the
+columns a long file needs, so ingest memory is about the size of the result:
+a dense ticker x date matrix. Rows come from python-calamine when it is
+installed, else from openpyxl's read-only reader; Parquet needs pyarrow.
+"""
+
+import io
+from array import array
+
+import numpy as np
 import pandas as pd
+import openpyxl
+
+from portfolio_matrix import PortfolioMatrix
+
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+PARQUET_MAGIC = b"PAR1"
+EXCEL_MAGICS = (b"PK\x03\x04", b"\xd0\xcf\x11\xe0")  # .xlsx (zip) and .xls (OLE2)
+
+
+def _file_source(source):
+    """What the readers should open: a path, a file object, or an upload's bytes."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+
+def _file_format(source):
+    """"excel", "parquet" or "csv", from the first bytes of a path, file object or bytes."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        head = bytes(source[:4])
+    elif hasattr(source, "read"):
+        position = source.tell()
+        head = source.read(4)
+        source.seek(position)
+    else:
+        with open(source, "rb") as f:
+            head = f.read(4)
+    if head == PARQUET_MAGIC:
+        return "parquet"
+    if head in EXCEL_MAGICS:
+        return "excel"
+    return "csv"
+
+
+def _long_columns(columns, value_name):
+    """The (ticker, date, value) column names of a long-format file, or None if it is wide."""
+    by_name = {str(col).strip().lower(): col for col in columns if col is not None}
+    names = ("ticker", "date", value_name.lower())
+    if all(name in by_name for name in names):
+        return tuple(by_name[name] for name in names)
+    return None
+
+
+def _sheet_rows(source):
+    """Yield the first sheet's rows as sequences of cell values."""
+    source = _file_source(source)
+    if python_calamine is not None:
+        workbook = python_calamine.CalamineWorkbook.from_object(source)
+        try:
+            yield from workbook.get_sheet_by_index(0).iter_rows()
+        finally:
+            workbook.close()
+        return
+
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _read_parquet(source, value_name):
+    """A Parquet file as a DataFrame, reading only the columns of a long-format file."""
+    if pq is None:
+        raise ValueError("Reading Parquet files requires pyarrow")
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = pa.BufferReader(source)
+    parquet_file = pq.ParquetFile(source, memory_map=True)
+    columns = _long_columns(parquet_file.schema_arrow.names, value_name)
+    return parquet_file.read(columns=list(columns) if columns else None).to_pandas(date_as_object=False)
+
+
+def _read_csv(source):
+    return pd.read_csv(_file_source(source), encoding="utf-8-sig")
+
+
+def _is_empty(value):
+    return value is None or value == ""
+
+
+def _cell_value(value, percent_signs):
+    """A cell as a float (NaN if empty); with percent_signs, text may end in '%'."""
+    if _is_empty(value):
+        return np.nan
+    if isinstance(value, str):
+        text = (value.replace("%", "") if percent_signs else value).strip()
+        return float(text) if text else np.nan
+    return float(value)
+
+
+def _column_values(column, percent_signs):
+    """A column of values as floats (NaN if empty); with percent_signs, text may end in '%'."""
+    if pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+        return column.to_numpy(dtype=float, na_value=np.nan)
+    text = column.astype("string")
+    if percent_signs:
+        text = text.str.replace("%", "", regex=False)
+    return pd.to_numeric(text.str.strip().replace("", pd.NA)).to_numpy(dtype=float, na_value=np.nan)
+
+
+def _column_dates(column):
+    """A long file's date column as a DatetimeIndex of days."""
+    if pd.api.types.is_string_dtype(column) or column.dtype == object:
+        text = column.astype("string").str.strip()
+        try:
+            dates = pd.to_datetime(text, format="%d/%m/%Y")
+        except ValueError:
+            dates = pd.to_datetime(text, format="ISO8601")
+    else:
+        dates = pd.to_datetime(column)
+    dates = pd.DatetimeIndex(dates)
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    return dates.normalize()
+
+
+def _parse_headers(header, skip_col, value_name):
+    """(indexes, headers, parsed dates) of a wide file's date columns."""
+    value_cols, date_cols, parsed = [], [], []
+    for j, date_col in enumerate(header):
+        if j == skip_col:
+            continue
+        if _is_empty(date_col):
+            date_col = f"Unnamed: {j}"
+        try:
+            parsed.append(pd.to_datetime(date_col, format="%d/%m/%Y"))
+        except Exception as e:
+            raise ValueError(f"Error parsing date '{date_col}' or {value_name} value: {e}")
+        value_cols.append(j)
+        date_cols.append(date_col)
+    return value_cols, date_cols, parsed
+
+
+def _in_date_order(tickers, parsed, values, date_cols):
+    order = np.argsort(np.array(parsed, dtype="datetime64[ns]"), kind="stable")
+    date_index = pd.DatetimeIndex([parsed[j] for j in order])
+    return tickers, date_index, values[:, order], [date_cols[j] for j in order]
+
+
+def _long_matrix(df, columns, value_name, percent_signs):
+    """Pivot a long-format frame into (tickers, date index, values, date headers)."""
+    ticker_col, date_col, value_col = columns
+    df = df[[ticker_col, date_col, value_col]].dropna(subset=[ticker_col, date_col])
+    try:
+        dates = _column_dates(df[date_col])
+    except Exception as e:
+        raise ValueError(f"Error parsing dates in column '{date_col}': {e}")
+    try:
+        values = _column_values(df[value_col], percent_signs)
+    except Exception as e:
+        raise ValueError(f"Error parsing {value_name} values in column '{value_col}': {e}")
+
+    ticker_codes, tickers = pd.factorize(df[ticker_col])
+    date_codes, date_index = pd.factorize(dates, sort=True)
+    matrix = np.full((len(tickers), len(date_index)), np.nan)
+    # A repeated (ticker, date) keeps its last row
+    matrix[ticker_codes, date_codes] = values
+    date_index = pd.DatetimeIndex(date_index)
+    return tickers.tolist(), date_index, matrix, date_index.strftime("%d/%m/%Y").tolist()
+
+
+def _wide_frame_matrix(df, kind, value_name, percent_signs):
+    """(tickers, date index, values, date headers) of a wide CSV or Parquet frame."""
+    if "Ticker" not in df.columns:
+        raise ValueError(f"'Ticker' column not found in {kind} file")
+    header = list(df.columns)
+    value_cols, date_cols, parsed = _parse_headers(header, header.index("Ticker"), value_name)
+    values = np.empty((len(df), len(value_cols)), dtype=float)
+    for k, (j, date_col) in enumerate(zip(value_cols, date_cols)):
+        try:
+            values[:, k] = _column_values(df.iloc[:, j], percent_signs)
+        except Exception as e:
+            raise ValueError(f"Error parsing date '{date_col}' or {value_name} value: {e}")
+    return _in_date_order(df["Ticker"].tolist(), parsed, values, date_cols)
+
+
+def _read_excel_matrix(source, kind, value_name, percent_signs):
+    """(tickers, date index, values, date headers) of the first sheet of a workbook, streamed."""
+    rows = _sheet_rows(source)
+    header = list(next(rows, ()))
+    while header and _is_empty(header[-1]):
+        header.pop()
+    columns = _long_columns(header, value_name)
+    if columns is not None:
+        df = pd.DataFrame([row[:len(header)] for row in rows], columns=header)
+        return _long_matrix(df.replace("", None), columns, value_name, percent_signs)
+    if "Ticker" not in header:
+        raise ValueError(f"'Ticker' column not found in {kind} file")
+    ticker_col = header.index("Ticker")
+    value_cols, date_cols, parsed = _parse_headers(header, ticker_col, value_name)
+
+    tickers, values = [], array("d")
+    for row in rows:
+        if all(_is_empty(value) for value in row):
+            continue
+        row = list(row) + [None] * (len(header) - len(row))
+        for j, date_col in zip(value_cols, date_cols):
+            try:
+                values.append(_cell_value(row[j], percent_signs))
+            except Exception as e:
+                raise ValueError(f"Error parsing date '{date_col}' or {value_name} value: {e}")
+        tickers.append(row[ticker_col])
+
+    values = np.frombuffer(values, dtype=float).reshape(len(tickers), len(value_cols))
+    return _in_date_order(tickers, parsed, values, date_cols)
+
+
+def _read_matrix(source, kind, value_name, percent_signs=False):
+    """(tickers, date index, ticker x date values, date headers) of a file, columns in date order."""
+    file_format = _file_format(source)
+    if file_format == "excel":
+        return _read_excel_matrix(source, kind, value_name, percent_signs)
+    df = _read_parquet(source, value_name) if file_format == "parquet" else _read_csv(source)
+    columns = _long_columns(df.columns, value_name)
+    if columns is not None:
+        return _long_matrix(df, columns, value_name, percent_signs)
+    return _wide_frame_matrix(df, kind, value_name, percent_signs)
+
+
+def _matrix_to_dict(tickers, date_index, values):
+    """{ticker: {date: value}} skipping empty cells; a repeated ticker keeps its last row."""
+    dates = list(date_index)
+    present = ~np.isnan(values)
+    result = {}
+    for ticker, row, row_present in zip(tickers, values.tolist(), present):
+        result[ticker] = {dates[j]: row[j] for j in np.flatnonzero(row_present)}
+    return result
+
+
+def _read_weights(file_path):
+    tickers, date_index, weights, date_cols = _read_matrix(file_path, "weights", "weight", percent_signs=True)
+    # Values already below 1 are decimals; 1 or more are percentages
+    weights = np.where(weights >= 1.0, weights / 100, weights)
+    return tickers, date_index, weights, date_cols
+
+
+def load_weights_matrix(file_path):
+    """Load portfolio weights as (tickers, date index, ticker x date weights); missing weights are NaN."""
+    tickers, date_index, weights, _ = _read_weights(file_path)
+    return tickers, date_index, weights
 
 
 def load_weights_file(file_path):
-    """Load portfolio weights from Excel file."""
+    """Load portfolio weights from an Excel, CSV or Parquet file (a path, file object or bytes)."""
     try:
-        df = pd.read_excel(file_path)
-        if "Ticker" not in df.columns:
-            raise ValueError("'Ticker' column not found in weights file")
-        
-        tickers = df["Ticker"].tolist()
-        date_cols = [col for col in df.columns if col != "Ticker"]
-        
-        weights_dict = {}
-        for idx, ticker in enumerate(tickers):
-            weights_dict[ticker] = {}
-            for date_col in date_cols:
-                try:
-                    date_val = pd.to_datetime(date_col, format="%d/%m/%Y")
-                    weight_val = df.iloc[idx][date_col]
-                    if pd.isna(weight_val):
-                        continue
-                    
-                    # Convert to float first
-                    if isinstance(weight_val, str):
-                        weight_val = weight_val.replace('%', '').strip()
-                        weight_val = float(weight_val)
-                    
-                    weight_val = float(weight_val)
-                    
-                    # If value is already a decimal (< 1), use as-is
-                    # If value is >= 1, assume it's a percentage and divide by 100
-                    if weight_val >= 1.0:
-                        weight_val = weight_val / 100
-                    
-                    weights_dict[ticker][date_val] = weight_val
-                except Exception as e:
-                    raise ValueError(f"Error parsing date '{date_col}' or weight value: {e}")
-        
-        return weights_dict, sorted(date_cols, key=lambda x: pd.to_datetime(x, format="%d/%m/%Y"))
+        tickers, date_index, weights, date_cols = _read_weights(file_path)
+        return _matrix_to_dict(tickers, date_index, weights), date_cols
     except Exception as e:
         raise ValueError(f"Error loading weights file: {str(e)}")
 
 
+def load_portfolio(file_path):
+    """Load portfolio weights as a PortfolioMatrix, rows sorted by ticker."""
+    try:
+        return PortfolioMatrix.from_arrays(*load_weights_matrix(file_path))
+    except Exception as e:
+        raise ValueError(f"Error loading weights file: {str(e)}")
+
+
+def load_nav_matrix(file_path):
+    """Load mutual fund NAVs as (tickers, date index, ticker x date NAVs); missing NAVs are NaN."""
+    tickers, date_index, navs, _ = _read_matrix(file_path, "NAV", "NAV")
+    return tickers, date_index, navs
+
+
 def load_nav_file(file_path):
-    """Load mutual fund NAV data from Excel file."""
+    """Load mutual fund NAV data from an Excel, CSV or Parquet file (a path, file object or bytes)."""
     try:
-        df = pd.read_excel(file_path)
-        if "Ticker" not in df.columns:
-            raise ValueError("'Ticker' column not found in NAV file")
-        
-        tickers = df["Ticker"].tolist()
-        date_cols = [col for col in df.columns if col != "Ticker"]
-        
-        nav_dict = {}
-        for idx, ticker in enumerate(tickers):
-            nav_dict[ticker] = {}
-            for date_col in date_cols:
-                try:
-                    date_val = pd.to_datetime(date_col, format="%d/%m/%Y")
-                    nav_val = df.iloc[idx][date_col]
-                    if pd.isna(nav_val):
-                        continue
-                    nav_dict[ticker][date_val] = float(nav_val)
-                except Exception as e:
-                    raise ValueError(f"Error parsing date '{date_col}' or NAV value: {e}")
-        
-        return nav_dict
+        return _matrix_to_dict(*load_nav_matrix(file_path))
     except Exception as e:
         raise ValueError(f"Error loading NAV file: {str(e)}")
-
@@ -1,11 +1,10 @@
-import yfinance as yf
+from providers import get_provider
 import json
 
 ticker = "XUS.TO"
 print(f"--- Fecthing full info for {ticker} ---")
 try:
-    t = yf.Ticker(ticker)
-    info = t.info
+    info = get_provider().info(ticker)
     
     # Print all keys regarding classification
     useful_keys = ['sector', 'category', 'industry', 'quoteType', 'legalType', 'fundFamily', 'assetClass']
@@ -1,4 +1,4 @@
-import yfinance as yf
+from providers import get_provider
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -11,8 +11,7 @@ print(f"Testing tickers: {tickers}")
 for ticker in tickers:
     print(f"\n--- Fetching {ticker} ---")
     try:
-        t = yf.Ticker(ticker)
-        info = t.info
+        info = get_provider().info(ticker)
         
         # Check if we got valid info (yfinance often returns empty dict or mostly None for invalid)
         if not info or all(v is None for v in info.values()):
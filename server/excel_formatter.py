@@ -10,10 +10,15 @@ from monthly_sheet import (
     create_monthly_sheet
 )
 from top_contributors_sheet import create_top_contributors_sheet
+from portfolio_matrix import PortfolioMatrix
 
 
-def create_excel_report(df, periods, benchmark_returns, dates, output_path, cache, weights_dict=None, returns=None, prices=None, nav_dict=None):
-    """Create the formatted Excel report with both period and monthly sheets."""
+def create_excel_report(df, periods, benchmark_returns, dates, output_path, cache, weights_dict=None, returns=None, prices=None, nav_dict=None, portfolio=None):
+    """Create the formatted Excel report with both period and monthly sheets.
+    
+    The monthly sheet needs the priced PortfolioMatrix, or the weights, returns
+    and prices dicts it is built from.
+    """
     wb = Workbook()
     
     # Remove default sheet
@@ -22,14 +27,17 @@ def create_excel_report(df, periods, benchmark_returns, dates, output_path, cach
     # Create period sheet
     create_period_sheet(wb, df, periods, benchmark_returns, dates, cache)
     
+    if portfolio is None and weights_dict is not None and prices is not None:
+        portfolio = PortfolioMatrix.from_dicts(weights_dict, dates, prices=prices, returns=returns)
+    
     # Create monthly sheet if we have the necessary data
-    if weights_dict is not None and prices is not None:
+    if portfolio is not None and portfolio.prices is not None:
         print("Creating monthly contributions sheet...")
         monthly_periods = create_monthly_periods(dates, periods=periods)
         if monthly_periods:
-            monthly_returns = calculate_monthly_returns(weights_dict, nav_dict or {}, monthly_periods, prices, cache)
+            monthly_returns = calculate_monthly_returns(portfolio, nav_dict or {}, monthly_periods, cache)
             monthly_benchmark_returns = calculate_monthly_benchmark_returns(monthly_periods, cache)
-            monthly_df = build_monthly_dataframe(weights_dict, monthly_returns, monthly_periods, dates, cache, nav_dict or {}, periods=periods, period_df=df)
+            monthly_df = build_monthly_dataframe(portfolio, monthly_returns, monthly_periods, dates, cache, nav_dict or {}, periods=periods, period_df=df)
             create_monthly_sheet(wb, monthly_df, monthly_periods, monthly_benchmark_returns, dates, cache)
     
     # Create top contributors/disruptors sheet
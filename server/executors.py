@@ -0,0 +1,88 @@
+"""Executors that keep blocking request work off the event loop.
+
+I/O-bound stages (market data fetches and anything touching the process-wide
+caches) run on a pool of IO_WORKERS threads. CPU-bound stages that only need
+their arguments, like parsing uploads and rendering PDFs, run in a pool of
+CPU_WORKERS processes so concurrent requests get real parallelism despite the
+GIL; with CPU_WORKERS=0 they run on the I/O threads instead. Functions sent to
+the process pool and their arguments must be picklable.
+
+Both pools follow the app lifespan (start_executors / stop_executors) and are
+also created on first use, so scripts can call run_io and run_cpu directly.
+"""
+
+import asyncio
+import functools
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from constants import IO_WORKERS, CPU_WORKERS
+
+logger = logging.getLogger(__name__)
+
+_io_executor = None
+_cpu_executor = None
+_executors_lock = threading.Lock()
+
+
+def start_executors(io_workers=IO_WORKERS, cpu_workers=CPU_WORKERS):
+    """Create the thread and process pools (no-op for pools already running)."""
+    global _io_executor, _cpu_executor
+    with _executors_lock:
+        if _io_executor is None:
+            _io_executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="io")
+        if _cpu_executor is None and cpu_workers > 0:
+            # Spawned rather than forked: the server process already runs background threads
+            _cpu_executor = ProcessPoolExecutor(
+                max_workers=cpu_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"Started executors: {io_workers} I/O threads, {cpu_workers} CPU processes")
+
+
+def stop_executors():
+    """Shut both pools down, cancelling work that has not started."""
+    global _io_executor, _cpu_executor
+    with _executors_lock:
+        io_executor, cpu_executor = _io_executor, _cpu_executor
+        _io_executor = _cpu_executor = None
+    if cpu_executor is not None:
+        cpu_executor.shutdown(wait=True, cancel_futures=True)
+    if io_executor is not None:
+        io_executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _restart_cpu_executor(broken):
+    """Replace a process pool that lost a worker (e.g. killed for memory)."""
+    global _cpu_executor
+    with _executors_lock:
+        if _cpu_executor is broken:
+            _cpu_executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+    start_executors()
+
+
+async def run_io(fn, *args, **kwargs):
+    """Run a blocking I/O-bound call on the thread pool."""
+    if _io_executor is None:
+        start_executors()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_io_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Run a CPU-bound call in a worker process (on the thread pool if CPU_WORKERS=0)."""
+    if _io_executor is None:
+        start_executors()
+    executor = _cpu_executor
+    if executor is None:
+        return await run_io(fn, *args, **kwargs)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+    except BrokenProcessPool:
+        logger.error("CPU worker process died; restarting the process pool")
+        _restart_cpu_executor(executor)
+        raise
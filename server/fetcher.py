@@ -0,0 +1,166 @@
+"""Bounded-concurrency market data fetching with retries and timeouts.
+
+Every upstream call (see providers.py) goes through `fetch`, which runs it on a
+shared worker pool sized by FETCH_MAX_CONCURRENCY, gives each attempt
+FETCH_TIMEOUT_SECONDS and retries failures with jittered exponential backoff.
+Async handlers should wrap the blocking helpers that use it with
+`run_in_threadpool` so the event loop keeps serving other clients.
+
+Identical calls made at the same time (same function and arguments) can be
+coalesced: the first caller performs the fetch and everyone else waits on the
+same future, so only one request goes upstream.
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from constants import (
+    FETCH_MAX_CONCURRENCY, FETCH_TIMEOUT_SECONDS, FETCH_RETRIES,
+    FETCH_BACKOFF_BASE_SECONDS, FETCH_BACKOFF_MAX_SECONDS
+)
+from metrics import FETCH_LATENCY, FETCH_FAILURES
+
+logger = logging.getLogger(__name__)
+
+# Pool that runs the upstream calls themselves; its size is the global concurrency limit
+_calls = ThreadPoolExecutor(max_workers=FETCH_MAX_CONCURRENCY, thread_name_prefix="fetch")
+
+# yf.download keeps per-call state in module globals, so concurrent downloads
+# corrupt each other's results; it already parallelizes across tickers itself.
+# Pass it as fetch(..., lock=download_lock) so waiting for it is not timed.
+download_lock = threading.Lock()
+
+
+class FetchTimeout(Exception):
+    """Raised when an upstream call does not answer within its timeout."""
+
+
+class SingleFlight:
+    """Coalesce concurrent calls sharing a key into one execution."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Future of the call in progress
+
+    def join_or_lead(self, key):
+        """Return `(future, is_leader)` for a key.
+
+        The leader must run the work and call `complete`; followers wait on the
+        returned future.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def complete(self, key, future, result=None, error=None):
+        """Publish the leader's outcome to every follower and forget the key."""
+        with self._lock:
+            self._inflight.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn, *args, **kwargs):
+        """Run `fn` once for all concurrent callers using the same key."""
+        future, is_leader = self.join_or_lead(key)
+        if not is_leader:
+            return future.result()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self.complete(key, future, error=e)
+            raise
+        self.complete(key, future, result=result)
+        return result
+
+
+# Shared by every caller in the process so coalescing works across requests
+flights = SingleFlight()
+
+
+def backoff_delay(attempt, base=FETCH_BACKOFF_BASE_SECONDS, cap=FETCH_BACKOFF_MAX_SECONDS):
+    """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def fetch(fn, *args, retries=FETCH_RETRIES, timeout=FETCH_TIMEOUT_SECONDS, coalesce=False, lock=None, **kwargs):
+    """Call `fn(*args, **kwargs)` on the fetch pool, retrying on errors and timeouts.
+
+    Blocks the calling thread until a result is available; the last error is
+    re-raised once every attempt has failed. With `coalesce=True` (arguments
+    must be hashable), concurrent identical calls share one fetch and its result.
+    A `lock` is acquired before each call is submitted and released when the
+    call returns, so the time spent waiting for it does not count against
+    `timeout` and no pool worker is held while waiting.
+    """
+    if coalesce:
+        key = (fn, args, tuple(sorted(kwargs.items())))
+        return flights.do(key, fetch, fn, *args, retries=retries, timeout=timeout, lock=lock, **kwargs)
+
+    name = getattr(fn, "__qualname__", repr(fn))
+    future = None
+    for attempt in range(retries + 1):
+        # A timed-out call keeps its worker until upstream answers; wait on it
+        # again rather than piling another call on top of it
+        if future is None or future.done():
+            if lock is not None:
+                lock.acquire()
+            try:
+                future = _calls.submit(fn, *args, **kwargs)
+            except BaseException:
+                if lock is not None:
+                    lock.release()
+                raise
+            if lock is not None:
+                future.add_done_callback(lambda _: lock.release())
+        started = time.perf_counter()
+        try:
+            result = future.result(timeout=timeout)
+            FETCH_LATENCY.observe(time.perf_counter() - started, operation=name)
+            return result
+        except FutureTimeout:
+            error = FetchTimeout(f"{name} timed out after {timeout}s")
+            FETCH_FAILURES.inc(operation=name, reason="timeout")
+        except Exception as e:
+            error = e
+            FETCH_FAILURES.inc(operation=name, reason="error")
+        FETCH_LATENCY.observe(time.perf_counter() - started, operation=name)
+
+        if attempt < retries:
+            delay = backoff_delay(attempt)
+            logger.warning(f"{name}{args} failed ({error}); retrying in {delay:.2f}s")
+            time.sleep(delay)
+
+    raise error
+
+
+def fetch_many(fn, items, coalesce=True, **kwargs):
+    """Run `fetch(fn, item)` for every item concurrently.
+
+    Returns a `(results, errors)` pair of dicts keyed by item. Concurrency is
+    bounded by the shared fetch pool, not by the number of items, and by default
+    an item already being fetched by another request is waited on, not refetched.
+    """
+    items = list(dict.fromkeys(items))
+    results, errors = {}, {}
+    if not items:
+        return results, errors
+
+    # Lightweight waiter threads: each one only blocks on its item's fetch
+    with ThreadPoolExecutor(max_workers=min(len(items), FETCH_MAX_CONCURRENCY)) as waiters:
+        futures = {item: waiters.submit(fetch, fn, item, coalesce=coalesce, **kwargs) for item in items}
+        for item, future in futures.items():
+            try:
+                results[item] = future.result()
+            except Exception as e:
+                errors[item] = e
+
+    return results, errors
@@ -0,0 +1,116 @@
+"""Cross-process file locking and atomic file writes.
+
+Used so several server worker processes can share the on-disk caches: writers
+take an exclusive lock on a sidecar ".lock" file, and whole-file rewrites go
+through a temporary file that is atomically renamed into place.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+
+def _lock_fd(fd, blocking=True):
+    """Lock `fd`; without `blocking`, return False instead of waiting for another holder."""
+    if sys.platform == "win32":
+        if not blocking:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                return True
+            except OSError:
+                return False
+        # msvcrt.locking gives up after ~10 seconds, so keep retrying
+        while True:
+            try:
+                msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+                return True
+            except OSError:
+                time.sleep(0.05)
+    else:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+
+
+def _unlock_fd(fd):
+    if sys.platform == "win32":
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+    else:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+@contextmanager
+def file_lock(path, blocking=True):
+    """Hold an exclusive cross-process lock associated with `path`.
+
+    Yields whether the lock is held: with `blocking=False` the body runs with
+    False right away when another process holds it, instead of waiting.
+    """
+    lock_path = Path(str(path) + ".lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(lock_path, os.O_RDWR | os.O_CREAT)
+    try:
+        locked = _lock_fd(fd, blocking)
+        try:
+            yield locked
+        finally:
+            if locked:
+                _unlock_fd(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_bytes(path, data):
+    """Write a file so readers only ever see the old or the new content."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def read_json(path, default=None):
+    """Read a JSON file, returning `default` if it is missing."""
+    path = Path(path)
+    if not path.exists():
+        return {} if default is None else default
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def update_json_cache(path, updates):
+    """Merge `updates` into a JSON dict on disk without losing other writers' entries.
+
+    The file is re-read under the lock so entries added by other processes since
+    we loaded it are kept, then rewritten atomically. Returns the merged dict.
+    """
+    with file_lock(path):
+        try:
+            current = read_json(path)
+        except (ValueError, OSError):
+            current = {}
+        current.update(updates)
+        atomic_write_bytes(path, json.dumps(current).encode("utf-8"))
+    return current
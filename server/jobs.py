@@ -0,0 +1,395 @@
+"""Background report jobs with progress streamed over Server-Sent Events.
+
+A job runs one analysis or report pipeline as a task on the server's event
+loop, independent of the HTTP request that submitted it, and reports its
+progress through the STAGES (parse, fetch, compute, render). Every update is
+kept as a numbered event, so a client subscribing late, or reconnecting with
+Last-Event-ID, replays what it missed before following live updates.
+
+The worker process that accepted a job runs it and records it in JOBS_DIR, so
+its job URLs work whichever worker a request lands on:
+
+    <id>.json     kind and download filename; media type and ETag once done
+    <id>.events   one JSON [event, status] line per event
+    <id>.body     the result body once done
+    <id>.cancel   a cancellation requested through another worker
+
+Other workers follow a job by re-reading its files every JOB_POLL_SECONDS.
+Finished jobs are dropped after JOB_RETENTION_SECONDS, and the oldest ones past
+JOBS_MAX_RETAINED.
+"""
+
+import asyncio
+import json
+import logging
+import re
+import time
+import uuid
+from pathlib import Path
+
+from constants import JOBS_DIR, JOB_RETENTION_SECONDS, JOBS_MAX_RETAINED, SSE_KEEPALIVE_SECONDS, JOB_POLL_SECONDS
+from executors import run_io
+from file_lock import atomic_write_bytes
+from result_cache import CachedResult
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("parse", "fetch", "compute", "render")
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED_STATES = {DONE, FAILED, CANCELLED}
+
+HEADER_SUFFIX = ".json"
+EVENTS_SUFFIX = ".events"
+BODY_SUFFIX = ".body"
+CANCEL_SUFFIX = ".cancel"
+JOB_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+
+def job_path(job_id, suffix):
+    return Path(JOBS_DIR) / (job_id + suffix)
+
+
+def _read_header(job_id):
+    try:
+        return json.loads(job_path(job_id, HEADER_SUFFIX).read_bytes())
+    except (OSError, ValueError):
+        return None
+
+
+def _read_events(job_id):
+    """The (event, status) pairs recorded so far; a line still being written is left out."""
+    try:
+        lines = job_path(job_id, EVENTS_SUFFIX).read_bytes().split(b"\n")
+    except OSError:
+        return []
+    events = []
+    for line in lines[:-1]:
+        try:
+            event, data = json.loads(line)
+        except ValueError:
+            break
+        events.append((event, data))
+    return events
+
+
+class Job:
+    """One submitted pipeline run: its state, event history and result."""
+
+    def __init__(self, kind, filename=None):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.filename = filename
+        self.state = QUEUED
+        self.stage = None
+        self.stage_progress = 0.0
+        self.error = None
+        self.result = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.events = []  # (event name, data dict); the index is the SSE event id
+        self._loop = None
+        self._task = None
+        self._changed = asyncio.Event()
+
+    @property
+    def progress(self):
+        """Overall completion in [0, 1], counting each stage equally."""
+        if self.state == DONE:
+            return 1.0
+        if self.stage is None:
+            return 0.0
+        return (STAGES.index(self.stage) + self.stage_progress) / len(STAGES)
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+    def status(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "stage": self.stage,
+            "stage_progress": round(self.stage_progress, 4),
+            "progress": round(self.progress, 4),
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+    def _write_header(self, result=None):
+        header = {"kind": self.kind, "filename": self.filename, "created_at": self.created_at}
+        if result is not None:
+            header.update(media_type=result.media_type, etag=result.etag)
+        atomic_write_bytes(job_path(self.id, HEADER_SUFFIX), json.dumps(header).encode("utf-8"))
+
+    def _store_result(self, result):
+        """Write the result body, then the header that makes it readable to other workers."""
+        atomic_write_bytes(job_path(self.id, BODY_SUFFIX), result.body)
+        self._write_header(result)
+
+    def _emit(self, event):
+        status = self.status()
+        self.events.append((event, status))
+        # Small appends, read back line by line by the other workers
+        try:
+            with open(job_path(self.id, EVENTS_SUFFIX), "a", encoding="utf-8") as f:
+                f.write(json.dumps([event, status]) + "\n")
+        except OSError as e:
+            logger.warning(f"Failed to record event of job {self.id}: {e}")
+        # Wake every subscriber, then arm a fresh event for the next update
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def load_result(self):
+        return self.result
+
+    async def wait_changed(self, timeout):
+        """Wait for the next event; False if none came within `timeout` seconds."""
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def report(self, stage, fraction=0.0):
+        """Record progress within a stage; safe to call from executor threads."""
+        try:
+            on_loop = asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            self._update(stage, fraction)
+        else:
+            self._loop.call_soon_threadsafe(self._update, stage, fraction)
+
+    def _update(self, stage, fraction):
+        if self.finished:
+            return
+        fraction = min(max(fraction, 0.0), 1.0)
+        if stage == self.stage and fraction <= self.stage_progress:
+            return
+        self.stage, self.stage_progress = stage, fraction
+        self._emit("progress")
+
+    def _finish(self, state, result=None, error=None):
+        self.state = state
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        self._emit({DONE: "done", FAILED: "failed", CANCELLED: "cancelled"}[state])
+
+
+class StoredJob:
+    """A job run by another worker process, as recorded in JOBS_DIR."""
+
+    def __init__(self, job_id, header):
+        self.id = job_id
+        self.kind = header["kind"]
+        self.filename = header.get("filename")
+        self.created_at = header.get("created_at")
+        self.events = _read_events(job_id)
+
+    @classmethod
+    def load(cls, job_id):
+        """The recorded job with this id, or None."""
+        header = _read_header(job_id)
+        return None if header is None else cls(job_id, header)
+
+    def status(self):
+        if self.events:
+            return self.events[-1][1]
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "state": QUEUED,
+            "stage": None,
+            "stage_progress": 0.0,
+            "progress": 0.0,
+            "error": None,
+            "created_at": self.created_at,
+            "finished_at": None,
+        }
+
+    @property
+    def state(self):
+        return self.status()["state"]
+
+    @property
+    def error(self):
+        return self.status()["error"]
+
+    @property
+    def finished(self):
+        return self.state in FINISHED_STATES
+
+    def load_result(self):
+        """The CachedResult of a done job (None until its body is recorded)."""
+        header = _read_header(self.id)
+        if header is None or "etag" not in header:
+            return None
+        try:
+            body = job_path(self.id, BODY_SUFFIX).read_bytes()
+        except OSError:
+            return None
+        return CachedResult(body, header["media_type"], header["etag"])
+
+    async def wait_changed(self, timeout):
+        """Re-read the events every JOB_POLL_SECONDS; False if none came within `timeout` seconds."""
+        seen = len(self.events)
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            self.events = _read_events(self.id)
+            if len(self.events) > seen:
+                return True
+        return False
+
+
+class JobManager:
+    """Registry of the jobs submitted to this process."""
+
+    def __init__(self, retention=JOB_RETENTION_SECONDS, max_retained=JOBS_MAX_RETAINED):
+        self.retention = retention
+        self.max_retained = max_retained
+        self._jobs = {}
+        self._watcher = None
+        self._swept_at = 0.0
+
+    def submit(self, kind, pipeline, *args, filename=None):
+        """Start `await pipeline(*args, progress=job.report)` in the background and return the job.
+
+        Must be called from the event loop. The pipeline returns the job result
+        as a CachedResult.
+        """
+        self._prune()
+        job = Job(kind, filename)
+        job._loop = asyncio.get_running_loop()
+        job._write_header()
+        self._jobs[job.id] = job
+        job._task = job._loop.create_task(self._run(job, pipeline, args))
+        if self._watcher is None or self._watcher.done():
+            self._watcher = job._loop.create_task(self._watch_cancel_requests())
+        return job
+
+    async def _run(self, job, pipeline, args):
+        job.state = RUNNING
+        job._emit("progress")
+        try:
+            result = await pipeline(*args, progress=job.report)
+            try:
+                await run_io(job._store_result, result)
+            except OSError as e:
+                logger.warning(f"Failed to store the result of job {job.id}; only this worker can serve it: {e}")
+        except asyncio.CancelledError:
+            job._finish(CANCELLED, error="Cancelled")
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) failed: {e}", exc_info=True)
+            job._finish(FAILED, error=str(e))
+        else:
+            job._finish(DONE, result=result)
+            logger.info(f"Job {job.id} ({job.kind}) done in {job.finished_at - job.created_at:.2f}s")
+
+    async def _watch_cancel_requests(self):
+        """Cancel this process's running jobs that another worker was asked to cancel."""
+        while True:
+            running = [job for job in self._jobs.values() if not job.finished]
+            if not running:
+                return
+            await asyncio.sleep(JOB_POLL_SECONDS)
+            for job in running:
+                if job_path(job.id, CANCEL_SUFFIX).exists():
+                    self.cancel(job.id)
+
+    def get(self, job_id):
+        """The job run here, else the one another worker recorded; None if unknown."""
+        job = self._jobs.get(job_id)
+        if job is None and JOB_ID_PATTERN.fullmatch(job_id):
+            job = StoredJob.load(job_id)
+        return job
+
+    def cancel(self, job_id):
+        """Cancel a job that is still running; returns the job (None if unknown)."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            job = self.get(job_id)
+            if job is not None and not job.finished:
+                # Its worker picks this up within JOB_POLL_SECONDS
+                job_path(job_id, CANCEL_SUFFIX).touch()
+            return job
+        if not job.finished and job._task is not None:
+            job._task.cancel()
+            # A task cancelled before it started never runs _run's handler
+            if job.state == QUEUED:
+                job._finish(CANCELLED, error="Cancelled")
+        return job
+
+    def shutdown(self):
+        for job in list(self._jobs.values()):
+            if not job.finished and job._task is not None:
+                job._task.cancel()
+
+    def _prune(self):
+        """Drop finished jobs past the retention time, then the oldest past the limit."""
+        now = time.time()
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished), key=lambda job: job.finished_at
+        )
+        excess = len(self._jobs) - self.max_retained
+        for job in finished:
+            if now - job.finished_at > self.retention or excess > 0:
+                del self._jobs[job.id]
+                _remove_files(job.id)
+                excess -= 1
+
+        # Files left by workers that exited before pruning their own jobs
+        if now - self._swept_at > self.retention:
+            self._swept_at = now
+            _remove_stale_files(now - self.retention, keep=self._jobs)
+
+
+def _remove_files(job_id):
+    for suffix in (HEADER_SUFFIX, EVENTS_SUFFIX, BODY_SUFFIX, CANCEL_SUFFIX):
+        job_path(job_id, suffix).unlink(missing_ok=True)
+
+
+def _remove_stale_files(cutoff, keep=()):
+    """Remove the files of jobs not in `keep` that have not changed since `cutoff`."""
+    last_changed = {}
+    root = Path(JOBS_DIR)
+    if not root.exists():
+        return
+    for path in root.iterdir():
+        job_id = path.name.split(".", 1)[0]
+        try:
+            mtime = path.stat().st_mtime
+        except OSError:
+            continue
+        last_changed[job_id] = max(last_changed.get(job_id, 0.0), mtime)
+    for job_id, mtime in last_changed.items():
+        if mtime < cutoff and job_id not in keep:
+            _remove_files(job_id)
+
+
+def _format_event(event_id, event, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def stream_events(job, last_event_id=None):
+    """Yield the job's events as SSE messages until it finishes."""
+    next_id = 0 if last_event_id is None else last_event_id + 1
+    while True:
+        while next_id < len(job.events):
+            event, data = job.events[next_id]
+            yield _format_event(next_id, event, data)
+            next_id += 1
+        if job.finished:
+            return
+        if not await job.wait_changed(SSE_KEEPALIVE_SECONDS):
+            yield ": keep-alive\n\n"
+
+
+# Shared by every request path in the process
+jobs = JobManager()
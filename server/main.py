@@ -1,26 +1,53 @@
-import shutil
+import io
 import os
+import tempfile
+from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import List, Optional
-import pandas as pd
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import logging
 
 # Import existing logic
-from data_loader import load_weights_file, load_nav_file
-from market_data import calculate_returns, calculate_benchmark_returns, build_results_dataframe, get_ticker_performance
-from cache_manager import load_cache, save_cache
-from constants import CASH_TICKER, FX_TICKER
-from pdf_generator import generate_pdf
+from data_loader import load_portfolio, load_nav_file
+from market_data import (
+    price_portfolio, calculate_benchmark_returns, build_portfolio_results, get_ticker_performance,
+    collect_price_universe, preload_prices
+)
+from portfolio_matrix import PortfolioMatrix
+from cache_manager import get_cache, start_cache_service, stop_cache_service
+from constants import CACHE_WARMER_ENABLED, UPLOAD_SPILL_MB
+import metrics
+from pdf_generator import generate_pdf_bytes
+from excel_formatter import create_excel_report
+from reference_data import get_sectors, get_betas, get_performance, get_index_history
+from cache_warmer import record_tickers, start_cache_warmer, stop_cache_warmer, request_warm_up, get_status as get_cache_warmer_status
+from result_cache import result_cache, result_key, result_ttl, etag_matches
+from executors import run_io, run_cpu, start_executors, stop_executors
+from jobs import jobs, stream_events
+from analysis_formats import encode_analysis, negotiate, NotAcceptable
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Blocking request work runs on these pools instead of the event loop
+    start_executors()
+    # Load the market data cache once per process and flush it in the background
+    start_cache_service()
+    if CACHE_WARMER_ENABLED:
+        start_cache_warmer()
+    yield
+    jobs.shutdown()
+    stop_cache_warmer()
+    stop_executors()
+    stop_cache_service()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -29,6 +56,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],  # Lets the client revalidate uploads with If-None-Match
 )
 
 # Define Response Model to match Client's PortfolioItem
@@ -42,57 +70,49 @@ class PortfolioItem(BaseModel):
     returnPct: Optional[float] = None
     contribution: Optional[float] = None
 
+def cached_result_response(result, if_none_match, headers=None):
+    """Serve a stored result, or a 304 if the client already holds this version."""
+    headers = {"ETag": result.etag, **(headers or {})}
+    if etag_matches(if_none_match, result.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=result.body, media_type=result.media_type, headers=headers)
+
+def negotiate_or_406(accept):
+    """Analysis format for an Accept header (see analysis_formats), or a 406."""
+    try:
+        return negotiate(accept)
+    except NotAcceptable as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
 @app.post("/analyze", response_model=List[PortfolioItem])
 async def analyze_portfolio(
     weights_file: UploadFile = File(...),
-    nav_file: Optional[UploadFile] = File(None)
+    nav_file: Optional[UploadFile] = File(None),
+    if_none_match: Optional[str] = Header(None),
+    accept: Optional[str] = Header(None)
 ):
-    temp_dir = Path("temp_uploads")
-    temp_dir.mkdir(exist_ok=True)
-    
-    weights_path = temp_dir / weights_file.filename
-    nav_path = None
+    """Analyze an upload; Accept selects the list of items or a columnar format."""
+    media_type = negotiate_or_406(accept)
+    weights_bytes = await weights_file.read()
+    nav_bytes = await nav_file.read() if nav_file else None
     
     try:
-        # Save uploaded files
-        with weights_path.open("wb") as buffer:
-            shutil.copyfileobj(weights_file.file, buffer)
-            
-        if nav_file:
-            nav_path = temp_dir / nav_file.filename
-            with nav_path.open("wb") as buffer:
-                shutil.copyfileobj(nav_file.file, buffer)
-        
-        # Load data from files
-        logger.info(f"Loading weights file: {weights_path}")
-        weights_dict, dates = load_weights_file(str(weights_path))
-        
-        nav_dict = {}
-        if nav_path:
-            logger.info(f"Loading NAV file: {nav_path}")
-            nav_dict = load_nav_file(str(nav_path))
-            
-        # Run analysis
-        return run_portfolio_analysis(weights_dict, nav_dict, dates)
-
+        result = await build_report(
+            "analyze", weights_file.filename, weights_bytes, nav_file.filename if nav_file else None, nav_bytes,
+            media_type=media_type
+        )
     except Exception as e:
         logger.error(f"Error processing analysis: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
-        
-    finally:
-        # Cleanup
-        if weights_path.exists():
-            weights_path.unlink()
-        if nav_path and nav_path.exists():
-            nav_path.unlink()
-        if temp_dir.exists():
-            shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    return cached_result_response(result, if_none_match)
 
 class ManualAnalysisRequest(BaseModel):
     items: List[PortfolioItem]
 
 @app.post("/analyze-manual", response_model=List[PortfolioItem])
-async def analyze_manual(request: ManualAnalysisRequest):
+async def analyze_manual(request: ManualAnalysisRequest, accept: Optional[str] = Header(None)):
+    media_type = negotiate_or_406(accept)
     try:
         from datetime import datetime
         
@@ -129,123 +149,215 @@ async def analyze_manual(request: ManualAnalysisRequest):
              raise HTTPException(status_code=400, detail="No valid dates found in data")
              
         # Run analysis (empty nav_dict for manual)
-        return run_portfolio_analysis(weights_dict, {}, dates)
+        portfolio = PortfolioMatrix.from_dicts(weights_dict, dates)
+        body = await run_io(run_portfolio_analysis, portfolio, {}, media_type)
+        return Response(content=body, media_type=media_type)
         
     except Exception as e:
         logger.error(f"Error in manual analysis: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
-def run_portfolio_analysis(weights_dict, nav_dict, dates):
-    """Core logic shared between file upload and manual entry."""
-    cache = load_cache()
+def compute_results(portfolio, nav_dict, preload=True):
+    """Price a PortfolioMatrix and build the results dataframe (blocking: run it on the I/O pool).
     
-    logger.info("Fetching market data...")
-    returns, prices = calculate_returns(weights_dict, nav_dict, dates, cache)
+    Fills in the portfolio's prices and returns; returns (df, periods).
+    preload=False skips the batched download when the caller already ran it.
+    """
+    cache = get_cache()
+    record_tickers(portfolio.tickers)
     
-    save_cache(cache)
+    logger.info("Fetching market data...")
+    price_portfolio(portfolio, nav_dict, cache, preload=preload)
     
     logger.info("Building results dataframe...")
-    df, periods = build_results_dataframe(weights_dict, returns, prices, dates, cache)
+    return build_portfolio_results(portfolio, cache)
+
+def run_portfolio_analysis(portfolio, nav_dict, media_type="application/json"):
+    """Core logic shared between file upload and manual entry: the encoded analysis."""
+    df, periods = compute_results(portfolio, nav_dict)
+    return encode_analysis(df, periods, media_type)
+
+def excel_report_bytes(df, periods, benchmark_returns, portfolio, nav_dict):
+    """Build the Excel report (as the CLI does) in memory and return its bytes."""
+    output = io.BytesIO()
+    create_excel_report(df, periods, benchmark_returns, portfolio.date_labels, output, get_cache(),
+                        nav_dict=nav_dict, portfolio=portfolio)
+    return output.getvalue()
+
+def spill_upload(data, name):
+    """Write an upload's bytes to a temp file of its own and return the path."""
+    with tempfile.NamedTemporaryFile(prefix="upload_", suffix=Path(name or "").suffix, delete=False) as f:
+        f.write(data)
+    return f.name
+
+async def parse_upload(loader, name, data):
+    """Run a data_loader function on an upload, straight from its bytes.
     
-    result_items = []
+    Uploads over UPLOAD_SPILL_MB go to the parser process as a path to a
+    per-request temp file rather than as pickled bytes.
+    """
+    if len(data) <= UPLOAD_SPILL_MB * 1024 * 1024:
+        return await run_cpu(loader, data)
+    path = await run_io(spill_upload, data, name)
+    try:
+        logger.info(f"Spilled {len(data)} byte upload {name} to {path}")
+        return await run_cpu(loader, path)
+    finally:
+        os.unlink(path)
+
+# Kinds of result built from an upload: default media type and download filename
+REPORT_KINDS = {
+    "analyze": ("application/json", None),
+    "pdf": ("application/pdf", "top_contributors.pdf"),
+    "excel": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "returns_contribution.xlsx"),
+}
+
+async def build_report(kind, weights_name, weights_bytes, nav_name=None, nav_bytes=None, media_type=None,
+                       progress=None):
+    """Parse the uploads, fetch market data, compute and render one result.
     
-    if df.empty:
-        return []
-        
-    # Iterate through each period to create time-series data for the client
-    for i, period in enumerate(periods):
-        end_date_ts = period[1]
-        date_str = end_date_ts.strftime("%Y-%m-%d")
-        
-        for _, row in df.iterrows():
-            ticker = row['Ticker']
-            
-            # Extract values for this specific period
-            weight = row.get(f'Weight_{i}', 0.0)
-            ret = row.get(f'Return_{i}', 0.0)
-            contrib = row.get(f'Contrib_{i}', 0.0)
-            
-            item = PortfolioItem(
-                ticker=ticker,
-                weight=float(weight),
-                date=date_str,
-                returnPct=float(ret),
-                contribution=float(contrib),
-                # Optional fields
-                companyName=None,
-                sector=None, 
-                notes=None
-            )
-            result_items.append(item)
-            
-    return result_items
+    Shared by the upload endpoints and report jobs. `progress(stage, fraction)`
+    is told about each of the parse/fetch/compute/render stages. Analyses are
+    encoded as `media_type` (see analysis_formats). Results are served from and
+    stored in the result cache.
+    """
+    if progress is None:
+        progress = lambda stage, fraction=0.0: None
+    media_type = media_type or REPORT_KINDS[kind][0]
+    
+    # Same upload and same market data vintage: serve the stored result
+    key = result_key(f"{kind}:{media_type}", weights_bytes, nav_bytes)
+    cached = await run_io(result_cache.get, key)
+    if cached is not None:
+        logger.info(f"Serving cached {kind} result for {weights_name}")
+        return cached
+    
+    progress("parse")
+    logger.info(f"Loading weights file: {weights_name}")
+    portfolio = await parse_upload(load_portfolio, weights_name, weights_bytes)
+    dates = portfolio.date_labels
+    
+    nav_dict = {}
+    if nav_bytes is not None:
+        logger.info(f"Loading NAV file: {nav_name}")
+        nav_dict = await parse_upload(load_nav_file, nav_name, nav_bytes)
+    
+    progress("fetch")
+    universe = collect_price_universe(portfolio.tickers, nav_dict, dates)
+    await run_io(preload_prices, universe, dates, get_cache(), on_progress=lambda f: progress("fetch", f))
+    
+    progress("compute")
+    df, periods = await run_io(compute_results, portfolio, nav_dict, preload=False)
+    if kind == "excel":
+        benchmark_returns = await run_io(calculate_benchmark_returns, dates, get_cache(), preload=False)
+    
+    progress("render")
+    if kind == "analyze":
+        body = await run_cpu(encode_analysis, df, periods, media_type)
+    elif df.empty:
+        raise HTTPException(status_code=400, detail="No data to generate report")
+    elif kind == "pdf":
+        logger.info("Generating PDF...")
+        body = await run_cpu(generate_pdf_bytes, df, periods, dates)
+    else:
+        logger.info("Generating Excel report...")
+        body = await run_io(
+            excel_report_bytes, df, periods, benchmark_returns, portfolio, nav_dict
+        )
+    progress("render", 1.0)
+    
+    return await run_io(result_cache.put, key, body, media_type, ttl=result_ttl(dates))
 
 @app.post("/generate-pdf")
 async def generate_pdf_endpoint(
     weights_file: UploadFile = File(...),
-    nav_file: Optional[UploadFile] = File(None)
+    nav_file: Optional[UploadFile] = File(None),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Generate PDF with Top Contributors/Disruptors tables."""
-    temp_dir = Path("temp_uploads")
-    temp_dir.mkdir(exist_ok=True)
-    
-    weights_path = temp_dir / weights_file.filename
-    nav_path = None
+    weights_bytes = await weights_file.read()
+    nav_bytes = await nav_file.read() if nav_file else None
     
     try:
-        # Save uploaded files
-        with weights_path.open("wb") as buffer:
-            shutil.copyfileobj(weights_file.file, buffer)
-            
-        if nav_file:
-            nav_path = temp_dir / nav_file.filename
-            with nav_path.open("wb") as buffer:
-                shutil.copyfileobj(nav_file.file, buffer)
-        
-        cache = load_cache()
-        
-        logger.info(f"Loading weights file for PDF: {weights_path}")
-        weights_dict, dates = load_weights_file(str(weights_path))
-        
-        nav_dict = {}
-        if nav_path:
-            nav_dict = load_nav_file(str(nav_path))
-            
-        logger.info("Fetching market data for PDF...")
-        returns, prices = calculate_returns(weights_dict, nav_dict, dates, cache)
-        
-        save_cache(cache)
-        
-        logger.info("Building results dataframe for PDF...")
-        df, periods = build_results_dataframe(weights_dict, returns, prices, dates, cache)
-        
-        if df.empty:
-            raise HTTPException(status_code=400, detail="No data to generate PDF")
-        
-        logger.info("Generating PDF...")
-        pdf_buffer = generate_pdf(df, periods, dates)
-        
-        # Return PDF as streaming response
-        return StreamingResponse(
-            pdf_buffer,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": "attachment; filename=top_contributors.pdf"
-            }
+        result = await build_report(
+            "pdf", weights_file.filename, weights_bytes, nav_file.filename if nav_file else None, nav_bytes
         )
-        
     except Exception as e:
         logger.error(f"Error generating PDF: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
-        
-    finally:
-        # Cleanup
-        if weights_path.exists():
-            weights_path.unlink()
-        if nav_path and nav_path.exists():
-            nav_path.unlink()
-        if temp_dir.exists():
-            shutil.rmtree(temp_dir, ignore_errors=True)
+    
+    return cached_result_response(
+        result, if_none_match, {"Content-Disposition": "attachment; filename=top_contributors.pdf"}
+    )
+
+def job_status(job):
+    """A job's state plus the URLs to follow and download it."""
+    status = job.status()
+    status["events_url"] = f"/jobs/{job.id}/events"
+    status["result_url"] = f"/jobs/{job.id}/result" if job.state == "done" else None
+    return status
+
+def get_job_or_404(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    kind: str = Form("analyze"),
+    weights_file: UploadFile = File(...),
+    nav_file: Optional[UploadFile] = File(None),
+    result_format: Optional[str] = Form(None, alias="format")
+):
+    """Start an analysis ("analyze") or report ("pdf", "excel") job and return its status.
+    
+    `format` picks the encoding of an analysis result like /analyze's Accept header.
+    """
+    if kind not in REPORT_KINDS:
+        raise HTTPException(status_code=400, detail=f"Unknown job kind: {kind}")
+    media_type = negotiate_or_406(result_format) if kind == "analyze" else None
+    weights_bytes = await weights_file.read()
+    nav_bytes = await nav_file.read() if nav_file else None
+    
+    _, download_name = REPORT_KINDS[kind]
+    job = jobs.submit(
+        kind, build_report, kind, weights_file.filename, weights_bytes,
+        nav_file.filename if nav_file else None, nav_bytes, media_type, filename=download_name
+    )
+    return job_status(job)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return job_status(get_job_or_404(job_id))
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, last_event_id: Optional[str] = Header(None)):
+    """Progress of a job as Server-Sent Events, ending with a done, failed or cancelled event."""
+    job = get_job_or_404(job_id)
+    after = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    return StreamingResponse(
+        stream_events(job, after),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str, if_none_match: Optional[str] = Header(None)):
+    job = get_job_or_404(job_id)
+    if job.state != "done":
+        detail = f"Job is {job.state}" + (f": {job.error}" if job.error else "")
+        raise HTTPException(status_code=409, detail=detail)
+    result = await run_io(job.load_result)
+    if result is None:
+        raise HTTPException(status_code=410, detail="Job result is no longer available")
+    headers = {"Content-Disposition": f"attachment; filename={job.filename}"} if job.filename else None
+    return cached_result_response(result, if_none_match, headers)
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    get_job_or_404(job_id)
+    return job_status(jobs.cancel(job_id))
 
 @app.post("/fetch-sectors")
 async def fetch_sectors(request: dict):
@@ -253,71 +365,11 @@ async def fetch_sectors(request: dict):
     if not tickers:
         return {}
     
-    import yfinance as yf
-    import json
-    
-    unique_tickers = list(set([t.strip() for t in tickers if t and isinstance(t, str)]))
-    
-    # --- Server-Side Persistence ---
-    cache_file = Path("data/sectors_cache.json")
-    server_cache = {}
-    
-    # Load existing cache
-    if cache_file.exists():
-        try:
-            with open(cache_file, "r") as f:
-                server_cache = json.load(f)
-        except Exception as e:
-            logger.warning(f"Failed to load sector cache file: {e}")
-
-    # Determine what creates a "miss" (not in server cache)
-    missing_on_server = [t for t in unique_tickers if t not in server_cache]
-    
-    if missing_on_server:
-        try:
-            # yf.Tickers allows batch processing but getting info is sometimes better individually for reliability
-            # or we use the Tickers object.
-            # Let's try batch fetching info if possible, but yfinance is tricky with batch info.
-            # Actually, iterating is safer for 'info' attribute reliability.
-            
-            # Optimization: Filter out known non-equity patterns first to save API calls
-            # (Though yfinance handles them, it's faster to skip)
-            
-            # We can use Tickers object for multi-threading
-            tickers_obj = yf.Tickers(" ".join(missing_on_server))
-            
-            for ticker in missing_on_server:
-                try:
-                    # Accessing info triggers the download
-                    info = tickers_obj.tickers[ticker].info
-                    sector = info.get('sector')
-                    
-                    # Check for ETF/Fund indicators if sector is missing
-                    if not sector:
-                        quote_type = info.get('quoteType', '').upper()
-                        if quote_type in ['ETF', 'MUTUALFUND']:
-                            sector = 'Mixed'
-                    
-                    if sector:
-                        server_cache[ticker] = sector
-                except Exception as e:
-                    logger.warning(f"Failed to fetch info for {ticker}: {e}")
-            
-            # Save updated cache
-            try:
-                # Ensure directory exists
-                cache_file.parent.mkdir(parents=True, exist_ok=True)
-                with open(cache_file, "w") as f:
-                    json.dump(server_cache, f)
-            except Exception as e:
-                logger.error(f"Failed to save sector cache: {e}")
-                
-        except Exception as e:
-            logger.error(f"Error fetching sectors: {e}")
-            # Continue to return what we have
-    
-    # Return requested sectors from the (now updated) server cache
-    return {k: server_cache[k] for k in unique_tickers if k in server_cache}
+    try:
+        return await run_io(get_sectors, tickers)
+    except Exception as e:
+        logger.error(f"Error fetching sectors: {e}")
+        return {}
 
 @app.post("/fetch-performance")
 async def fetch_performance(request: dict):
@@ -325,100 +377,8 @@ async def fetch_performance(request: dict):
     if not tickers:
         return {}
     
-    import yfinance as yf
-    import datetime
-    from dateutil.relativedelta import relativedelta
-    
-    unique_tickers = list(set([t.strip() for t in tickers if t and isinstance(t, str)]))
-    results = {}
-
     try:
-        # Group fetching
-        tickers_obj = yf.Tickers(" ".join(unique_tickers))
-        
-        # Calculate start dates for different periods
-        today = datetime.date.today()
-        start_date_1y = today - relativedelta(years=1)
-        
-        # We need roughly 1 year of data to calculate all metrics
-        # Fetching a bit more to be safe
-        
-        for ticker in unique_tickers:
-            try:
-                # Get historical data
-                # period="1y" might miss the exact start day if it's a weekend, so using "2y" or explicit dates is safer
-                # but "1y" + "ytd" is usually enough. Let's use max necessary period.
-                hist = tickers_obj.tickers[ticker].history(period="1y")
-                
-                if hist.empty:
-                    continue
-                
-                current_price = hist['Close'].iloc[-1]
-                
-                def get_pct_change(days_ago=None, months_ago=None, start_year=False):
-                    if start_year:
-                        start_date = datetime.date(today.year, 1, 1)
-                    elif months_ago:
-                        start_date = today - relativedelta(months=months_ago)
-                    else:
-                        return 0.0 # Should not happen
-                        
-                    # Find closest date in history (backwards)
-                    # Use tz-naive comparison if needed
-                    hist_dates = hist.index.date
-                    
-                    # Find finding the closest date <= start_date
-                    # This is a bit rough, but sufficient for dashboard
-                    
-                    # Filter history to only include dates <= start_date
-                    # But actually we want the price AT start_date. 
-                    # If start_date is today, change is 0.
-                    # If start_date was weekend, we want Friday before.
-                    
-                    # Simplification: Get row closest to start_date
-                    # We can search in the index
-                    
-                    # Convert index to dates
-                    # Index is usually datetime, let's treat as date
-                    
-                    target_idx = hist.index[hist.index.date <= start_date]
-                    if target_idx.empty:
-                        # If we don't have history going back that far (e.g. valid YTD but not 1Y)
-                        # Try to use the first available point? Or return None?
-                        # Let's return None to indicate no data for period
-                        if start_year: # YTD should usually exist if recent
-                             return (current_price - hist['Close'].iloc[0]) / hist['Close'].iloc[0]
-                        return None
-
-                    start_price = hist.loc[target_idx[-1]]['Close']
-                    return (current_price - start_price) / start_price
-
-                # Metrics
-                # YTD
-                ytd_start = datetime.date(today.year, 1, 1)
-                # If today is Jan 1st?
-                
-                perf = {}
-                
-                # YTD
-                # Use history(period="ytd") is easiest for YTD specifically but we already fetched 1y
-                # Let's just calculate manually to batch fewer calls
-                
-                idx_ytd = hist.index[hist.index.date < today] # All past settings
-                # Actually, YTD is from Dec 31 prev year or Jan 1 current year.
-                # Let's use get_pct_change with start_year=True
-                perf['YTD'] = get_pct_change(start_year=True)
-                perf['1Y'] = get_pct_change(months_ago=12) # Might fail if history < 1y
-                perf['6M'] = get_pct_change(months_ago=6)
-                perf['3M'] = get_pct_change(months_ago=3)
-                
-                results[ticker] = perf
-                
-            except Exception as e:
-                logger.warning(f"Failed to fetch performance for {ticker}: {e}")
-                
-        return results
-        
+        return await run_io(get_performance, tickers)
     except Exception as e:
         logger.error(f"Error fetching performance: {e}")
         return {}
@@ -490,16 +450,12 @@ async def get_index_exposure():
 
 @app.post("/currency-performance")
 async def currency_performance(request: dict):
-    from cache_manager import load_cache, save_cache
-    
     tickers = request.get("tickers", [])
     if not tickers:
         return {}
         
     try:
-        cache = load_cache()
-        performance = get_ticker_performance(tickers, cache)
-        save_cache(cache)
+        performance = await run_io(get_ticker_performance, tickers, get_cache())
         return performance
     except Exception as e:
         logger.error(f"Error in currency-performance: {e}")
@@ -513,210 +469,35 @@ async def fetch_betas(request: dict):
     if not tickers:
         return {}
     
-    import yfinance as yf
-    import json
-    
-    unique_tickers = list(set([t.strip() for t in tickers if t and isinstance(t, str)]))
-    results = {}
-    
-    # --- Server-Side Persistence for Betas ---
-    cache_file = Path("data/betas_cache.json")
-    server_cache = {}
-    
-    # Load existing cache
-    if cache_file.exists():
-        try:
-            with open(cache_file, "r") as f:
-                server_cache = json.load(f)
-        except Exception as e:
-            logger.warning(f"Failed to load beta cache file: {e}")
-    
-    # Heuristic for obvious funds/ETFs where we want Beta = 1.0 immediately without fetching
-    to_fetch = []
-    
-    for ticker in unique_tickers:
-        # Check server cache first
-        if ticker in server_cache:
-            results[ticker] = server_cache[ticker]
-            continue
-            
-        t_upper = ticker.upper()
-        # Heuristics for Funds/ETFs to default to 1.0
-        if (t_upper.startswith('TDB') or 
-            t_upper.startswith('DYN') or 
-            (t_upper.startswith('X') and t_upper.endswith('.TO')) or
-            (t_upper.startswith('V') and t_upper.endswith('.TO')) or
-            (t_upper.startswith('Z') and t_upper.endswith('.TO')) or
-            (t_upper.startswith('H') and t_upper.endswith('.TO')) or 
-            'CASH' in t_upper or 
-            '$' in t_upper):
-            results[ticker] = 1.0
-            server_cache[ticker] = 1.0  # Cache heuristic values too
-        else:
-            to_fetch.append(ticker)
-    
-    # Only fetch tickers not in cache
-    if to_fetch:
-        try:
-            tickers_obj = yf.Tickers(" ".join(to_fetch))
-            
-            for ticker in to_fetch:
-                try:
-                    found_ticker = tickers_obj.tickers.get(ticker)
-                    if not found_ticker:
-                        found_ticker = yf.Ticker(ticker)
-                        
-                    # beta is in info
-                    info = found_ticker.info
-                    
-                    quote_type = info.get('quoteType', '').upper()
-                    if quote_type in ['ETF', 'MUTUALFUND']:
-                        beta_value = 1.0
-                    else:
-                        beta = info.get('beta')
-                        beta_value = beta if beta is not None else 1.0
-                    
-                    results[ticker] = beta_value
-                    server_cache[ticker] = beta_value  # Cache the result
-                            
-                except Exception as e:
-                    logger.warning(f"Failed to fetch beta for {ticker}: {e}")
-                    results[ticker] = 1.0
-                    server_cache[ticker] = 1.0
-                    
-        except Exception as e:
-            logger.error(f"Error fetching betas: {e}")
-    
-    # Save updated cache
     try:
-        cache_file.parent.mkdir(parents=True, exist_ok=True)
-        with open(cache_file, "w") as f:
-            json.dump(server_cache, f)
+        return await run_io(get_betas, tickers)
     except Exception as e:
-        logger.error(f"Failed to save beta cache: {e}")
-            
-    return results
+        logger.error(f"Error fetching betas: {e}")
+        return {}
 
 @app.get("/index-history")
-async def get_index_history():
-    """
-    Fetch historical data for ACWI (global) and XIU.TO (Canada) for the comparison graph.
-    Also fetches USDCAD=X to convert ACWI to CAD, and calculates a synthetic blend (75% ACWI, 25% XIU).
-    Caches the result to avoid repeated slow yfinance calls.
-    """
-    import yfinance as yf
-    import json
-    import datetime
-    
-    cache_file = Path("data/index_history_cache.json")
-    
-    # Check cache freshness (e.g., 24 hours)
-    if cache_file.exists():
-        try:
-            # Check modification time
-            mtime = datetime.datetime.fromtimestamp(cache_file.stat().st_mtime)
-            if datetime.datetime.now() - mtime < datetime.timedelta(hours=24):
-                with open(cache_file, "r") as f:
-                    logger.info("Serving index history from cache")
-                    return json.load(f)
-        except Exception as e:
-            logger.warning(f"Failed to read index history cache: {e}")
-
-    # Fetch new data
-    logger.info("Fetching fresh index history from yfinance...")
-    tickers = ["ACWI", "XIU.TO", "USDCAD=X"]
-    
-    try:
-        # Fetch 5 years of data
-        # auto_adjust=True might be better for total return (dividends), but standard close is okay for simple price
-        data = yf.download(tickers, period="5y", interval="1d", progress=False)
-        
-        if data.empty:
-            return {"ACWI": [], "XIU.TO": [], "Index": []}
-            
-        # Get Close prices
-        # Handle potential multi-index or single index
-        # If all tickers found, it's multi-index 'Close' -> [ACWI, XIU.TO, USDCAD=X]
-        if 'Close' in data.columns:
-            closes = data['Close']
-        else:
-            # Fallback if structure is different (sometimes yfinance changes)
-            closes = data
-        
-        # Ensure we have all columns
-        expected_cols = ["ACWI", "XIU.TO", "USDCAD=X"]
-        # Filter for existing columns
-        existing_cols = [c for c in expected_cols if c in closes.columns]
-        
-        if not existing_cols:
-             return {"ACWI": [], "XIU.TO": [], "Index": []}
+async def get_index_history_endpoint():
+    """Index comparison series (ACWI in CAD, XIU.TO and the 75/25 blend), cached for a day."""
+    return await run_io(get_index_history)
 
-        # Fill missing values (holidays etc)
-        closes = closes[existing_cols].ffill().bfill()
-        
-        result_data = {
-            "ACWI": [],
-            "XIU.TO": [],
-            "Index": []
-        }
-        
-        dates = closes.index.strftime('%Y-%m-%d').tolist()
-        
-        # Use pandas vectorized operations for calculation
-        # Handle missing columns gracefully if only partial success
-        if "ACWI" in closes.columns and "USDCAD=X" in closes.columns:
-            acwi_cad_series = closes["ACWI"] * closes["USDCAD=X"]
-        else:
-            acwi_cad_series = pd.Series(dtype=float)
-            
-        if "XIU.TO" in closes.columns:
-            xiu_series = closes["XIU.TO"]
-        else:
-            xiu_series = pd.Series(dtype=float)
-            
-        # Calculate Composite Index (Total Return approx)
-        # We use daily returns to build the index starting at 100
-        if not acwi_cad_series.empty and not xiu_series.empty:
-            acwi_ret = acwi_cad_series.pct_change().fillna(0)
-            xiu_ret = xiu_series.pct_change().fillna(0)
-            
-            # Synthetic 75/25
-            composite_ret = (acwi_ret * 0.75) + (xiu_ret * 0.25)
-            composite_index = (1 + composite_ret).cumprod() * 100
-        else:
-            composite_index = pd.Series(dtype=float)
-        
-        # Prepare final lists
-        acwi_list = acwi_cad_series.tolist() if not acwi_cad_series.empty else []
-        xiu_list = xiu_series.tolist() if not xiu_series.empty else []
-        comp_list = composite_index.tolist() if not composite_index.empty else []
-        
-        for i, date_str in enumerate(dates):
-             # ACWI (in CAD)
-             if i < len(acwi_list) and pd.notna(acwi_list[i]):
-                 result_data["ACWI"].append({"date": date_str, "value": acwi_list[i]})
-                 
-             # XIU
-             if i < len(xiu_list) and pd.notna(xiu_list[i]):
-                 result_data["XIU.TO"].append({"date": date_str, "value": xiu_list[i]})
-                 
-             # Composite
-             if i < len(comp_list) and pd.notna(comp_list[i]):
-                 result_data["Index"].append({"date": date_str, "value": comp_list[i]})
-
-        # Save to cache
-        try:
-            cache_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(cache_file, "w") as f:
-                json.dump(result_data, f)
-        except Exception as e:
-            logger.error(f"Failed to write index history cache: {e}")
-            
-        return result_data
+@app.get("/metrics")
+async def get_metrics():
+    """Cache and upstream fetch metrics in the Prometheus text format."""
+    body = await run_io(metrics.render)
+    return Response(content=body, media_type=metrics.CONTENT_TYPE)
 
-    except Exception as e:
-        logger.error(f"Error fetching index history: {e}")
-        return {"ACWI": [], "XIU.TO": [], "Index": []}
+@app.get("/cache-warmer")
+async def cache_warmer_status():
+    """State of the background cache warmer and the coverage of its last pass."""
+    return get_cache_warmer_status()
+
+@app.post("/cache-warmer/run")
+async def run_cache_warmer():
+    """Start a warm-up pass now instead of waiting for the schedule."""
+    if not CACHE_WARMER_ENABLED:
+        raise HTTPException(status_code=409, detail="Cache warmer is disabled")
+    request_warm_up()
+    return get_cache_warmer_status()
 
 
 if __name__ == "__main__":
@@ -1,35 +1,196 @@
 """Market data fetching and return calculations."""
 
+import logging
+import numpy as np
 import pandas as pd
-import yfinance as yf
-from constants import CASH_TICKER, FX_TICKER, INDICES
+from constants import (
+    CASH_TICKER, FX_TICKER, INDICES, BENCHMARK_TICKERS,
+    PRICE_LOOKBACK_DAYS, BULK_DOWNLOAD_BATCH_SIZE
+)
 from cache_manager import load_cache, save_cache
+from price_store import to_day
+from fetcher import fetch, flights
+from negative_cache import negative_cache
+from providers import get_provider
+from trading_calendar import last_session_days
+
+logger = logging.getLogger(__name__)
+
+
+def _fetch_history(ticker, start_date, end_date):
+    """Download daily history for one ticker over [start_date, end_date)."""
+    return get_provider().history(ticker, start=start_date, end=end_date)
+
+
+def store_closes(ticker, closes, cache):
+    """Store every close of a downloaded daily series under its trading day."""
+    closes = closes.dropna()
+    if closes.index.tz is not None:
+        closes.index = closes.index.tz_localize(None)
+    cache.set_prices(ticker, closes.index.normalize(), closes.to_numpy(dtype=float))
 
 
 def get_price_on_date(ticker, date, cache):
-    """Get price for a ticker on a specific date, using cache if available."""
-    cache_key = f"{ticker}_{date.strftime('%Y-%m-%d')}"
-    
-    if cache_key in cache:
-        return cache[cache_key]
+    """Get the last close on or before a date, using cache if available.
+
+    The cache answers whenever it holds the ticker's last scheduled session on
+    or before the date, so weekends and holidays need no download. Dates the
+    provider recently could not serve fail immediately (see negative_cache).
+    """
+    session_day = last_session_days(ticker, [date])[0]
+    cached_price = cache.get_price(ticker, date, session_day)
+    if cached_price is not None:
+        return cached_price
+    return _fetch_price_on_date(ticker, date, session_day, cache)
+
+
+def _fetch_price_on_date(ticker, date, session_day, cache):
+    """get_price_on_date for a date the cache has already missed: download and store it."""
+    negative_key = ("price", ticker, to_day(date))
+    reason = negative_cache.get(negative_key)
+    if reason is not None:
+        raise ValueError(f"Error fetching price for {ticker} on {date}: {reason}")
     
     try:
         end_date = date
-        start_date = date - pd.Timedelta(days=10)
+        start_date = date - pd.Timedelta(days=PRICE_LOOKBACK_DAYS)
         
-        stock = yf.Ticker(ticker)
-        hist = stock.history(start=start_date, end=end_date + pd.Timedelta(days=1))
+        # Concurrent requests for the same ticker and date share one download
+        try:
+            hist = fetch(_fetch_history, ticker, start_date, end_date + pd.Timedelta(days=1), coalesce=True)
+        except Exception as e:
+            negative_cache.add(negative_key, str(e), error=True)
+            raise
         
         if hist.empty:
-            raise ValueError(f"No data available for {ticker} on {date}")
+            reason = f"No data available for {ticker} on {date}"
+            negative_cache.add(negative_key, reason)
+            raise ValueError(reason)
         
-        price = hist['Close'].iloc[-1]
-        cache[cache_key] = price
+        closes = hist['Close']
+        store_closes(ticker, closes, cache)
+        price = closes.iloc[-1]
+        if to_day(closes.index[-1]) < session_day:
+            # No close for the expected session (unscheduled closure, halt):
+            # pin the as-of close to this date so it is not downloaded again
+            cache.set_price(ticker, date, price)
         return price
     except Exception as e:
         raise ValueError(f"Error fetching price for {ticker} on {date}: {str(e)}")
 
 
+def collect_price_universe(tickers, nav_dict, dates):
+    """Return every ticker a request may need prices for, given the holdings' tickers.
+
+    Covers the holdings (except cash and mutual funds fully priced from the NAV
+    file), the benchmarks and the FX rate used for the CAD adjustment.
+    """
+    parsed_dates = [pd.to_datetime(d, format="%d/%m/%Y") for d in dates]
+    
+    universe = set(BENCHMARK_TICKERS.values())
+    universe.add(FX_TICKER)
+    for ticker in tickers:
+        if ticker == CASH_TICKER:
+            continue
+        if ticker in nav_dict and all(d in nav_dict[ticker] for d in parsed_dates):
+            continue
+        universe.add(ticker)
+    return sorted(universe)
+
+
+def _download_closes(tickers, start_date, end_date):
+    """Download daily closes for several tickers in one call (one column per ticker)."""
+    return get_provider().download_closes(tickers, start=start_date, end=end_date)
+
+
+def preload_prices(tickers, dates, cache, on_progress=None):
+    """Fill the cache for every (ticker, date) pair using batched downloads.
+
+    Pairs the cache can already answer as of the ticker's last session, or
+    that are negatively cached, are skipped, and every downloaded close is
+    stored. Each date resolves like get_price_on_date: the last close within the
+    PRICE_LOOKBACK_DAYS window ending on that date. Pairs that cannot be resolved
+    are left out so that get_price_on_date fetches (and reports) them one by one.
+    
+    `on_progress(fraction)` is called as download batches complete.
+    """
+    parsed_dates = pd.DatetimeIndex(sorted({pd.to_datetime(d, format="%d/%m/%Y") for d in dates}))
+    
+    missing = {}
+    for ticker in tickers:
+        unknown = np.isnan(
+            cache.get_prices(ticker, parsed_dates, last_session_days(ticker, parsed_dates), record=False)
+        )
+        ticker_dates = [
+            parsed_dates[i] for i in np.flatnonzero(unknown)
+            if ("price", ticker, to_day(parsed_dates[i])) not in negative_cache
+        ]
+        if ticker_dates:
+            missing[ticker] = ticker_dates
+    
+    if not missing:
+        if on_progress is not None:
+            on_progress(1.0)
+        return
+    
+    lookback = pd.Timedelta(days=PRICE_LOOKBACK_DAYS)
+    start_date = min(ds[0] for ds in missing.values()) - lookback
+    end_date = max(ds[-1] for ds in missing.values()) + pd.Timedelta(days=1)
+    
+    to_download = sorted(missing)
+    logger.info(f"Bulk downloading {len(to_download)} tickers from {start_date.date()} to {end_date.date()}")
+    
+    # Tickers another request is already preloading are waited on instead of downloaded again
+    followed = []
+    
+    for i in range(0, len(to_download), BULK_DOWNLOAD_BATCH_SIZE):
+        if on_progress is not None:
+            on_progress(i / len(to_download))
+        led = {}
+        for ticker in to_download[i:i + BULK_DOWNLOAD_BATCH_SIZE]:
+            future, is_leader = flights.join_or_lead(("preload", ticker))
+            if is_leader:
+                led[ticker] = future
+            else:
+                followed.append(future)
+        
+        if not led:
+            continue
+        
+        batch = list(led)
+        try:
+            closes = fetch(_download_closes, batch, start_date, end_date, lock=get_provider().download_lock)
+            
+            for ticker in batch:
+                if ticker not in closes.columns:
+                    continue
+                series = closes[ticker].dropna()
+                if series.empty:
+                    continue
+                store_closes(ticker, series, cache)
+                
+                # Dates whose expected session has no close get the as-of close pinned
+                dates_left = missing[ticker]
+                unresolved = np.isnan(
+                    cache.get_prices(ticker, dates_left, last_session_days(ticker, dates_left), record=False)
+                )
+                for date in [d for d, is_unresolved in zip(dates_left, unresolved) if is_unresolved]:
+                    pos = series.index.searchsorted(date, side="right") - 1
+                    if pos >= 0 and series.index[pos] >= date - lookback:
+                        cache.set_price(ticker, date, series.iloc[pos])
+        except Exception as e:
+            logger.warning(f"Bulk download failed for {batch}: {e}")
+        finally:
+            for ticker, future in led.items():
+                flights.complete(("preload", ticker), future)
+    
+    # Whatever the other requests did not cover falls back to get_price_on_date
+    for future in followed:
+        future.exception()
+    if on_progress is not None:
+        on_progress(1.0)
+
+
 def get_fx_return(start_date, end_date, cache):
     """Get FX return for CAD=X over the period."""
     fx_start = get_price_on_date(FX_TICKER, start_date, cache)
@@ -37,75 +198,135 @@ def get_fx_return(start_date, end_date, cache):
     return (fx_end / fx_start) - 1
 
 
-def calculate_returns(weights_dict, nav_dict, dates, cache):
-    """Calculate returns for all holdings across all periods."""
-    all_tickers = set(weights_dict.keys())
-    all_tickers = sorted(all_tickers)
-    
-    prices = {}
-    returns = {}
+def get_fx_returns(periods, cache):
+    """Get the CAD=X return of every period as an array aligned with `periods`.
+
+    Each boundary date is priced once, so a request computes its FX vector a
+    single time and every holding reuses it.
+    """
+    boundary_dates = {date for period in periods for date in period}
+    fx_prices = {date: get_price_on_date(FX_TICKER, date, cache) for date in boundary_dates}
+    return np.array(
+        [(fx_prices[end_date] / fx_prices[start_date]) - 1 for start_date, end_date in periods],
+        dtype=float
+    )
+
+
+def needs_fx_adjustment(ticker, nav_dict):
+    """Whether a holding's return is converted to CAD with the CAD=X return.
+
+    Mutual funds (in nav_dict) use NAV data directly, and TSX listings are
+    already in CAD.
+    """
+    return not (ticker in nav_dict or ticker.endswith('.TO') or ticker == "^GSPTSE")
+
+
+def apply_fx_adjustment(raw_returns, fx_mask, fx_returns):
+    """CAD-adjust a ticker x period return matrix in one vectorized step.
+
+    Rows flagged in `fx_mask` become (1 + R) * (1 + R_fx) - 1 using the period FX
+    vector; the other rows are returned unchanged.
+    """
+    raw_returns = np.asarray(raw_returns, dtype=float)
+    fx_mask = np.asarray(fx_mask, dtype=bool)
+    return np.where(fx_mask[:, None], (1 + raw_returns) * (1 + fx_returns) - 1, raw_returns)
+
+
+def parse_period_dates(dates):
+    """Parse the weight date headers once and pair consecutive dates into periods."""
+    date_index = [pd.to_datetime(d, format="%d/%m/%Y") for d in dates]
+    periods = list(zip(date_index[:-1], date_index[1:]))
+    return date_index, periods
+
+
+def build_price_matrix(tickers, date_index, nav_dict, cache):
+    """Build a dense ticker x date price matrix.
+
+    Mutual fund NAVs take precedence where the NAV file has the date; every
+    other cell is an as-of read from the price store in one vectorized lookup
+    per ticker, and only the cells still missing are downloaded as
+    get_price_on_date would, without a second store lookup. Cash rows stay NaN.
+    """
+    price_matrix = np.full((len(tickers), len(date_index)), np.nan)
+    dates = pd.DatetimeIndex(date_index)
     
-    for ticker in all_tickers:
+    for row, ticker in enumerate(tickers):
         if ticker == CASH_TICKER:
             continue
         
-        prices[ticker] = {}
-        for date_str in dates:
-            date_val = pd.to_datetime(date_str, format="%d/%m/%Y")
-            
-            if ticker in nav_dict and date_val in nav_dict[ticker]:
-                prices[ticker][date_val] = nav_dict[ticker][date_val]
-            else:
-                prices[ticker][date_val] = get_price_on_date(ticker, date_val, cache)
-    
-    for ticker in all_tickers:
-        if ticker == CASH_TICKER:
-            returns[ticker] = {}
-            for i in range(len(dates) - 1):
-                start_date = pd.to_datetime(dates[i], format="%d/%m/%Y")
-                end_date = pd.to_datetime(dates[i+1], format="%d/%m/%Y")
-                returns[ticker][(start_date, end_date)] = 0.0
-            continue
+        row_prices = np.full(len(dates), np.nan)
+        if ticker in nav_dict:
+            nav = nav_dict[ticker]
+            for col, date in enumerate(date_index):
+                if date in nav:
+                    row_prices[col] = nav[date]
         
-        returns[ticker] = {}
-        for i in range(len(dates) - 1):
-            start_date = pd.to_datetime(dates[i], format="%d/%m/%Y")
-            end_date = pd.to_datetime(dates[i+1], format="%d/%m/%Y")
-            
-            if ticker not in prices or start_date not in prices[ticker] or end_date not in prices[ticker]:
-                raise ValueError(f"Missing price data for {ticker} on {start_date} or {end_date}")
-            
-            price_start = prices[ticker][start_date]
-            price_end = prices[ticker][end_date]
-            period_return = (price_end / price_start) - 1
-            
-            # Mutual funds (in nav_dict) use NAV data directly without FX adjustment
-            if ticker in nav_dict:
-                returns[ticker][(start_date, end_date)] = period_return
-            elif ticker.endswith('.TO') or ticker == "^GSPTSE":
-                returns[ticker][(start_date, end_date)] = period_return
-            else:
-                fx_return = get_fx_return(start_date, end_date, cache)
-                cad_adjusted_return = (1 + period_return) * (1 + fx_return) - 1
-                returns[ticker][(start_date, end_date)] = cad_adjusted_return
+        unpriced = np.isnan(row_prices)
+        if unpriced.any():
+            session_days = last_session_days(ticker, dates[unpriced])
+            row_prices[unpriced] = cache.get_prices(ticker, dates[unpriced], session_days)
+            for col, session_day in zip(np.flatnonzero(unpriced), session_days):
+                if np.isnan(row_prices[col]):
+                    row_prices[col] = _fetch_price_on_date(ticker, date_index[col], session_day, cache)
+        
+        price_matrix[row] = row_prices
     
-    return returns, prices
+    return price_matrix
+
 
+def compute_period_returns(price_matrix, cash_mask, fx_mask, fx_returns):
+    """Compute every ticker x period return from a ticker x date price matrix.
 
-def calculate_benchmark_returns(dates, cache):
-    """Calculate returns for all benchmarks."""
-    from constants import BENCHMARK_TICKERS, FX_TICKER
+    Period returns are P_end / P_start - 1 over consecutive columns, CAD-adjusted
+    for the rows in `fx_mask` and forced to zero for the rows in `cash_mask`.
+    """
+    with np.errstate(invalid="ignore"):
+        raw_returns = price_matrix[:, 1:] / price_matrix[:, :-1] - 1
+    adjusted_returns = apply_fx_adjustment(raw_returns, fx_mask, fx_returns)
+    return np.where(np.asarray(cash_mask, dtype=bool)[:, None], 0.0, adjusted_returns)
+
+
+def price_portfolio(portfolio, nav_dict, cache, preload=True):
+    """Fill in the price and return arrays of a PortfolioMatrix, and return it.
+
+    Prices are ticker x date (NAVs first for mutual funds, NaN for $CASH$);
+    returns are ticker x period, CAD-adjusted, and 0.0 for $CASH$. Pass
+    preload=False when the caller has already run preload_prices over the
+    collect_price_universe tickers.
+    """
+    tickers, date_labels = portfolio.tickers, portfolio.date_labels
+    periods = portfolio.periods
+    
+    if preload:
+        preload_prices(collect_price_universe(tickers, nav_dict, date_labels), date_labels, cache)
     
+    portfolio.prices = build_price_matrix(tickers, portfolio.dates, nav_dict, cache)
+    
+    fx_mask = np.array([t != CASH_TICKER and needs_fx_adjustment(t, nav_dict) for t in tickers], dtype=bool)
+    if fx_mask.any() and periods:
+        fx_returns = get_fx_returns(periods, cache)
+    else:
+        fx_returns = np.zeros(len(periods))
+    
+    portfolio.returns = compute_period_returns(portfolio.prices, portfolio.cash_mask, fx_mask, fx_returns)
+    return portfolio
+
+
+def calculate_benchmark_returns(dates, cache, preload=True):
+    """Calculate returns for all benchmarks (preload=False: already preloaded, see price_portfolio)."""
     benchmark_returns = {}
     
+    if preload:
+        preload_prices(list(BENCHMARK_TICKERS.values()), dates, cache)
+    
+    _, periods = parse_period_dates(dates)
+    fx_returns = get_fx_returns(periods, cache)
+    
     for bench_name, ticker in BENCHMARK_TICKERS.items():
         benchmark_returns[bench_name] = {}
-        for i in range(len(dates) - 1):
-            start_date = pd.to_datetime(dates[i], format="%d/%m/%Y")
-            end_date = pd.to_datetime(dates[i+1], format="%d/%m/%Y")
-            
+        for period_idx, (start_date, end_date) in enumerate(periods):
             if ticker == FX_TICKER:
-                benchmark_returns[bench_name][(start_date, end_date)] = get_fx_return(start_date, end_date, cache)
+                benchmark_returns[bench_name][(start_date, end_date)] = fx_returns[period_idx]
             else:
                 price_start = get_price_on_date(ticker, start_date, cache)
                 price_end = get_price_on_date(ticker, end_date, cache)
@@ -114,68 +335,64 @@ def calculate_benchmark_returns(dates, cache):
     return benchmark_returns
 
 
-def build_results_dataframe(weights_dict, returns, prices, dates, cache):
-    """Build the results DataFrame with all periods and YTD."""
-    from constants import CASH_TICKER, FX_TICKER
-    
-    all_tickers = sorted(weights_dict.keys())
+def compute_ytd_returns(tickers, first_prices, last_prices, first_date, last_date, cache):
+    """Cumulative first-to-last-date return of every ticker, CAD-adjusted in one pass.
+
+    Tickers without both prices (and $CASH$) get 0.0. Only .TO listings and the
+    TSX index skip the FX adjustment here.
+    """
+    first_prices = np.asarray(first_prices, dtype=float)
+    last_prices = np.asarray(last_prices, dtype=float)
     
-    periods = []
-    for i in range(len(dates) - 1):
-        start_date = pd.to_datetime(dates[i], format="%d/%m/%Y")
-        end_date = pd.to_datetime(dates[i+1], format="%d/%m/%Y")
-        periods.append((start_date, end_date))
+    cash_mask = np.array([t == CASH_TICKER for t in tickers], dtype=bool)
+    valid = ~cash_mask & ~np.isnan(first_prices) & ~np.isnan(last_prices)
+    fx_mask = valid & np.array([not t.endswith('.TO') and t != "^GSPTSE" for t in tickers], dtype=bool)
     
-    first_date = pd.to_datetime(dates[0], format="%d/%m/%Y")
-    last_date = pd.to_datetime(dates[-1], format="%d/%m/%Y")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ytd_returns = np.where(valid, last_prices / first_prices - 1, 0.0)
+    if fx_mask.any():
+        ytd_fx_return = get_fx_return(first_date, last_date, cache)
+        ytd_returns = np.where(fx_mask, (1 + ytd_returns) * (1 + ytd_fx_return) - 1, ytd_returns)
+    return ytd_returns
+
+
+def build_results_frame(tickers, weight_matrix, return_matrix, ytd_returns, cash_mask=None):
+    """Assemble the wide Weight_/Return_/Contrib_ results frame from matrices.
+
+    Contributions are weights times returns; YTD contribution is their sum over
+    periods ($CASH$ rows contribute 0.0). Rows are sorted by YTD contribution.
+    """
+    contrib_matrix = weight_matrix * return_matrix
+    ytd_contribs = contrib_matrix.sum(axis=1)
+    if cash_mask is not None:
+        ytd_contribs = np.where(cash_mask, 0.0, ytd_contribs)
     
-    data = []
-    for ticker in all_tickers:
-        row = {"Ticker": ticker}
-        
-        for period_idx, period in enumerate(periods):
-            start_date, end_date = period
-            weight = weights_dict.get(ticker, {}).get(start_date, 0.0)
-            period_return = returns.get(ticker, {}).get(period, 0.0)
-            contribution = weight * period_return
-            
-            row[f"Weight_{period_idx}"] = weight
-            row[f"Return_{period_idx}"] = period_return
-            row[f"Contrib_{period_idx}"] = contribution
-        
-        if ticker == CASH_TICKER:
-            ytd_return = 0.0
-            ytd_contrib = 0.0
-        else:
-            if ticker in prices and first_date in prices[ticker] and last_date in prices[ticker]:
-                first_price = prices[ticker][first_date]
-                last_price = prices[ticker][last_date]
-                ytd_return = (last_price / first_price) - 1
-                
-                if not ticker.endswith('.TO') and ticker != "^GSPTSE":
-                    fx_start = get_price_on_date(FX_TICKER, first_date, cache)
-                    fx_end = get_price_on_date(FX_TICKER, last_date, cache)
-                    fx_return = (fx_end / fx_start) - 1
-                    ytd_return = (1 + ytd_return) * (1 + fx_return) - 1
-            else:
-                ytd_return = 0.0
-            
-            ytd_contrib = sum(
-                returns.get(ticker, {}).get(period, 0.0) * weights_dict.get(ticker, {}).get(period[0], 0.0)
-                for period in periods
-            )
-        
-        row["YTD_Return"] = ytd_return
-        row["YTD_Contrib"] = ytd_contrib
-        
-        data.append(row)
+    columns = {"Ticker": list(tickers)}
+    for period_idx in range(weight_matrix.shape[1]):
+        columns[f"Weight_{period_idx}"] = weight_matrix[:, period_idx]
+        columns[f"Return_{period_idx}"] = return_matrix[:, period_idx]
+        columns[f"Contrib_{period_idx}"] = contrib_matrix[:, period_idx]
+    columns["YTD_Return"] = ytd_returns
+    columns["YTD_Contrib"] = ytd_contribs
     
-    df = pd.DataFrame(data)
+    df = pd.DataFrame(columns)
     
     if not df.empty and "YTD_Contrib" in df.columns:
         df = df.sort_values("YTD_Contrib", ascending=False)
     
-    return df, periods
+    return df
+
+
+def build_portfolio_results(portfolio, cache):
+    """Build the results DataFrame of a priced PortfolioMatrix; returns (df, periods)."""
+    dates = portfolio.dates
+    ytd_returns = compute_ytd_returns(
+        portfolio.tickers, portfolio.prices[:, 0], portfolio.prices[:, -1], dates[0], dates[-1], cache
+    )
+    df = build_results_frame(
+        portfolio.tickers, portfolio.period_weights, portfolio.returns, ytd_returns, portfolio.cash_mask
+    )
+    return df, portfolio.periods
 
 
 def get_ticker_performance(tickers, cache):
@@ -199,6 +416,12 @@ def get_ticker_performance(tickers, cache):
     
     results = {}
     
+    preload_prices(
+        [t for t in tickers if t != "CADCAD=X"],
+        [today, today - pd.Timedelta(days=1)] + list(dates.values()),
+        cache
+    )
+    
     for ticker in tickers:
         if ticker == "CADCAD=X":
             results[ticker] = {
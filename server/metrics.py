@@ -0,0 +1,175 @@
+"""In-process metrics exposed at /metrics in the Prometheus text format.
+
+Counters, gauges and histograms are kept per process in a small registry (no
+client library needed). Values that are cheaper to read on demand, like cache
+entry counts and on-disk sizes, are refreshed by scrape hooks just before the
+registry is rendered.
+"""
+
+import logging
+import math
+import threading
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upstream calls range from cached-on-Yahoo's-side milliseconds to slow bulk downloads
+FETCH_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def _samples(self):
+        with self._lock:
+            return [(self.name, key, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self._samples():
+            lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down."""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=FETCH_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][i] += 1
+            state["sum"] += value
+
+    def _samples(self):
+        samples = []
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, state["counts"]):
+                    samples.append((f"{self.name}_bucket", key + (("le", _format_value(bound)),), count))
+                samples.append((f"{self.name}_sum", key, state["sum"]))
+                samples.append((f"{self.name}_count", key, state["counts"][-1]))
+        return samples
+
+
+class Registry:
+    """Every metric of the process plus the hooks refreshing gauges at scrape time."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Duplicate metric: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def add_scrape_hook(self, hook):
+        """Call `hook()` before every render (to set gauges read on demand)."""
+        with self._lock:
+            self._hooks.append(hook)
+
+    def render(self):
+        with self._lock:
+            hooks = list(self._hooks)
+            metrics = list(self._metrics.values())
+        for hook in hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.warning(f"Metrics scrape hook {getattr(hook, '__name__', hook)} failed: {e}")
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+CACHE_HITS = Counter("cache_hits_total", "Lookups answered by a cache layer.", ["cache"])
+CACHE_MISSES = Counter("cache_misses_total", "Lookups a cache layer could not answer.", ["cache"])
+CACHE_EVICTIONS = Counter("cache_evictions_total", "Entries dropped from a cache layer (expiry or size limit).", ["cache"])
+CACHE_ENTRIES = Gauge("cache_entries", "Entries currently held by a cache layer.", ["cache"])
+CACHE_DISK_BYTES = Gauge("cache_disk_bytes", "On-disk size of a cache layer.", ["cache"])
+CACHE_MEMORY_BYTES = Gauge("cache_memory_bytes", "Memory held by a cache layer's loaded data.", ["cache"])
+
+FETCH_LATENCY = Histogram(
+    "upstream_fetch_duration_seconds", "Duration of upstream market data calls (per attempt).", ["operation"]
+)
+FETCH_FAILURES = Counter(
+    "upstream_fetch_failures_total", "Failed upstream call attempts.", ["operation", "reason"]
+)
+
+
+def add_scrape_hook(hook):
+    REGISTRY.add_scrape_hook(hook)
+
+
+def render():
+    """The whole registry in the Prometheus text exposition format."""
+    return REGISTRY.render()
@@ -3,6 +3,7 @@
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.pagebreak import Break
+import numpy as np
 import pandas as pd
 import datetime
 from constants import BENCHMARK_TICKERS, BENCHMARK_ORDER, CASH_TICKER, FX_TICKER
@@ -122,73 +123,60 @@ def create_monthly_periods(dates, periods=None):
     return monthly_periods
 
 
-def calculate_monthly_returns(weights_dict, nav_dict, monthly_periods, prices, cache):
-    """Calculate returns for monthly periods."""
-    from constants import CASH_TICKER, FX_TICKER
-    from market_data import get_fx_return, get_price_on_date
-    
-    all_tickers = sorted(weights_dict.keys())
-    monthly_returns = {}
-    
-    for ticker in all_tickers:
-        if ticker == CASH_TICKER:
-            monthly_returns[ticker] = {}
-            for period in monthly_periods:
-                monthly_returns[ticker][period] = 0.0
-            continue
-        
-        monthly_returns[ticker] = {}
-        for period in monthly_periods:
-            start_date, end_date = period
-            
-            # Get prices for start and end dates
-            if ticker in nav_dict:
-                if start_date in nav_dict[ticker] and end_date in nav_dict[ticker]:
-                    price_start = nav_dict[ticker][start_date]
-                    price_end = nav_dict[ticker][end_date]
-                elif start_date in prices.get(ticker, {}) and end_date in prices.get(ticker, {}):
-                    price_start = prices[ticker][start_date]
-                    price_end = prices[ticker][end_date]
-                else:
-                    price_start = get_price_on_date(ticker, start_date, cache)
-                    price_end = get_price_on_date(ticker, end_date, cache)
-            else:
-                if start_date in prices.get(ticker, {}) and end_date in prices.get(ticker, {}):
-                    price_start = prices[ticker][start_date]
-                    price_end = prices[ticker][end_date]
-                else:
-                    price_start = get_price_on_date(ticker, start_date, cache)
-                    price_end = get_price_on_date(ticker, end_date, cache)
-            
-            period_return = (price_end / price_start) - 1
-            
-            # Mutual funds (in nav_dict) use NAV data directly without FX adjustment
-            if ticker in nav_dict:
-                monthly_returns[ticker][period] = period_return
-            elif ticker.endswith('.TO') or ticker == "^GSPTSE":
-                monthly_returns[ticker][period] = period_return
-            else:
-                fx_return = get_fx_return(start_date, end_date, cache)
-                cad_adjusted_return = (1 + period_return) * (1 + fx_return) - 1
-                monthly_returns[ticker][period] = cad_adjusted_return
+def boundary_prices(portfolio, boundary_dates, cache):
+    """Ticker x date prices of a priced PortfolioMatrix on `boundary_dates`.
+
+    Weight dates are read from the price array; any other date goes through
+    get_price_on_date. $CASH$ rows stay NaN.
+    """
+    positions = portfolio.date_positions(boundary_dates)
+    prices = portfolio.prices[:, np.maximum(positions, 0)]
+    for col in np.flatnonzero(positions < 0):
+        for row, ticker in enumerate(portfolio.tickers):
+            prices[row, col] = np.nan if ticker == CASH_TICKER else get_price_on_date(ticker, boundary_dates[col], cache)
+    return prices
+
+
+def _monthly_price_returns(portfolio, monthly_periods, cache):
+    """Ticker x month price returns from month start to month end, before FX."""
+    starts = boundary_prices(portfolio, [start for start, _ in monthly_periods], cache)
+    ends = boundary_prices(portfolio, [end for _, end in monthly_periods], cache)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return starts, ends / starts - 1
+
+
+def calculate_monthly_returns(portfolio, nav_dict, monthly_periods, cache):
+    """Ticker x month CAD returns of a priced PortfolioMatrix ($CASH$ rows are 0.0)."""
+    from market_data import get_fx_returns, needs_fx_adjustment, apply_fx_adjustment
     
-    return monthly_returns
+    _, raw_returns = _monthly_price_returns(portfolio, monthly_periods, cache)
+    
+    # CAD-adjust every non-CAD holding with the monthly FX vector in one pass
+    cash_mask = portfolio.cash_mask
+    fx_mask = ~cash_mask & np.array([needs_fx_adjustment(t, nav_dict) for t in portfolio.tickers], dtype=bool)
+    if fx_mask.any() and monthly_periods:
+        fx_returns = get_fx_returns(monthly_periods, cache)
+    else:
+        fx_returns = np.zeros(len(monthly_periods))
+    adjusted_returns = apply_fx_adjustment(raw_returns, fx_mask, fx_returns)
+    return np.where(cash_mask[:, None], 0.0, adjusted_returns)
 
 
 def calculate_monthly_benchmark_returns(monthly_periods, cache):
     """Calculate benchmark returns for monthly periods."""
     from constants import BENCHMARK_TICKERS, FX_TICKER
-    from market_data import get_fx_return, get_price_on_date
+    from market_data import get_fx_returns, get_price_on_date
     
     benchmark_returns = {}
+    fx_returns = get_fx_returns(monthly_periods, cache)
     
     for bench_name, ticker in BENCHMARK_TICKERS.items():
         benchmark_returns[bench_name] = {}
-        for period in monthly_periods:
+        for period_idx, period in enumerate(monthly_periods):
             start_date, end_date = period
             
             if ticker == FX_TICKER:
-                benchmark_returns[bench_name][period] = get_fx_return(start_date, end_date, cache)
+                benchmark_returns[bench_name][period] = fx_returns[period_idx]
             else:
                 price_start = get_price_on_date(ticker, start_date, cache)
                 price_end = get_price_on_date(ticker, end_date, cache)
@@ -197,10 +185,9 @@ def calculate_monthly_benchmark_returns(monthly_periods, cache):
     return benchmark_returns
 
 
-def build_monthly_dataframe(weights_dict, monthly_returns, monthly_periods, dates, cache, nav_dict=None, periods=None, period_df=None):
+def build_monthly_dataframe(portfolio, monthly_returns, monthly_periods, dates, cache, nav_dict=None, periods=None, period_df=None):
     """Build monthly results DataFrame - aggregate data from period sheet only."""
-    from constants import CASH_TICKER, FX_TICKER
-    from market_data import get_price_on_date, get_fx_return
+    from market_data import get_fx_return, get_fx_returns, needs_fx_adjustment, apply_fx_adjustment
     
     if nav_dict is None:
         nav_dict = {}
@@ -208,114 +195,58 @@ def build_monthly_dataframe(weights_dict, monthly_returns, monthly_periods, date
     if periods is None or period_df is None:
         raise ValueError("periods and period_df must be provided to build monthly dataframe")
     
-    all_tickers = sorted(weights_dict.keys())
-    
-    data = []
-    for ticker in all_tickers:
-        row = {"Ticker": ticker}
-        
-        for period_idx, monthly_period in enumerate(monthly_periods):
-            monthly_start, monthly_end = monthly_period
-            
-            # Calculate monthly return from start to end of month (actual return, not weighted)
-            monthly_return = 0.0
-            if ticker == CASH_TICKER:
-                monthly_return = 0.0
-            else:
-                # Get prices for start and end of month
-                if ticker in nav_dict:
-                    if monthly_start in nav_dict[ticker] and monthly_end in nav_dict[ticker]:
-                        price_start = nav_dict[ticker][monthly_start]
-                        price_end = nav_dict[ticker][monthly_end]
-                    else:
-                        price_start = get_price_on_date(ticker, monthly_start, cache)
-                        price_end = get_price_on_date(ticker, monthly_end, cache)
-                else:
-                    price_start = get_price_on_date(ticker, monthly_start, cache)
-                    price_end = get_price_on_date(ticker, monthly_end, cache)
-                
-                if price_start and price_start > 0:
-                    period_return = (price_end / price_start) - 1
-                    
-                    # Apply FX adjustment if needed
-                    if ticker in nav_dict:
-                        monthly_return = period_return
-                    elif ticker.endswith('.TO') or ticker == "^GSPTSE":
-                        monthly_return = period_return
-                    else:
-                        fx_return = get_fx_return(monthly_start, monthly_end, cache)
-                        monthly_return = (1 + period_return) * (1 + fx_return) - 1
-                else:
-                    monthly_return = 0.0
-            
-            # Sum contributions from all subperiods within this month from period_sheet
-            contribution = 0.0
-            ticker_data = period_df[period_df['Ticker'] == ticker]
-            
-            if not ticker_data.empty:
-                # Find all periods that fall within this monthly period
-                for period_idx_sub, period in enumerate(periods):
-                    period_start, period_end = period
-                    # Check if this period falls within the monthly period
-                    # Period should be completely within the monthly period
-                    if period_start >= monthly_start and period_end <= monthly_end:
-                        contrib_col = f'Contrib_{period_idx_sub}'
-                        if contrib_col in period_df.columns:
-                            contrib_val = ticker_data[contrib_col].iloc[0]
-                            if pd.notna(contrib_val):
-                                contribution += contrib_val
-            
-            row[f"Return_{period_idx}"] = monthly_return
-            row[f"Contrib_{period_idx}"] = contribution
-        
-        # Calculate YTD return and contribution
-        if ticker == CASH_TICKER:
-            ytd_return = 0.0
-            ytd_contrib = 0.0
-        else:
-            # Calculate YTD return from first to last date of all monthly periods
-            if monthly_periods:
-                first_period = monthly_periods[0]
-                last_period = monthly_periods[-1]
-                first_date = first_period[0]
-                last_date = last_period[1]
-                
-                # Get prices for first and last dates
-                if ticker in nav_dict:
-                    if first_date in nav_dict[ticker] and last_date in nav_dict[ticker]:
-                        price_start = nav_dict[ticker][first_date]
-                        price_end = nav_dict[ticker][last_date]
-                    else:
-                        price_start = get_price_on_date(ticker, first_date, cache)
-                        price_end = get_price_on_date(ticker, last_date, cache)
-                else:
-                    price_start = get_price_on_date(ticker, first_date, cache)
-                    price_end = get_price_on_date(ticker, last_date, cache)
-                
-                if price_start and price_start > 0:
-                    ytd_return = (price_end / price_start) - 1
-                    
-                    # Apply FX adjustment if needed
-                    if not (ticker.endswith('.TO') or ticker == "^GSPTSE" or ticker in nav_dict):
-                        fx_return = get_fx_return(first_date, last_date, cache)
-                        ytd_return = (1 + ytd_return) * (1 + fx_return) - 1
-                else:
-                    ytd_return = 0.0
-            else:
-                ytd_return = 0.0
-            
-            # YTD contribution is sum of all monthly contributions
-            ytd_contrib = sum(
-                row.get(f'Contrib_{period_idx}', 0.0)
-                for period_idx in range(len(monthly_periods))
-            )
-        
-        row["YTD_Return"] = ytd_return
-        row["YTD_Contrib"] = ytd_contrib
-        
-        data.append(row)
-    
-    df = pd.DataFrame(data)
+    tickers = portfolio.tickers
+    if not tickers:
+        return pd.DataFrame()
+    cash_mask = portfolio.cash_mask
+    fx_mask = np.array([needs_fx_adjustment(t, nav_dict) for t in tickers], dtype=bool)
+    
+    # Monthly return from start to end of month (actual return, not weighted);
+    # stays 0.0 without FX adjustment when the start price is unusable
+    start_prices, raw_returns = _monthly_price_returns(portfolio, monthly_periods, cache)
+    valid = ~cash_mask[:, None] & (start_prices > 0)
+    if (valid & fx_mask[:, None]).any():
+        fx_returns = get_fx_returns(monthly_periods, cache)
+    else:
+        fx_returns = np.zeros(len(monthly_periods))
+    monthly_return_matrix = np.where(valid, apply_fx_adjustment(raw_returns, fx_mask, fx_returns), 0.0)
+    
+    # Contribution of a month: the period sheet's contributions of the periods
+    # lying entirely within it
+    contrib_cols = [f"Contrib_{i}" for i in range(len(periods))]
+    period_contribs = (
+        period_df.drop_duplicates("Ticker").set_index("Ticker")
+        .reindex(index=tickers, columns=contrib_cols).to_numpy(dtype=float)
+    )
+    period_contribs = np.nan_to_num(period_contribs, nan=0.0)
+    period_starts = pd.DatetimeIndex([start for start, _ in periods])
+    period_ends = pd.DatetimeIndex([end for _, end in periods])
+    monthly_contribs = np.zeros((len(tickers), len(monthly_periods)))
+    for period_idx, (monthly_start, monthly_end) in enumerate(monthly_periods):
+        within = np.flatnonzero((period_starts >= monthly_start) & (period_ends <= monthly_end))
+        monthly_contribs[:, period_idx] = period_contribs[:, within].sum(axis=1)
+    
+    # YTD return from the first to the last date of all monthly periods
+    ytd_returns = np.zeros(len(tickers))
+    if monthly_periods:
+        first_date, last_date = monthly_periods[0][0], monthly_periods[-1][1]
+        ytd_prices = boundary_prices(portfolio, [first_date, last_date], cache)
+        ytd_valid = ~cash_mask & (ytd_prices[:, 0] > 0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ytd_returns = np.where(ytd_valid, ytd_prices[:, 1] / ytd_prices[:, 0] - 1, 0.0)
+        if (ytd_valid & fx_mask).any():
+            ytd_fx_return = get_fx_return(first_date, last_date, cache)
+            ytd_returns = np.where(ytd_valid & fx_mask, (1 + ytd_returns) * (1 + ytd_fx_return) - 1, ytd_returns)
+    
+    columns = {"Ticker": list(tickers)}
+    for period_idx in range(len(monthly_periods)):
+        columns[f"Return_{period_idx}"] = monthly_return_matrix[:, period_idx]
+        columns[f"Contrib_{period_idx}"] = monthly_contribs[:, period_idx]
+    columns["YTD_Return"] = ytd_returns
+    # YTD contribution is the sum of all monthly contributions
+    columns["YTD_Contrib"] = np.where(cash_mask, 0.0, monthly_contribs.sum(axis=1))
+    
+    df = pd.DataFrame(columns)
     
     if not df.empty and "YTD_Contrib" in df.columns:
         df = df.sort_values("YTD_Contrib", ascending=False)
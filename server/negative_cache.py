@@ -0,0 +1,89 @@
+"""Short-lived memory of market data the provider could not serve.
+
+Delisted tickers, dates without data and tickers without a sector are
+remembered for NEGATIVE_CACHE_TTL_SECONDS, so repeated requests fail (or skip
+them) immediately instead of repeating the same upstream round trip. Upstream
+errors are remembered for the shorter NEGATIVE_CACHE_ERROR_TTL_SECONDS, enough
+to stop hammering a failing provider without hiding an outage for long.
+
+Keys are tuples namespaced by the path using them, e.g. ("price", ticker, day),
+("sector", ticker), ("beta", ticker) or ("performance", ticker).
+"""
+
+import threading
+import time
+
+from constants import (
+    NEGATIVE_CACHE_TTL_SECONDS, NEGATIVE_CACHE_ERROR_TTL_SECONDS, NEGATIVE_CACHE_MAX_ENTRIES
+)
+from metrics import CACHE_HITS, CACHE_MISSES, CACHE_EVICTIONS, CACHE_ENTRIES, add_scrape_hook
+
+
+class NegativeCache:
+    """Thread-safe key -> reason map whose entries expire after a TTL."""
+
+    def __init__(self, ttl=NEGATIVE_CACHE_TTL_SECONDS, error_ttl=NEGATIVE_CACHE_ERROR_TTL_SECONDS,
+                 max_entries=NEGATIVE_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self.max_entries = max_entries
+        self._entries = {}  # key -> (expires_at, reason), in insertion order
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the recorded reason if `key` is known to be unservable, else None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            CACHE_MISSES.inc(cache="negative")
+            return None
+        expires_at, reason = entry
+        if time.monotonic() >= expires_at:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                    CACHE_EVICTIONS.inc(cache="negative")
+            CACHE_MISSES.inc(cache="negative")
+            return None
+        CACHE_HITS.inc(cache="negative")
+        return reason
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def add(self, key, reason="no data", error=False):
+        """Remember `key` as unservable; `error=True` uses the shorter error TTL."""
+        ttl = self.error_ttl if error else self.ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + ttl, reason)
+            if len(self._entries) > self.max_entries:
+                self._evict()
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self):
+        """Drop expired entries, then the oldest ones, until back under the limit."""
+        now = time.monotonic()
+        expired = {k for k, (expires_at, _) in self._entries.items() if expires_at <= now}
+        excess = len(self._entries) - len(expired) - self.max_entries
+        evicted = list(expired) + [k for k in self._entries if k not in expired][:max(excess, 0)]
+        for key in evicted:
+            del self._entries[key]
+        CACHE_EVICTIONS.inc(len(evicted), cache="negative")
+
+
+# Shared by every request path in the process
+negative_cache = NegativeCache()
+
+add_scrape_hook(lambda: CACHE_ENTRIES.set(len(negative_cache), cache="negative"))
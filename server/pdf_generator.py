@@ -10,12 +10,12 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 import pandas as pd
 
 from top_contributors_sheet import (
-    group_periods_by_month,
     group_months_by_quarter,
     aggregate_monthly_data,
     aggregate_quarterly_data
 )
 from constants import CASH_TICKER, BENCHMARK_TICKERS
+from portfolio_matrix import month_groups
 
 
 # Colors matching Excel
@@ -299,8 +299,8 @@ def generate_pdf(df: pd.DataFrame, periods: list, dates: list) -> BytesIO:
     )
     
     # Group periods by month
-    month_groups = group_periods_by_month(periods)
-    sorted_months = sorted(month_groups.keys())
+    period_months = month_groups(periods)
+    sorted_months = sorted(period_months.keys())
     
     # Find first January
     first_january_idx = 0
@@ -345,8 +345,8 @@ def generate_pdf(df: pd.DataFrame, periods: list, dates: list) -> BytesIO:
         
         # Create table for each month in the quarter
         for year, month in quarter_months:
-            month_periods = month_groups.get((year, month), [])
-            if month_periods:
+            month_periods = period_months.get((year, month), [])
+            if len(month_periods):
                 month_df = aggregate_monthly_data(df, periods, month_periods)
                 month_name = f"{month_names[month]} {year}"
                 table = create_contributors_table(month_name, month_df)
@@ -357,7 +357,7 @@ def generate_pdf(df: pd.DataFrame, periods: list, dates: list) -> BytesIO:
         if has_quarter and len(quarter_months) == 3:
             quarter_num = (quarter_months[0][1] - 1) // 3 + 1
             quarter_year = quarter_months[0][0]
-            quarter_df = aggregate_quarterly_data(df, periods, quarter_months, month_groups)
+            quarter_df = aggregate_quarterly_data(df, periods, quarter_months, period_months)
             quarter_name = f"Q{quarter_num} {quarter_year}"
             q_table = create_contributors_table(quarter_name, quarter_df)
             if q_table:
@@ -384,3 +384,8 @@ def generate_pdf(df: pd.DataFrame, periods: list, dates: list) -> BytesIO:
     doc.build(elements)
     buffer.seek(0)
     return buffer
+
+
+def generate_pdf_bytes(df: pd.DataFrame, periods: list, dates: list) -> bytes:
+    """generate_pdf as raw bytes, so it can run in a worker process."""
+    return generate_pdf(df, periods, dates).getvalue()
@@ -36,19 +36,6 @@ def create_period_sheet(wb, df, periods, benchmark_returns, dates, cache):
         bottom=Side(style='medium', color='000000')
     )
     
-    # Group periods by month for spacing
-    def group_periods_by_month(periods):
-        """Group periods by month to determine spacing."""
-        month_groups = {}
-        for idx, period in enumerate(periods):
-            month_key = (period[0].year, period[0].month)
-            if month_key not in month_groups:
-                month_groups[month_key] = []
-            month_groups[month_key].append((idx, period))
-        return month_groups
-    
-    month_groups = group_periods_by_month(periods)
-    
     current_row = 2  # Start at row 2, leaving row 1 empty
     
     col_offset = 4  # Periods start at column D (column A is empty, column B is tickers, column C is spacer)
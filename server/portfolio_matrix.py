@@ -0,0 +1,104 @@
+"""Array-backed holdings, the core data structure of an analysis.
+
+A PortfolioMatrix keeps a sorted ticker index, the index of weight dates and
+contiguous float64 arrays:
+
+    weights   ticker x date     weights as uploaded (NaN where not held)
+    prices    ticker x date     closes, or NAVs for mutual funds (NaN for $CASH$)
+    returns   ticker x period   CAD returns over consecutive weight dates
+
+Row t belongs to tickers[t], column d to dates[d], and period p runs from
+dates[p] to dates[p + 1]. Prices and returns stay None until
+market_data.price_portfolio fills them in. month_groups gives the period
+indexes of each month, for the report sheets that aggregate by month and quarter.
+"""
+
+import numpy as np
+import pandas as pd
+
+from constants import CASH_TICKER
+
+
+def month_groups(periods):
+    """{(year, month): period indexes} grouping periods by the month of their end date."""
+    groups = {}
+    for period_idx, (_, period_end) in enumerate(periods):
+        groups.setdefault((period_end.year, period_end.month), []).append(period_idx)
+    return {key: np.array(indexes, dtype=int) for key, indexes in groups.items()}
+
+
+class PortfolioMatrix:
+    """Weights, prices and returns of a set of holdings over the weight dates."""
+
+    def __init__(self, tickers, dates, weights, prices=None, returns=None):
+        self.tickers = list(tickers)
+        self.dates = pd.DatetimeIndex(dates)
+        self.weights = np.ascontiguousarray(weights, dtype=float).reshape(len(self.tickers), len(self.dates))
+        self.prices = None if prices is None else np.ascontiguousarray(prices, dtype=float)
+        self.returns = None if returns is None else np.ascontiguousarray(returns, dtype=float)
+
+    @classmethod
+    def from_arrays(cls, tickers, dates, weights):
+        """From a loaded ticker x date weights matrix (see data_loader.load_weights_matrix).
+
+        Rows are sorted by ticker; a repeated ticker keeps its last row.
+        """
+        last_row = {ticker: row for row, ticker in enumerate(tickers)}
+        sorted_tickers = sorted(last_row)
+        weights = np.asarray(weights, dtype=float).reshape(len(tickers), len(dates))
+        return cls(sorted_tickers, dates, weights[[last_row[t] for t in sorted_tickers]])
+
+    @classmethod
+    def from_dicts(cls, weights_dict, dates, prices=None, returns=None):
+        """From {ticker: {date: weight}} and the "dd/mm/YYYY" weight dates.
+
+        Optional {ticker: {date: price}} and {ticker: {(start, end): return}}
+        dicts fill the price (NaN where missing) and return (0.0) arrays.
+        """
+        tickers = sorted(weights_dict.keys())
+        date_index = [pd.to_datetime(d, format="%d/%m/%Y") for d in dates]
+        portfolio = cls(
+            tickers, date_index,
+            [[weights_dict[t].get(d, np.nan) for d in date_index] for t in tickers]
+        )
+        if prices is not None:
+            portfolio.prices = np.array(
+                [[prices.get(t, {}).get(d, np.nan) for d in date_index] for t in tickers], dtype=float
+            ).reshape(portfolio.weights.shape)
+        if returns is not None:
+            periods = portfolio.periods
+            portfolio.returns = np.array(
+                [[returns.get(t, {}).get(p, 0.0) for p in periods] for t in tickers], dtype=float
+            ).reshape(len(tickers), len(periods))
+        return portfolio
+
+    def __len__(self):
+        return len(self.tickers)
+
+    @property
+    def periods(self):
+        """(start, end) Timestamps of every period."""
+        return list(zip(self.dates[:-1], self.dates[1:]))
+
+    @property
+    def date_labels(self):
+        """The weight dates as "dd/mm/YYYY" strings, as the report builders take them."""
+        return self.dates.strftime("%d/%m/%Y").tolist()
+
+    @property
+    def cash_mask(self):
+        return np.array([t == CASH_TICKER for t in self.tickers], dtype=bool)
+
+    @property
+    def period_weights(self):
+        """Ticker x period beginning-of-period weights (0.0 where not held)."""
+        return np.nan_to_num(self.weights[:, :-1], nan=0.0)
+
+    @property
+    def contributions(self):
+        """Ticker x period weight times return."""
+        return self.period_weights * self.returns
+
+    def date_positions(self, dates):
+        """Column of each date in `dates` (-1 for dates that are not weight dates)."""
+        return self.dates.get_indexer(pd.DatetimeIndex(dates))
@@ -3,13 +3,12 @@ Portfolio Returns and Contribution Analysis
 Generates professional Excel report for portfolio performance and attribution analysis.
 """
 
-from datetime import datetime
 from pathlib import Path
 import tkinter as tk
 from tkinter import filedialog, messagebox
 
-from data_loader import load_weights_file, load_nav_file
-from market_data import calculate_returns, calculate_benchmark_returns, build_results_dataframe
+from data_loader import load_portfolio, load_nav_file
+from market_data import price_portfolio, calculate_benchmark_returns, build_portfolio_results
 from cache_manager import load_cache, save_cache
 from excel_formatter import create_excel_report
 
@@ -23,17 +22,11 @@ def main(weights_file, nav_file=None, output_dir=None):
     cache = load_cache()
     
     print("Loading weights file...")
-    weights_dict, dates = load_weights_file(weights_file)
+    portfolio = load_portfolio(weights_file)
+    dates = portfolio.date_labels
     
     holdings_name = Path(weights_file).stem
-    last_date_header = dates[-1]
-    
-    if isinstance(last_date_header, datetime):
-        last_date = last_date_header
-    else:
-        last_date = datetime.strptime(last_date_header, "%d/%m/%Y")
-    
-    formatted_date = last_date.strftime("%d %b %Y")
+    formatted_date = portfolio.dates[-1].strftime("%d %b %Y")
     output_path = output_dir / f"Returns Contribution - {holdings_name} - {formatted_date}.xlsx"
     
     nav_dict = {}
@@ -42,7 +35,7 @@ def main(weights_file, nav_file=None, output_dir=None):
         nav_dict = load_nav_file(nav_file)
     
     print("Fetching market data and calculating returns...")
-    returns, prices = calculate_returns(weights_dict, nav_dict, dates, cache)
+    price_portfolio(portfolio, nav_dict, cache)
     
     print("Calculating benchmark returns...")
     benchmark_returns = calculate_benchmark_returns(dates, cache)
@@ -50,11 +43,11 @@ def main(weights_file, nav_file=None, output_dir=None):
     save_cache(cache)
     
     print("Building results dataframe...")
-    df, periods = build_results_dataframe(weights_dict, returns, prices, dates, cache)
+    df, periods = build_portfolio_results(portfolio, cache)
     
     print("Creating Excel report...")
-    create_excel_report(df, periods, benchmark_returns, dates, output_path, cache, 
-                       weights_dict=weights_dict, returns=returns, prices=prices, nav_dict=nav_dict)
+    create_excel_report(df, periods, benchmark_returns, dates, output_path, cache,
+                       nav_dict=nav_dict, portfolio=portfolio)
     
     print("Done!")
 
@@ -69,7 +62,7 @@ def select_files():
     weights_file = filedialog.askopenfilename(
         title="Select Portfolio Weights File",
         initialdir="C:/Users/Phili/iCloudDrive/GitHub/Return_Contribution_Files",
-        filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")]
+        filetypes=[("Holdings files", "*.xlsx *.xls *.csv *.parquet"), ("All files", "*.*")]
     )
     
     if not weights_file:
@@ -83,7 +76,7 @@ def select_files():
     nav_file = filedialog.askopenfilename(
         title="Select Mutual Fund NAV File (Optional)",
         initialdir="C:/Users/Phili/iCloudDrive/GitHub/Return_Contribution_Files",
-        filetypes=[("Excel files", "*.xlsx *.xls"), ("All files", "*.*")]
+        filetypes=[("Holdings files", "*.xlsx *.xls *.csv *.parquet"), ("All files", "*.*")]
     )
     
     if nav_file:
@@ -0,0 +1,446 @@
+"""Columnar on-disk store for daily prices.
+
+Each ticker lives in its own binary file of fixed-size (day, close) records, so
+the store only ever appends new records and a ticker is read from disk the first
+time it is looked up. In memory every ticker is a pair of aligned NumPy arrays:
+a sorted day index and the matching closes.
+
+Several processes can share one store directory: appends are serialized with a
+cross-process lock, and a lookup that misses first picks up any records other
+processes appended to the ticker file since it was read.
+
+Only settled closes (sessions before today in MARKET_TIMEZONE) are persisted and
+they never expire. Closes for today are provisional: they may be intraday
+quotes, so they are kept in memory for PROVISIONAL_PRICE_TTL_SECONDS and then
+refetched.
+
+Loaded tickers are kept in LRU order and the coldest ones are unloaded when the
+arrays exceed the memory budget. Files only grow between compactions (see
+`compact`), which rewrites them as dense sorted series and trims the store to a
+disk budget.
+"""
+
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+
+from constants import MARKET_TIMEZONE, PROVISIONAL_PRICE_TTL_SECONDS
+from file_lock import file_lock, atomic_write_bytes
+from metrics import CACHE_HITS, CACHE_MISSES, CACHE_EVICTIONS
+
+RECORD_DTYPE = np.dtype([("day", "<i4"), ("close", "<f8")])
+FILE_SUFFIX = ".bin"
+
+
+def to_day(date):
+    """Convert a date-like value to the integer day used as the store index."""
+    return pd.Timestamp(date).toordinal()
+
+
+def to_days(dates):
+    """Vectorized to_day for a sequence of dates (fastest for a DatetimeIndex)."""
+    if len(dates) == 0:
+        return np.empty(0, dtype=np.int64)
+    if not isinstance(dates, pd.DatetimeIndex):
+        dates = pd.DatetimeIndex(dates)
+    # Ordinal of 1970-01-01, so epoch days line up with Timestamp.toordinal()
+    return dates.to_numpy(dtype="datetime64[D]").astype(np.int64) + 719163
+
+
+def from_day(day):
+    """Convert a store day back to a Timestamp."""
+    return pd.Timestamp.fromordinal(int(day))
+
+
+def current_day():
+    """Store day of today in MARKET_TIMEZONE: closes from this day on are provisional."""
+    return pd.Timestamp.now(tz=MARKET_TIMEZONE).toordinal()
+
+
+def _read_records(path, offset=0):
+    """Read the complete records of a ticker file from `offset` onwards.
+
+    A torn trailing record (crash or concurrent append) is ignored. Returns the
+    records and the file offset just past the last complete one.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        raw = f.read()
+    usable = len(raw) - len(raw) % RECORD_DTYPE.itemsize
+    return np.frombuffer(raw[:usable], dtype=RECORD_DTYPE), offset + usable
+
+
+def _append_records(path, records):
+    """Append records durably, first dropping any torn record left by a crash.
+
+    Returns the file size after the append. Callers must hold the store lock.
+    """
+    with open(path, "ab") as f:
+        size = f.seek(0, os.SEEK_END)
+        torn = size % RECORD_DTYPE.itemsize
+        if torn:
+            f.truncate(size - torn)
+            f.seek(0, os.SEEK_END)
+        f.write(records.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def _collapse(days, closes):
+    """Sort records by day, keeping the most recently written close for each day."""
+    # np.unique keeps the first occurrence, so reverse to let later writes win
+    unique_days, first_idx = np.unique(days[::-1], return_index=True)
+    return unique_days.astype(np.int32), closes[::-1][first_idx].astype(np.float64)
+
+
+def _redundant_records(days, closes, sessions):
+    """Mask of non-session records that only repeat the preceding session's close.
+
+    `sessions` holds the last session on or before each day. As-of lookups
+    resolve such days from the session record itself, so they can be dropped;
+    records pinned where the session has no close are kept.
+    """
+    if not len(days):
+        return np.zeros(0, dtype=bool)
+    pos = np.minimum(np.searchsorted(days, sessions), len(days) - 1)
+    has_session_close = days[pos] == sessions
+    return (sessions != days) & has_session_close & (closes[pos] == closes)
+
+
+class PriceStore:
+    """Per-ticker price arrays backed by append-only files under one directory.
+
+    Lookups are as-of: the close for a date is the last stored close on or
+    before it, accepted only if it is no older than the session the caller
+    expects (see trading_calendar), so weekends and holidays resolve in memory.
+    """
+
+    def __init__(self, root, provisional_ttl=PROVISIONAL_PRICE_TTL_SECONDS, max_memory_bytes=None):
+        self.root = Path(root)
+        self.provisional_ttl = provisional_ttl
+        self.max_memory_bytes = max_memory_bytes
+        self._series = OrderedDict()  # ticker -> (days, closes) arrays incl. unwritten records, LRU first
+        self._memory_bytes = 0
+        self._pending = {}  # ticker -> list of record arrays not yet written to disk
+        self._offsets = {}  # ticker -> bytes of its file already merged in memory
+        self._provisional = {}  # ticker -> {day: (close, expires_at)}, memory only
+        self._lock = threading.RLock()
+        self._file_lock_path = self.root / "store"
+
+    def _path(self, ticker):
+        return self.root / (quote(ticker, safe="") + FILE_SUFFIX)
+
+    def _set_series(self, ticker, series):
+        """Install a ticker's arrays as most recently used, then enforce the memory budget."""
+        self._drop_series(ticker)
+        self._series[ticker] = series
+        self._memory_bytes += series[0].nbytes + series[1].nbytes
+        self._evict_cold(keep=ticker)
+
+    def _drop_series(self, ticker):
+        series = self._series.pop(ticker, None)
+        if series is not None:
+            self._memory_bytes -= series[0].nbytes + series[1].nbytes
+            self._offsets.pop(ticker, None)
+
+    def _evict_cold(self, keep):
+        """Unload least recently used tickers until within max_memory_bytes.
+
+        Tickers with unwritten records stay loaded; the others are read from disk
+        again on their next lookup.
+        """
+        if self.max_memory_bytes is None or self._memory_bytes <= self.max_memory_bytes:
+            return
+        evicted = 0
+        for ticker in list(self._series):
+            if self._memory_bytes <= self.max_memory_bytes:
+                break
+            if ticker == keep or ticker in self._pending:
+                continue
+            self._drop_series(ticker)
+            evicted += 1
+        if evicted:
+            CACHE_EVICTIONS.inc(evicted, cache="prices")
+
+    def _load(self, ticker):
+        """Return the in-memory arrays for a ticker, reading its file on first use."""
+        series = self._series.get(ticker)
+        if series is not None:
+            self._series.move_to_end(ticker)
+            return series
+
+        path = self._path(ticker)
+        if path.exists():
+            records, offset = _read_records(path)
+            series = _collapse(records["day"], records["close"])
+        else:
+            series = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float64))
+            offset = 0
+        self._set_series(ticker, series)
+        self._offsets[ticker] = offset
+        return series
+
+    def _merge(self, ticker, days, closes):
+        """Merge records into a ticker's arrays; the new closes win on equal days."""
+        stored_days, stored_closes = self._load(ticker)
+        offset = self._offsets[ticker]
+        series = _collapse(
+            np.concatenate([stored_days, days]),
+            np.concatenate([stored_closes, closes])
+        )
+        self._set_series(ticker, series)
+        self._offsets[ticker] = offset
+        return series
+
+    def _refresh(self, ticker):
+        """Merge records other processes appended to a ticker file since we read it."""
+        path = self._path(ticker)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return self._load(ticker)
+
+        offset = self._offsets.get(ticker, 0)
+        if size < offset:
+            # The file was rewritten (e.g. compacted): reload it, keeping our unwritten records
+            self._drop_series(ticker)
+            series = self._load(ticker)
+            for records in self._pending.get(ticker, []):
+                series = self._merge(ticker, records["day"], records["close"])
+            return series
+        if size - offset < RECORD_DTYPE.itemsize:
+            return self._load(ticker)
+
+        self._load(ticker)
+        records, self._offsets[ticker] = _read_records(path, offset)
+        return self._merge(ticker, records["day"], records["close"])
+
+    def _live_provisional(self, ticker):
+        """Unexpired provisional closes of a ticker as sorted (days, closes) arrays, or None."""
+        entries = self._provisional.get(ticker)
+        if not entries:
+            return None
+        now, today = time.monotonic(), current_day()
+        expired = [d for d, (_, expires_at) in entries.items() if expires_at <= now or d < today]
+        for day in expired:
+            del entries[day]
+        if expired:
+            CACHE_EVICTIONS.inc(len(expired), cache="prices")
+        if not entries:
+            del self._provisional[ticker]
+            return None
+        days = np.array(sorted(entries), dtype=np.int32)
+        return days, np.array([entries[d][0] for d in days.tolist()], dtype=np.float64)
+
+    @staticmethod
+    def _as_of(series, days):
+        """Last stored (day, close) on or before each day; day -1 and NaN where none."""
+        stored_days, closes = series
+        found_days = np.full(len(days), -1, dtype=np.int64)
+        found_closes = np.full(len(days), np.nan)
+        if len(stored_days):
+            pos = np.searchsorted(stored_days, days, side="right") - 1
+            found = pos >= 0
+            found_days[found] = stored_days[pos[found]]
+            found_closes[found] = closes[pos[found]]
+        return found_days, found_closes
+
+    def _lookup(self, series, provisional, days):
+        """As-of search over both tiers; the more recent day wins, settled on ties."""
+        found_days, found_closes = self._as_of(series, days)
+        if provisional is not None:
+            provisional_days, provisional_closes = self._as_of(provisional, days)
+            newer = provisional_days > found_days
+            found_days = np.where(newer, provisional_days, found_days)
+            found_closes = np.where(newer, provisional_closes, found_closes)
+        return found_days, found_closes
+
+    def get_prices(self, ticker, dates, session_days=None, record=True):
+        """Closes as of each date, NaN where the store cannot answer.
+
+        `session_days` (store days, aligned with `dates`) are the sessions each
+        date must be covered from; a stored close older than that is a miss.
+        Without it only exact-date closes count. Probes that only check what
+        the store holds pass record=False so the hit/miss metrics count only
+        lookups that serve a price.
+        """
+        days = to_days(dates)
+        min_days = days if session_days is None else np.asarray(session_days)
+        with self._lock:
+            series = self._load(ticker)
+            provisional = self._live_provisional(ticker)
+
+        found_days, out = self._lookup(series, provisional, days)
+        if (found_days < min_days).any():
+            with self._lock:
+                series = self._refresh(ticker)
+            found_days, out = self._lookup(series, provisional, days)
+        missed = found_days < min_days
+        out[missed] = np.nan
+        if record:
+            misses = int(missed.sum())
+            CACHE_HITS.inc(len(days) - misses, cache="prices")
+            CACHE_MISSES.inc(misses, cache="prices")
+        return out
+
+    def get_price(self, ticker, date, session_day=None):
+        """Scalar get_prices: the close as of a date, or None if unknown."""
+        session_days = None if session_day is None else [session_day]
+        price = self.get_prices(ticker, [date], session_days)[0]
+        return None if np.isnan(price) else price
+
+    def set_prices(self, ticker, dates, closes):
+        """Record closes for a ticker.
+
+        Settled closes are written to disk on flush; provisional ones (today or
+        later) only live in memory until they expire.
+        """
+        records = np.empty(len(dates), dtype=RECORD_DTYPE)
+        records["day"] = to_days(dates)
+        records["close"] = closes
+        if not len(records):
+            return
+
+        provisional = records["day"] >= current_day()
+        settled = records[~provisional]
+        with self._lock:
+            if provisional.any():
+                expires_at = time.monotonic() + self.provisional_ttl
+                entries = self._provisional.setdefault(ticker, {})
+                for day, close in records[provisional].tolist():
+                    entries[day] = (close, expires_at)
+            if len(settled):
+                self._merge(ticker, settled["day"], settled["close"])
+                self._pending.setdefault(ticker, []).append(settled)
+
+    def set_price(self, ticker, date, close):
+        """Record a close for a ticker on a date (see set_prices)."""
+        self.set_prices(ticker, [date], [close])
+
+    def tickers(self):
+        """Return every ticker that has data on disk or pending."""
+        on_disk = set()
+        if self.root.exists():
+            on_disk = {unquote(p.name[:-len(FILE_SUFFIX)]) for p in self.root.glob("*" + FILE_SUFFIX)}
+        with self._lock:
+            return sorted(on_disk | set(self._pending))
+
+    def stats(self):
+        """Entry counts and on-disk size, for the metrics endpoint."""
+        with self._lock:
+            records = sum(len(days) for days, _ in self._series.values())
+            provisional = sum(len(entries) for entries in self._provisional.values())
+            loaded_tickers = len(self._series)
+            memory_bytes = self._memory_bytes
+        disk_bytes = 0
+        if self.root.exists():
+            disk_bytes = sum(p.stat().st_size for p in self.root.glob("*" + FILE_SUFFIX))
+        return {
+            "loaded_tickers": loaded_tickers,
+            "records": records,
+            "provisional": provisional,
+            "memory_bytes": memory_bytes,
+            "disk_bytes": disk_bytes,
+        }
+
+    def is_dirty(self):
+        """Return True if some records have not been written to disk yet."""
+        return bool(self._pending)
+
+    def flush(self):
+        """Append pending records to their ticker files."""
+        with self._lock:
+            if not self._pending:
+                return
+            self.root.mkdir(parents=True, exist_ok=True)
+
+            with file_lock(self._file_lock_path):
+                for ticker in list(self._pending):
+                    records = np.concatenate(self._pending[ticker])
+
+                    # Pick up other processes' appends first so our offset stays exact
+                    self._refresh(ticker)
+                    self._offsets[ticker] = _append_records(self._path(ticker), records)
+                    # Only drop what was written so a failure leaves the rest pending
+                    del self._pending[ticker]
+            self._evict_cold(keep=None)
+
+    def compact(self, session_days=None, max_disk_bytes=None):
+        """Rewrite every ticker file as one dense, sorted series.
+
+        Duplicate days collapse to their latest close. With `session_days`, a
+        `(ticker, days) -> last session days` callable, non-session records that
+        repeat the preceding session's close are dropped too. If the store still
+        exceeds `max_disk_bytes`, the least recently updated tickers are removed.
+        Files keep their modification time, so that order survives compaction.
+
+        Meant to run offline; a server sharing the directory reloads files that
+        shrank. Returns a summary dict.
+        """
+        self.flush()
+        summary = {"tickers": 0, "records_dropped": 0, "tickers_removed": 0, "bytes_before": 0, "bytes_after": 0}
+        if not self.root.exists():
+            return summary
+
+        with self._lock, file_lock(self._file_lock_path):
+            sizes = {}
+            for path in sorted(self.root.glob("*" + FILE_SUFFIX)):
+                ticker = unquote(path.name[:-len(FILE_SUFFIX)])
+                stat = path.stat()
+                records, _ = _read_records(path)
+                days, closes = _collapse(records["day"], records["close"])
+                if session_days is not None:
+                    keep = ~_redundant_records(days, closes, session_days(ticker, days))
+                    days, closes = days[keep], closes[keep]
+
+                compacted = np.empty(len(days), dtype=RECORD_DTYPE)
+                compacted["day"] = days
+                compacted["close"] = closes
+                if compacted.nbytes != stat.st_size:
+                    atomic_write_bytes(path, compacted.tobytes())
+                    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                    self._drop_series(ticker)
+
+                summary["tickers"] += 1
+                summary["records_dropped"] += len(records) - len(compacted)
+                summary["bytes_before"] += stat.st_size
+                sizes[path] = (stat.st_mtime_ns, compacted.nbytes)
+
+            total = sum(size for _, size in sizes.values())
+            if max_disk_bytes is not None and total > max_disk_bytes:
+                for path, (_, size) in sorted(sizes.items(), key=lambda item: item[1][0]):
+                    if total <= max_disk_bytes:
+                        break
+                    path.unlink()
+                    self._drop_series(unquote(path.name[:-len(FILE_SUFFIX)]))
+                    total -= size
+                    summary["tickers_removed"] += 1
+            summary["bytes_after"] = total
+
+        return summary
+
+    def import_legacy_pickle(self, pickle_path):
+        """Import a legacy {"TICKER_YYYY-MM-DD": price} pickle into the store."""
+        with open(pickle_path, "rb") as f:
+            legacy = pickle.load(f)
+
+        imported = 0
+        for key, price in legacy.items():
+            ticker, _, date_str = key.rpartition("_")
+            try:
+                date = pd.to_datetime(date_str, format="%Y-%m-%d")
+            except (ValueError, TypeError):
+                continue
+            self.set_price(ticker, date, float(price))
+            imported += 1
+
+        self.flush()
+        return imported
@@ -0,0 +1,321 @@
+"""Market data providers.
+
+Everything the server needs from upstream goes through a provider: daily
+history and bulk closes for tickers (FX rates are tickers too, e.g. "CAD=X")
+and ticker metadata. `YFinanceProvider` talks to Yahoo Finance; `FileProvider`
+replays CSV or Parquet files from disk with an optional simulated latency, so
+the pipeline can be benchmarked offline or keep serving during an upstream
+outage (as the fallback of the yfinance provider).
+
+The active provider is built from MARKET_DATA_PROVIDER / MARKET_DATA_FALLBACK /
+MARKET_DATA_DIR / MARKET_DATA_LATENCY_SECONDS on first use.
+
+Record files for the file provider with:
+    python providers.py record AAPL MSFT CAD=X --period 5y
+"""
+
+import json
+import logging
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from urllib.parse import quote
+
+import pandas as pd
+import yfinance as yf
+
+from constants import (
+    MARKET_DATA_PROVIDER, MARKET_DATA_FALLBACK, MARKET_DATA_DIR, MARKET_DATA_LATENCY_SECONDS
+)
+from fetcher import download_lock
+
+logger = logging.getLogger(__name__)
+
+PERIOD_PATTERN = re.compile(r"^(\d+)(d|wk|mo|y)$")
+PERIOD_UNITS = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}
+
+
+def _period_start(period, end):
+    """Start date of a yfinance-style period ("5d", "6mo", "1y", "max") ending at `end`."""
+    if period == "max":
+        return pd.Timestamp.min
+    match = PERIOD_PATTERN.match(period)
+    if not match:
+        raise ValueError(f"Unsupported period: {period}")
+    return end - pd.DateOffset(**{PERIOD_UNITS[match.group(2)]: int(match.group(1))})
+
+
+def _history_window(start, end, period):
+    """Resolve history arguments to a [start, end) pair of naive Timestamps."""
+    if period is not None:
+        end = pd.Timestamp.today().normalize() + pd.Timedelta(days=1)
+        return _period_start(period, end), end
+    start = pd.Timestamp.min if start is None else pd.Timestamp(start)
+    end = pd.Timestamp.max if end is None else pd.Timestamp(end)
+    return start, end
+
+
+class MarketDataProvider(ABC):
+    """Interface implemented by every market data source."""
+
+    name = "base"
+    download_lock = None  # Held by fetch around download_closes when set
+
+    @abstractmethod
+    def history(self, ticker, start=None, end=None, period=None):
+        """Daily bars over [start, end) (or a trailing period) with at least a 'Close' column."""
+
+    @abstractmethod
+    def download_closes(self, tickers, start=None, end=None, period=None):
+        """Daily closes for several tickers, one column per ticker, on a naive date index."""
+
+    @abstractmethod
+    def info(self, ticker):
+        """Metadata dict for a ticker (sector, quoteType, beta, ...); empty if unknown."""
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Live data from Yahoo Finance through the yfinance package."""
+
+    name = "yfinance"
+    download_lock = download_lock
+
+    def history(self, ticker, start=None, end=None, period=None):
+        if period is not None:
+            return yf.Ticker(ticker).history(period=period)
+        return yf.Ticker(ticker).history(start=start, end=end)
+
+    def download_closes(self, tickers, start=None, end=None, period=None):
+        tickers = list(tickers)
+        window = {"period": period} if period is not None else {"start": start, "end": end}
+        data = yf.download(
+            tickers,
+            interval="1d",
+            auto_adjust=True,
+            actions=False,
+            group_by="column",
+            progress=False,
+            threads=True,
+            **window
+        )
+        if data is None or data.empty:
+            return pd.DataFrame()
+
+        if isinstance(data.columns, pd.MultiIndex):
+            closes = data["Close"]
+        else:
+            closes = data[["Close"]].rename(columns={"Close": tickers[0]})
+
+        if closes.index.tz is not None:
+            closes.index = closes.index.tz_localize(None)
+        return closes
+
+    def info(self, ticker):
+        return yf.Ticker(ticker).info
+
+
+class FileProvider(MarketDataProvider):
+    """Replay market data recorded on disk.
+
+    Prices live in `<root>/prices/<ticker>.csv` (or `.parquet`) with a Date
+    column and at least a Close column; metadata lives in `<root>/info.json` as
+    {ticker: info}. Unknown tickers behave like delisted ones on Yahoo (empty
+    history, empty info). Every call sleeps `latency` seconds first.
+    """
+
+    name = "file"
+
+    def __init__(self, root, latency=0.0):
+        self.root = Path(root)
+        self.latency = latency
+        self._frames = {}
+        self._info = None
+        self._lock = threading.Lock()
+
+    def _price_path(self, ticker, suffix):
+        return self.root / "prices" / (quote(ticker, safe="") + suffix)
+
+    def _frame(self, ticker):
+        with self._lock:
+            frame = self._frames.get(ticker)
+            if frame is None:
+                frame = self._read_frame(ticker)
+                self._frames[ticker] = frame
+            return frame
+
+    def _read_frame(self, ticker):
+        parquet_path = self._price_path(ticker, ".parquet")
+        csv_path = self._price_path(ticker, ".csv")
+        if parquet_path.exists():
+            frame = pd.read_parquet(parquet_path)
+        elif csv_path.exists():
+            frame = pd.read_csv(csv_path)
+        else:
+            return pd.DataFrame(columns=["Close"], index=pd.DatetimeIndex([], name="Date"))
+
+        if "Date" in frame.columns:
+            frame = frame.set_index("Date")
+        frame.index = pd.to_datetime(frame.index)
+        if frame.index.tz is not None:
+            frame.index = frame.index.tz_localize(None)
+        return frame.sort_index()
+
+    def _simulate_latency(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    def history(self, ticker, start=None, end=None, period=None):
+        self._simulate_latency()
+        start, end = _history_window(start, end, period)
+        frame = self._frame(ticker)
+        return frame[(frame.index >= start) & (frame.index < end)]
+
+    def download_closes(self, tickers, start=None, end=None, period=None):
+        self._simulate_latency()
+        start, end = _history_window(start, end, period)
+        columns = {}
+        for ticker in tickers:
+            frame = self._frame(ticker)
+            if "Close" in frame.columns and not frame.empty:
+                columns[ticker] = frame["Close"][(frame.index >= start) & (frame.index < end)]
+        if not columns:
+            return pd.DataFrame()
+        return pd.DataFrame(columns)
+
+    def info(self, ticker):
+        self._simulate_latency()
+        with self._lock:
+            if self._info is None:
+                info_path = self.root / "info.json"
+                self._info = json.loads(info_path.read_text()) if info_path.exists() else {}
+            return dict(self._info.get(ticker, {}))
+
+    def save_history(self, ticker, frame):
+        """Write a history frame for a ticker as CSV (used to record replay data)."""
+        path = self._price_path(ticker, ".csv")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        frame = frame.copy()
+        if frame.index.tz is not None:
+            frame.index = frame.index.tz_localize(None)
+        frame.index.name = "Date"
+        frame.to_csv(path)
+        with self._lock:
+            self._frames.pop(ticker, None)
+
+    def save_info(self, infos):
+        """Merge {ticker: info} into info.json."""
+        info_path = self.root / "info.json"
+        info_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            current = json.loads(info_path.read_text()) if info_path.exists() else {}
+            current.update(infos)
+            info_path.write_text(json.dumps(current, default=str))
+            self._info = current
+
+
+class FallbackProvider(MarketDataProvider):
+    """Use a primary provider, falling back to a secondary one when it fails.
+
+    An error or an empty result from the primary is answered by the fallback;
+    if the fallback has nothing either, the primary's outcome is kept.
+    """
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+        self.download_lock = primary.download_lock or fallback.download_lock
+
+    def _call(self, method, *args, **kwargs):
+        try:
+            result = getattr(self.primary, method)(*args, **kwargs)
+        except Exception as e:
+            logger.warning(f"{self.primary.name} {method} failed ({e}); using {self.fallback.name}")
+            return getattr(self.fallback, method)(*args, **kwargs)
+
+        if len(result) == 0:
+            fallback_result = getattr(self.fallback, method)(*args, **kwargs)
+            if len(fallback_result) > 0:
+                return fallback_result
+        return result
+
+    def history(self, ticker, start=None, end=None, period=None):
+        return self._call("history", ticker, start=start, end=end, period=period)
+
+    def download_closes(self, tickers, start=None, end=None, period=None):
+        return self._call("download_closes", tickers, start=start, end=end, period=period)
+
+    def info(self, ticker):
+        return self._call("info", ticker)
+
+
+def create_provider(name, fallback=None, data_dir=MARKET_DATA_DIR, latency=MARKET_DATA_LATENCY_SECONDS):
+    """Build a provider by name ("yfinance" or "file"), optionally with a fallback."""
+    providers = {
+        "yfinance": lambda: YFinanceProvider(),
+        "file": lambda: FileProvider(data_dir, latency=latency),
+    }
+    if name not in providers:
+        raise ValueError(f"Unknown market data provider: {name}")
+    provider = providers[name]()
+    if fallback:
+        provider = FallbackProvider(provider, create_provider(fallback, data_dir=data_dir, latency=latency))
+    return provider
+
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """Return the process-wide provider configured through the environment."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = create_provider(MARKET_DATA_PROVIDER, MARKET_DATA_FALLBACK or None)
+            logger.info(f"Using market data provider: {_provider.name}")
+        return _provider
+
+
+def set_provider(provider):
+    """Replace the process-wide provider (benchmarks, offline runs)."""
+    global _provider
+    with _provider_lock:
+        _provider = provider
+
+
+def record(tickers, period="5y", data_dir=MARKET_DATA_DIR):
+    """Download history and metadata from yfinance into a file provider directory."""
+    source = YFinanceProvider()
+    target = FileProvider(data_dir)
+    infos = {}
+    for ticker in tickers:
+        try:
+            hist = source.history(ticker, period=period)
+            if hist.empty:
+                logger.warning(f"No history for {ticker}")
+            else:
+                target.save_history(ticker, hist)
+            infos[ticker] = source.info(ticker)
+        except Exception as e:
+            logger.warning(f"Failed to record {ticker}: {e}")
+    target.save_info(infos)
+    logger.info(f"Recorded {len(tickers)} tickers into {data_dir}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Record market data for the file provider")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser("record")
+    record_parser.add_argument("tickers", nargs="+")
+    record_parser.add_argument("--period", default="5y")
+    record_parser.add_argument("--dir", default=MARKET_DATA_DIR)
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.tickers, period=args.period, data_dir=args.dir)
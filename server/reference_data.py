@@ -0,0 +1,349 @@
+"""Ticker reference data for the dashboard: sectors, betas, performance and index history.
+
+These helpers are blocking; the FastAPI handlers run them in a thread pool and
+they fan upstream calls out through the bounded fetcher.
+"""
+
+import datetime
+import json
+import logging
+from pathlib import Path
+
+import pandas as pd
+from dateutil.relativedelta import relativedelta
+
+from fetcher import fetch, fetch_many
+from file_lock import update_json_cache, atomic_write_bytes
+from negative_cache import negative_cache
+from metrics import CACHE_HITS, CACHE_MISSES, CACHE_ENTRIES, CACHE_DISK_BYTES, add_scrape_hook
+from providers import get_provider
+
+logger = logging.getLogger(__name__)
+
+SECTORS_CACHE_FILE = Path("data/sectors_cache.json")
+BETAS_CACHE_FILE = Path("data/betas_cache.json")
+INDEX_HISTORY_CACHE_FILE = Path("data/index_history_cache.json")
+INDEX_HISTORY_MAX_AGE = datetime.timedelta(hours=24)
+
+
+def _empty_index_history():
+    return {"ACWI": [], "XIU.TO": [], "Index": []}
+
+
+def clean_tickers(tickers):
+    """Strip and de-duplicate the tickers sent by the client."""
+    return list(set([t.strip() for t in tickers if t and isinstance(t, str)]))
+
+
+def _load_json_cache(cache_file, label):
+    if cache_file.exists():
+        try:
+            with open(cache_file, "r") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Failed to load {label} cache file: {e}")
+    return {}
+
+
+def _fetch_info(ticker):
+    """Download the info dict (sector, quoteType, beta, ...) for one ticker."""
+    return get_provider().info(ticker)
+
+
+def is_fund_like(ticker):
+    """Heuristic for funds/ETFs/cash whose beta defaults to 1.0 without fetching."""
+    t_upper = ticker.upper()
+    return (t_upper.startswith('TDB') or
+            t_upper.startswith('DYN') or
+            (t_upper.startswith('X') and t_upper.endswith('.TO')) or
+            (t_upper.startswith('V') and t_upper.endswith('.TO')) or
+            (t_upper.startswith('Z') and t_upper.endswith('.TO')) or
+            (t_upper.startswith('H') and t_upper.endswith('.TO')) or
+            'CASH' in t_upper or
+            '$' in t_upper)
+
+
+def get_sectors(tickers):
+    """Return {ticker: sector} for the tickers, fetching the ones not cached on disk.
+
+    Tickers without a sector (or whose lookup failed) are negatively cached and
+    not fetched again until their entry expires.
+    """
+    unique_tickers = clean_tickers(tickers)
+    server_cache = _load_json_cache(SECTORS_CACHE_FILE, "sector")
+
+    missing_on_server = [
+        t for t in unique_tickers
+        if t not in server_cache and ("sector", t) not in negative_cache
+    ]
+    CACHE_HITS.inc(sum(t in server_cache for t in unique_tickers), cache="sectors")
+    CACHE_MISSES.inc(len(missing_on_server), cache="sectors")
+
+    if missing_on_server:
+        infos, errors = fetch_many(_fetch_info, missing_on_server)
+        for ticker, e in errors.items():
+            logger.warning(f"Failed to fetch info for {ticker}: {e}")
+            negative_cache.add(("sector", ticker), str(e), error=True)
+
+        new_sectors = {}
+        for ticker, info in infos.items():
+            sector = info.get('sector')
+
+            # Check for ETF/Fund indicators if sector is missing
+            if not sector:
+                quote_type = info.get('quoteType', '').upper()
+                if quote_type in ['ETF', 'MUTUALFUND']:
+                    sector = 'Mixed'
+
+            if sector:
+                new_sectors[ticker] = sector
+            else:
+                negative_cache.add(("sector", ticker), "no sector")
+
+        # Save updated cache, merging with entries other workers may have added
+        server_cache.update(new_sectors)
+        if new_sectors:
+            try:
+                server_cache.update(update_json_cache(SECTORS_CACHE_FILE, new_sectors))
+            except Exception as e:
+                logger.error(f"Failed to save sector cache: {e}")
+
+    return {k: server_cache[k] for k in unique_tickers if k in server_cache}
+
+
+def get_betas(tickers):
+    """Return {ticker: beta}, defaulting funds, ETFs and failures to 1.0.
+
+    Failed lookups are not persisted: they are negatively cached for a short
+    time and retried once the entry expires.
+    """
+    unique_tickers = clean_tickers(tickers)
+    server_cache = _load_json_cache(BETAS_CACHE_FILE, "beta")
+
+    results = {}
+    new_betas = {}
+    to_fetch = []
+
+    for ticker in unique_tickers:
+        if ticker in server_cache:
+            results[ticker] = server_cache[ticker]
+        elif is_fund_like(ticker):
+            results[ticker] = 1.0
+            new_betas[ticker] = 1.0  # Cache heuristic values too
+        elif ("beta", ticker) in negative_cache:
+            results[ticker] = 1.0
+        else:
+            to_fetch.append(ticker)
+
+    CACHE_HITS.inc(sum(t in server_cache for t in unique_tickers), cache="betas")
+    CACHE_MISSES.inc(len(to_fetch), cache="betas")
+
+    if to_fetch:
+        infos, errors = fetch_many(_fetch_info, to_fetch)
+
+        for ticker, info in infos.items():
+            quote_type = info.get('quoteType', '').upper()
+            if quote_type in ['ETF', 'MUTUALFUND']:
+                beta_value = 1.0
+            else:
+                beta = info.get('beta')
+                beta_value = beta if beta is not None else 1.0
+
+            results[ticker] = beta_value
+            new_betas[ticker] = beta_value
+
+        for ticker, e in errors.items():
+            logger.warning(f"Failed to fetch beta for {ticker}: {e}")
+            results[ticker] = 1.0
+            negative_cache.add(("beta", ticker), str(e), error=True)
+
+    # Save new entries, merging with entries other workers may have added
+    if new_betas:
+        try:
+            update_json_cache(BETAS_CACHE_FILE, new_betas)
+        except Exception as e:
+            logger.error(f"Failed to save beta cache: {e}")
+
+    return results
+
+
+def _fetch_year_history(ticker):
+    """Download one year of daily history for a ticker."""
+    return get_provider().history(ticker, period="1y")
+
+
+def _performance_from_history(hist, today):
+    """Compute YTD, 1Y, 6M and 3M price changes from a daily history frame."""
+    current_price = hist['Close'].iloc[-1]
+
+    def get_pct_change(months_ago=None, start_year=False):
+        if start_year:
+            start_date = datetime.date(today.year, 1, 1)
+        else:
+            start_date = today - relativedelta(months=months_ago)
+
+        # Last close on or before the start date (e.g. the Friday before a weekend)
+        target_idx = hist.index[hist.index.date <= start_date]
+        if target_idx.empty:
+            # Not enough history for this period; YTD falls back to the first point
+            if start_year:
+                return (current_price - hist['Close'].iloc[0]) / hist['Close'].iloc[0]
+            return None
+
+        start_price = hist.loc[target_idx[-1]]['Close']
+        return (current_price - start_price) / start_price
+
+    return {
+        'YTD': get_pct_change(start_year=True),
+        '1Y': get_pct_change(months_ago=12),
+        '6M': get_pct_change(months_ago=6),
+        '3M': get_pct_change(months_ago=3),
+    }
+
+
+def get_performance(tickers):
+    """Return {ticker: {YTD, 1Y, 6M, 3M}} price changes from one year of history.
+
+    Tickers without history are negatively cached and skipped until their entry
+    expires.
+    """
+    unique_tickers = clean_tickers(tickers)
+    today = datetime.date.today()
+    results = {}
+
+    to_fetch = [t for t in unique_tickers if ("performance", t) not in negative_cache]
+    histories, errors = fetch_many(_fetch_year_history, to_fetch)
+    for ticker, e in errors.items():
+        logger.warning(f"Failed to fetch performance for {ticker}: {e}")
+        negative_cache.add(("performance", ticker), str(e), error=True)
+
+    for ticker, hist in histories.items():
+        if hist.empty:
+            negative_cache.add(("performance", ticker), "no history")
+            continue
+        try:
+            results[ticker] = _performance_from_history(hist, today)
+        except Exception as e:
+            logger.warning(f"Failed to compute performance for {ticker}: {e}")
+
+    return results
+
+
+def _download_index_history():
+    return get_provider().download_closes(["ACWI", "XIU.TO", "USDCAD=X"], period="5y")
+
+
+def get_index_history():
+    """
+    Fetch historical data for ACWI (global) and XIU.TO (Canada) for the comparison graph.
+    Also fetches USDCAD=X to convert ACWI to CAD, and calculates a synthetic blend (75% ACWI, 25% XIU).
+    Caches the result for INDEX_HISTORY_MAX_AGE to avoid repeated slow upstream calls.
+    """
+    cache_file = INDEX_HISTORY_CACHE_FILE
+
+    if cache_file.exists():
+        try:
+            mtime = datetime.datetime.fromtimestamp(cache_file.stat().st_mtime)
+            if datetime.datetime.now() - mtime < INDEX_HISTORY_MAX_AGE:
+                with open(cache_file, "r") as f:
+                    logger.info("Serving index history from cache")
+                    history = json.load(f)
+                CACHE_HITS.inc(cache="index_history")
+                return history
+        except Exception as e:
+            logger.warning(f"Failed to read index history cache: {e}")
+
+    CACHE_MISSES.inc(cache="index_history")
+
+    logger.info("Fetching fresh index history from the market data provider...")
+
+    try:
+        closes = fetch(_download_index_history, lock=get_provider().download_lock)
+
+        if closes.empty:
+            return _empty_index_history()
+
+        expected_cols = ["ACWI", "XIU.TO", "USDCAD=X"]
+        existing_cols = [c for c in expected_cols if c in closes.columns]
+
+        if not existing_cols:
+            return _empty_index_history()
+
+        # Fill missing values (holidays etc)
+        closes = closes[existing_cols].ffill().bfill()
+
+        result_data = {
+            "ACWI": [],
+            "XIU.TO": [],
+            "Index": []
+        }
+
+        dates = closes.index.strftime('%Y-%m-%d').tolist()
+
+        if "ACWI" in closes.columns and "USDCAD=X" in closes.columns:
+            acwi_cad_series = closes["ACWI"] * closes["USDCAD=X"]
+        else:
+            acwi_cad_series = pd.Series(dtype=float)
+
+        if "XIU.TO" in closes.columns:
+            xiu_series = closes["XIU.TO"]
+        else:
+            xiu_series = pd.Series(dtype=float)
+
+        # Composite index (total return approx) built from daily returns, starting at 100
+        if not acwi_cad_series.empty and not xiu_series.empty:
+            acwi_ret = acwi_cad_series.pct_change().fillna(0)
+            xiu_ret = xiu_series.pct_change().fillna(0)
+
+            # Synthetic 75/25
+            composite_ret = (acwi_ret * 0.75) + (xiu_ret * 0.25)
+            composite_index = (1 + composite_ret).cumprod() * 100
+        else:
+            composite_index = pd.Series(dtype=float)
+
+        acwi_list = acwi_cad_series.tolist() if not acwi_cad_series.empty else []
+        xiu_list = xiu_series.tolist() if not xiu_series.empty else []
+        comp_list = composite_index.tolist() if not composite_index.empty else []
+
+        for i, date_str in enumerate(dates):
+            if i < len(acwi_list) and pd.notna(acwi_list[i]):
+                result_data["ACWI"].append({"date": date_str, "value": acwi_list[i]})
+
+            if i < len(xiu_list) and pd.notna(xiu_list[i]):
+                result_data["XIU.TO"].append({"date": date_str, "value": xiu_list[i]})
+
+            if i < len(comp_list) and pd.notna(comp_list[i]):
+                result_data["Index"].append({"date": date_str, "value": comp_list[i]})
+
+        try:
+            atomic_write_bytes(cache_file, json.dumps(result_data).encode("utf-8"))
+        except Exception as e:
+            logger.error(f"Failed to write index history cache: {e}")
+
+        return result_data
+
+    except Exception as e:
+        logger.error(f"Error fetching index history: {e}")
+        return _empty_index_history()
+
+
+def _report_cache_file_metrics():
+    """Scrape hook: entry counts and sizes of the JSON caches."""
+    for label, cache_file in (
+        ("sectors", SECTORS_CACHE_FILE),
+        ("betas", BETAS_CACHE_FILE),
+        ("index_history", INDEX_HISTORY_CACHE_FILE),
+    ):
+        if not cache_file.exists():
+            CACHE_ENTRIES.set(0, cache=label)
+            CACHE_DISK_BYTES.set(0, cache=label)
+            continue
+        CACHE_DISK_BYTES.set(cache_file.stat().st_size, cache=label)
+        entries = _load_json_cache(cache_file, label)
+        if label == "index_history":
+            # One entry per point of the composite series
+            entries = entries.get("Index", [])
+        CACHE_ENTRIES.set(len(entries), cache=label)
+
+
+add_scrape_hook(_report_cache_file_metrics)
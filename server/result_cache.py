@@ -0,0 +1,235 @@
+"""Content-addressed cache of finished /analyze and /generate-pdf responses.
+
+A response is keyed by a hash of the uploaded files plus the vintage of the
+market data it was computed from, the current market day (see
+price_store.current_day): settled closes never change once stored, so the same
+upload gives the same response until the next day starts. Responses that used
+today's provisional closes expire with them after PROVISIONAL_PRICE_TTL_SECONDS.
+
+Each entry is a body file plus a small JSON header in RESULT_CACHE_DIR, shared
+by every server process. A sweep of the directory drops entries from older
+vintages, then the least recently used ones until the directory is back under
+RESULT_CACHE_MAX_MB with some room to spare. Writes only add their size to a
+running total kept in memory; the directory is swept when that total passes
+the limit, when the vintage changes and at least every
+RESULT_CACHE_SWEEP_SECONDS (which also picks up other processes' writes). The
+header carries the body's ETag so clients re-uploading the same file can
+revalidate with If-None-Match instead of downloading it again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import pandas as pd
+
+from constants import RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB, RESULT_CACHE_SWEEP_SECONDS, PROVISIONAL_PRICE_TTL_SECONDS
+from file_lock import atomic_write_bytes
+from metrics import CACHE_HITS, CACHE_MISSES, CACHE_EVICTIONS, CACHE_ENTRIES, CACHE_DISK_BYTES, add_scrape_hook
+from price_store import current_day, from_day, to_day
+
+logger = logging.getLogger(__name__)
+
+# Bump when the content of a cached response changes so older entries stop matching
+RESULT_FORMAT_VERSION = 1
+
+BODY_SUFFIX = ".body"
+META_SUFFIX = ".json"
+ORPHAN_GRACE_SECONDS = 60  # A body without its header is only removed once its writer is surely done
+TRIM_TARGET = 0.9  # A sweep past max_bytes evicts down to this share of it, so the next writes fit
+
+CachedResult = namedtuple("CachedResult", ["body", "media_type", "etag"])
+
+
+def market_data_vintage():
+    """Version stamp of the market data a result computed now would use."""
+    return from_day(current_day()).strftime("%Y-%m-%d")
+
+
+def result_key(kind, *uploads, vintage=None):
+    """Hex digest of the endpoint, the uploaded files' bytes and the market data vintage."""
+    digest = hashlib.sha256()
+    digest.update(f"{kind}:{RESULT_FORMAT_VERSION}:{vintage or market_data_vintage()}".encode("utf-8"))
+    for data in uploads:
+        data = data or b""
+        digest.update(len(data).to_bytes(8, "little"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def result_ttl(dates):
+    """Seconds a result for these "dd/mm/YYYY" dates stays valid (None: until the vintage changes)."""
+    if not dates:
+        return None
+    last_day = max(to_day(pd.to_datetime(d, format="%d/%m/%Y")) for d in dates)
+    return PROVISIONAL_PRICE_TTL_SECONDS if last_day >= current_day() else None
+
+
+def etag_for(body):
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """Evaluate an If-None-Match header against an ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+class ResultCache:
+    """Directory of response bodies keyed by result_key."""
+
+    def __init__(self, root, max_bytes=None, sweep_interval=RESULT_CACHE_SWEEP_SECONDS):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._lock = threading.Lock()
+        self._size = None  # Directory size as of the last sweep plus this process's writes since
+        self._swept_at = 0.0
+        self._swept_vintage = None
+
+    def _paths(self, key):
+        return self.root / (key + BODY_SUFFIX), self.root / (key + META_SUFFIX)
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            path.unlink(missing_ok=True)
+
+    def get(self, key):
+        """Return the CachedResult stored under `key` if it is still valid, else None."""
+        body_path, meta_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_bytes())
+            if meta["expires_at"] is not None and time.time() >= meta["expires_at"]:
+                self._remove(key)
+                CACHE_EVICTIONS.inc(cache="results")
+                CACHE_MISSES.inc(cache="results")
+                return None
+            body = body_path.read_bytes()
+        except (OSError, ValueError, KeyError):
+            CACHE_MISSES.inc(cache="results")
+            return None
+        # Another process may be halfway through rewriting the entry
+        if etag_for(body) != meta["etag"]:
+            CACHE_MISSES.inc(cache="results")
+            return None
+
+        # The header's mtime is the entry's position in LRU order
+        try:
+            os.utime(meta_path)
+        except OSError:
+            pass
+        CACHE_HITS.inc(cache="results")
+        return CachedResult(body, meta["media_type"], meta["etag"])
+
+    def put(self, key, body, media_type, ttl=None):
+        """Store a response body and return it as a CachedResult."""
+        result = CachedResult(body, media_type, etag_for(body))
+        meta = {
+            "media_type": media_type,
+            "etag": result.etag,
+            "vintage": market_data_vintage(),
+            "expires_at": time.time() + ttl if ttl is not None else None,
+        }
+        try:
+            body_path, meta_path = self._paths(key)
+            meta_bytes = json.dumps(meta).encode("utf-8")
+            atomic_write_bytes(body_path, body)
+            atomic_write_bytes(meta_path, meta_bytes)
+            if self._sweep_due(len(body) + len(meta_bytes)):
+                self._trim()
+        except OSError as e:
+            logger.warning(f"Failed to store result {key}: {e}")
+        return result
+
+    def _entries(self):
+        """(key, last_used, size, meta) for every entry on disk; meta is None if unreadable."""
+        entries = []
+        if not self.root.exists():
+            return entries
+        for body_path in self.root.glob("*" + BODY_SUFFIX):
+            key = body_path.name[:-len(BODY_SUFFIX)]
+            meta_path = self.root / (key + META_SUFFIX)
+            try:
+                body_stat = body_path.stat()
+            except OSError:
+                continue
+            try:
+                meta_stat = meta_path.stat()
+                meta = json.loads(meta_path.read_bytes())
+            except (OSError, ValueError):
+                # Body without a readable header: an interrupted or in-progress write
+                entries.append((key, body_stat.st_mtime, body_stat.st_size, None))
+                continue
+            entries.append((key, meta_stat.st_mtime, body_stat.st_size + meta_stat.st_size, meta))
+        return entries
+
+    def _sweep_due(self, written):
+        """Add a write to the running size; True when the directory should be swept."""
+        with self._lock:
+            if self._size is None:
+                return True
+            self._size += written
+            return (
+                (self.max_bytes is not None and self._size > self.max_bytes)
+                or time.monotonic() - self._swept_at >= self.sweep_interval
+                or self._swept_vintage != market_data_vintage()
+            )
+
+    def _trim(self):
+        """Drop stale entries, then the least recently used ones past max_bytes."""
+        with self._lock:
+            now = time.time()
+            vintage = market_data_vintage()
+            kept, evicted = [], 0
+            for key, last_used, size, meta in self._entries():
+                if meta is None:
+                    stale = now - last_used > ORPHAN_GRACE_SECONDS
+                else:
+                    stale = meta.get("vintage") != vintage or (
+                        meta.get("expires_at") is not None and now >= meta["expires_at"]
+                    )
+                if stale:
+                    self._remove(key)
+                    evicted += 1
+                else:
+                    kept.append((last_used, size, key))
+
+            total = sum(size for _, size, _ in kept)
+            if self.max_bytes is not None and total > self.max_bytes:
+                target = self.max_bytes * TRIM_TARGET
+                for _, size, key in sorted(kept):
+                    if total <= target:
+                        break
+                    self._remove(key)
+                    total -= size
+                    evicted += 1
+            if evicted:
+                CACHE_EVICTIONS.inc(evicted, cache="results")
+            self._size = total
+            self._swept_at = time.monotonic()
+            self._swept_vintage = vintage
+
+    def stats(self):
+        """Entry count and on-disk size, for the metrics endpoint."""
+        entries = self._entries()
+        return {"entries": len(entries), "disk_bytes": sum(size for _, _, size, _ in entries)}
+
+
+# Shared by every request path in the process
+result_cache = ResultCache(RESULT_CACHE_DIR, max_bytes=int(RESULT_CACHE_MAX_MB * 1024 * 1024))
+
+
+def _report_result_cache_metrics():
+    stats = result_cache.stats()
+    CACHE_ENTRIES.set(stats["entries"], cache="results")
+    CACHE_DISK_BYTES.set(stats["disk_bytes"], cache="results")
+
+
+add_scrape_hook(_report_result_cache_metrics)
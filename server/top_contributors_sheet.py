@@ -3,21 +3,10 @@
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
 from openpyxl.worksheet.pagebreak import Break
+import numpy as np
 import pandas as pd
 from constants import CASH_TICKER, BENCHMARK_TICKERS
-
-
-def group_periods_by_month(periods):
-    """Group periods by calendar month."""
-    month_groups = {}
-    for period_idx, period in enumerate(periods):
-        period_start, period_end = period
-        # Use period end to determine which month it belongs to
-        month_key = (period_end.year, period_end.month)
-        if month_key not in month_groups:
-            month_groups[month_key] = []
-        month_groups[month_key].append((period_idx, period))
-    return month_groups
+from portfolio_matrix import month_groups
 
 
 def group_months_by_quarter(sorted_months):
@@ -32,177 +21,57 @@ def group_months_by_quarter(sorted_months):
     return quarters
 
 
+def aggregate_period_data(df, periods, period_indexes):
+    """Weight, return and contribution of every holding over a set of periods.
+
+    `period_indexes` index into `periods`, the (start_date, end_date) of
+    every period. The weight is the one of the most recent period, the return
+    the weight-averaged return of the periods where the holding was held, and
+    the contribution their sum. Benchmarks are skipped and cash has zero return
+    and contribution.
+    """
+    df = df[~df['Ticker'].isin(BENCHMARK_TICKERS.values())]
+    weights = df[[f'Weight_{i}' for i in period_indexes]].to_numpy(dtype=float)
+    returns = df[[f'Return_{i}' for i in period_indexes]].to_numpy(dtype=float)
+    contribs = df[[f'Contrib_{i}' for i in period_indexes]].to_numpy(dtype=float)
+    
+    # Most recent weight: from the period with the latest end date
+    if len(period_indexes):
+        last_period_idx = max(period_indexes, key=lambda i: periods[i][1])
+        most_recent_weights = df[f'Weight_{last_period_idx}'].to_numpy(dtype=float)
+    else:
+        most_recent_weights = np.zeros(len(df))
+    
+    held = weights > 0
+    weighted_return_sums = np.where(held, returns * weights, 0.0).sum(axis=1)
+    weight_sums = np.where(held, weights, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_returns = np.where(weight_sums > 0, weighted_return_sums / weight_sums, 0.0)
+    
+    # Include all tickers (even if weight is 0) to ensure weights sum correctly
+    cash_mask = (df['Ticker'] == CASH_TICKER).to_numpy()
+    return pd.DataFrame({
+        'Ticker': df['Ticker'].tolist(),
+        'Weight': most_recent_weights,
+        'Return': np.where(cash_mask, 0.0, avg_returns),
+        'Contrib': np.where(cash_mask, 0.0, contribs.sum(axis=1)),
+    })
+
+
 def aggregate_monthly_data(df, periods, month_periods):
     """Aggregate data for a month by summing contributions from all periods in that month."""
-    month_data = []
-    
-    for _, row_data in df.iterrows():
-        ticker = row_data['Ticker']
-        
-        # Skip benchmarks only (include cash)
-        if ticker in BENCHMARK_TICKERS.values():
-            continue
-        
-        total_weight = 0.0
-        total_contrib = 0.0
-        weighted_return_sum = 0.0
-        weight_sum_for_return = 0.0
-        most_recent_weight = 0.0  # Track most recent weight (closest to end of period)
-        
-        # Sort periods by end date to get the most recent one
-        # month_periods is list of (period_idx, period) where period is (start_date, end_date)
-        sorted_periods = sorted(month_periods, key=lambda x: x[1][1])  # Sort by period end date
-        
-        # Handle cash separately (return and contrib are always 0)
-        if ticker == CASH_TICKER:
-            # Get most recent weight for cash
-            if sorted_periods:
-                last_period_idx = sorted_periods[-1][0]
-                most_recent_weight = row_data.get(f'Weight_{last_period_idx}', 0.0)
-            else:
-                # Fallback: use max weight if no sorted periods
-                for period_idx, period in month_periods:
-                    weight = row_data.get(f'Weight_{period_idx}', 0.0)
-                    most_recent_weight = max(most_recent_weight, weight)
-            
-            # Cash always has 0 return and 0 contribution
-            month_data.append({
-                'Ticker': ticker,
-                'Weight': most_recent_weight,
-                'Return': 0.0,
-                'Contrib': 0.0
-            })
-            continue
-        
-        # Aggregate data from all periods in this month for non-cash tickers
-        for period_idx, period in month_periods:
-            weight = row_data.get(f'Weight_{period_idx}', 0.0)
-            return_val = row_data.get(f'Return_{period_idx}', 0.0)
-            contrib = row_data.get(f'Contrib_{period_idx}', 0.0)
-            
-            # Sum contributions
-            total_contrib += contrib
-            
-            # Calculate weighted return (sum of weight * return)
-            if weight > 0:
-                weighted_return_sum += return_val * weight
-                weight_sum_for_return += weight
-        
-        # Get most recent weight (from last period in sorted list)
-        if sorted_periods:
-            last_period_idx = sorted_periods[-1][0]
-            most_recent_weight = row_data.get(f'Weight_{last_period_idx}', 0.0)
-        else:
-            # Fallback: use max weight if no sorted periods
-            for period_idx, period in month_periods:
-                weight = row_data.get(f'Weight_{period_idx}', 0.0)
-                most_recent_weight = max(most_recent_weight, weight)
-        
-        total_weight = most_recent_weight
-        
-        # Calculate average weighted return for the month
-        avg_return = weighted_return_sum / weight_sum_for_return if weight_sum_for_return > 0 else 0.0
-        
-        # Include all tickers (even if weight is 0) to ensure weights sum correctly
-        month_data.append({
-            'Ticker': ticker,
-            'Weight': total_weight,
-            'Return': avg_return,
-            'Contrib': total_contrib
-        })
-    
-    return pd.DataFrame(month_data)
+    return aggregate_period_data(df, periods, month_periods)
 
 
-def aggregate_quarterly_data(df, periods, quarter_months, month_groups):
+def aggregate_quarterly_data(df, periods, quarter_months, period_months):
     """Aggregate data for a quarter by combining all months in the quarter."""
-    quarter_data = []
-    
     # Get all period indices for all months in the quarter
-    all_quarter_periods = []
-    for (year, month) in quarter_months:
-        if (year, month) in month_groups:
-            all_quarter_periods.extend(month_groups[(year, month)])
+    all_quarter_periods = [period_months[key] for key in quarter_months if key in period_months]
     
     if not all_quarter_periods:
         return pd.DataFrame()
     
-    for _, row_data in df.iterrows():
-        ticker = row_data['Ticker']
-        
-        # Skip benchmarks only (include cash)
-        if ticker in BENCHMARK_TICKERS.values():
-            continue
-        
-        total_weight = 0.0
-        total_contrib = 0.0
-        weighted_return_sum = 0.0
-        weight_sum_for_return = 0.0
-        
-        # Handle cash separately (return and contrib are always 0)
-        if ticker == CASH_TICKER:
-            # Get most recent weight for cash (from last period in quarter)
-            most_recent_weight = 0.0
-            sorted_quarter_periods = sorted(all_quarter_periods, key=lambda x: x[1][1])
-            if sorted_quarter_periods:
-                last_period_idx = sorted_quarter_periods[-1][0]
-                most_recent_weight = row_data.get(f'Weight_{last_period_idx}', 0.0)
-            else:
-                # Fallback: use max weight
-                for period_idx, period in all_quarter_periods:
-                    weight = row_data.get(f'Weight_{period_idx}', 0.0)
-                    most_recent_weight = max(most_recent_weight, weight)
-            
-            # Cash always has 0 return and 0 contribution
-            quarter_data.append({
-                'Ticker': ticker,
-                'Weight': most_recent_weight,
-                'Return': 0.0,
-                'Contrib': 0.0
-            })
-            continue
-        
-        # Aggregate data from all periods in the quarter for non-cash tickers
-        # Sort periods by end date to get the most recent one
-        sorted_quarter_periods = sorted(all_quarter_periods, key=lambda x: x[1][1])  # Sort by period end date
-        
-        for period_idx, period in all_quarter_periods:
-            weight = row_data.get(f'Weight_{period_idx}', 0.0)
-            return_val = row_data.get(f'Return_{period_idx}', 0.0)
-            contrib = row_data.get(f'Contrib_{period_idx}', 0.0)
-            
-            # Sum contributions
-            total_contrib += contrib
-            
-            # Calculate weighted return (sum of weight * return)
-            if weight > 0:
-                weighted_return_sum += return_val * weight
-                weight_sum_for_return += weight
-        
-        # Get most recent weight (from last period in sorted list)
-        if sorted_quarter_periods:
-            last_period_idx = sorted_quarter_periods[-1][0]
-            most_recent_weight = row_data.get(f'Weight_{last_period_idx}', 0.0)
-        else:
-            # Fallback: use max weight if no sorted periods
-            for period_idx, period in all_quarter_periods:
-                weight = row_data.get(f'Weight_{period_idx}', 0.0)
-                most_recent_weight = max(most_recent_weight, weight)
-        
-        total_weight = most_recent_weight
-        
-        # Calculate average weighted return for the quarter
-        avg_return = weighted_return_sum / weight_sum_for_return if weight_sum_for_return > 0 else 0.0
-        
-        # Include all tickers (even if weight is 0) to ensure weights sum correctly
-        quarter_data.append({
-            'Ticker': ticker,
-            'Weight': total_weight,
-            'Return': avg_return,
-            'Contrib': total_contrib
-        })
-    
-    return pd.DataFrame(quarter_data)
+    return aggregate_period_data(df, periods, np.concatenate(all_quarter_periods))
 
 
 def create_table(ws, table_start_col, start_row, month_name, month_df, is_quarter=False):
@@ -747,10 +616,10 @@ def create_top_contributors_sheet(wb, df, periods, dates):
     ws.column_dimensions['A'].width = 10 / 7  # Convert pixels to Excel units (approximately)
     
     # Group periods by month
-    month_groups = group_periods_by_month(periods)
+    period_months = month_groups(periods)
     
     # Find the first January month
-    sorted_months = sorted(month_groups.keys())
+    sorted_months = sorted(period_months.keys())
     first_january_idx = None
     for i, (year, month) in enumerate(sorted_months):
         if month == 1:  # January
@@ -815,7 +684,7 @@ def create_top_contributors_sheet(wb, df, periods, dates):
             if table_idx < len(quarter_months):
                 # Monthly table
                 (year, month) = quarter_months[table_idx]
-                month_periods = month_groups[(year, month)]
+                month_periods = period_months[(year, month)]
                 month_name = pd.to_datetime(f"{year}-{month:02d}-01").strftime("%B %Y")
                 month_df = aggregate_monthly_data(df, periods, month_periods)
                 
@@ -830,7 +699,7 @@ def create_top_contributors_sheet(wb, df, periods, dates):
             elif table_idx == 3 and has_quarter:
                 # Quarterly table
                 quarter_name = f"Q{quarter_idx + 1}"
-                quarter_df = aggregate_quarterly_data(df, periods, quarter_months, month_groups)
+                quarter_df = aggregate_quarterly_data(df, periods, quarter_months, period_months)
                 
                 if not quarter_df.empty:
                     # Calculate table start column for quarter (4th position)
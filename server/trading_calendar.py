@@ -0,0 +1,105 @@
+"""Exchange trading calendars used to resolve as-of prices without a network call.
+
+Each ticker maps to a calendar (TSX for Canadian listings, NYSE for US ones,
+weekdays for FX). For any date the calendar gives the last trading session on or
+before it, which is the close the price cache must hold to answer the lookup.
+Unscheduled closures are not listed; lookups on those days simply miss once and
+fall back to a download.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (
+    AbstractHolidayCalendar, Holiday, GoodFriday, USLaborDay, USMemorialDay,
+    USPresidentsDay, USThanksgivingDay,
+    nearest_workday, next_monday, next_monday_or_tuesday, sunday_to_monday
+)
+from pandas.tseries.offsets import DateOffset
+from dateutil.relativedelta import MO
+
+from price_store import to_days
+
+CALENDAR_START = "1970-01-01"
+CALENDAR_END = "2100-12-31"
+
+
+class NYSEHolidayCalendar(AbstractHolidayCalendar):
+    rules = [
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        Holiday("Martin Luther King Jr. Day", month=1, day=1, start_date="1998-01-01",
+                offset=DateOffset(weekday=MO(3))),
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday("Juneteenth", month=6, day=19, start_date="2022-01-01", observance=nearest_workday),
+        Holiday("Independence Day", month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday("Christmas Day", month=12, day=25, observance=nearest_workday),
+    ]
+
+
+class TSXHolidayCalendar(AbstractHolidayCalendar):
+    rules = [
+        Holiday("New Year's Day", month=1, day=1, observance=next_monday),
+        Holiday("Family Day", month=2, day=1, start_date="2008-01-01", offset=DateOffset(weekday=MO(3))),
+        GoodFriday,
+        Holiday("Victoria Day", month=5, day=24, offset=DateOffset(weekday=MO(-1))),
+        Holiday("Canada Day", month=7, day=1, observance=next_monday),
+        Holiday("Civic Holiday", month=8, day=1, offset=DateOffset(weekday=MO(1))),
+        USLaborDay,
+        Holiday("Thanksgiving", month=10, day=1, offset=DateOffset(weekday=MO(2))),
+        Holiday("Christmas Day", month=12, day=25, observance=next_monday),
+        Holiday("Boxing Day", month=12, day=26, observance=next_monday_or_tuesday),
+    ]
+
+
+HOLIDAY_CALENDARS = {
+    "NYSE": NYSEHolidayCalendar,
+    "TSX": TSXHolidayCalendar,
+    "FX": None,  # Currencies trade every weekday
+}
+
+CANADIAN_SUFFIXES = (".TO", ".V", ".NE", ".CN")
+
+
+def calendar_for(ticker):
+    """Name of the trading calendar a ticker follows."""
+    if ticker.endswith("=X"):
+        return "FX"
+    if ticker.endswith(CANADIAN_SUFFIXES) or ticker == "^GSPTSE":
+        return "TSX"
+    return "NYSE"
+
+
+@lru_cache(maxsize=None)
+def sessions(calendar_name):
+    """Sorted store days (see price_store.to_day) of every session of a calendar."""
+    calendar_days = np.arange(
+        np.datetime64(CALENDAR_START, "D"), np.datetime64(CALENDAR_END, "D") + 1, dtype="datetime64[D]"
+    )
+    holiday_calendar = HOLIDAY_CALENDARS[calendar_name]
+    holidays = []
+    if holiday_calendar is not None:
+        holidays = holiday_calendar().holidays(CALENDAR_START, CALENDAR_END).to_numpy(dtype="datetime64[D]")
+    session_dates = calendar_days[np.is_busday(calendar_days, holidays=holidays)]
+    return to_days(pd.DatetimeIndex(session_dates))
+
+
+def last_sessions(ticker, days):
+    """Store day of the last session on or before each store day, for a ticker's calendar."""
+    calendar_sessions = sessions(calendar_for(ticker))
+    pos = np.searchsorted(calendar_sessions, days, side="right") - 1
+    return calendar_sessions[np.maximum(pos, 0)]
+
+
+def last_session_days(ticker, dates):
+    """Store day of the last session on or before each date, for a ticker's calendar."""
+    return last_sessions(ticker, to_days(dates))
+
+
+def is_session(ticker, date):
+    """Whether the ticker's exchange is open on `date`."""
+    return int(last_session_days(ticker, [date])[0]) == to_days([date])[0]